@@ -1,11 +1,17 @@
-from monai.utils import set_determinism
-from monai.config import print_config
-from config import DIR_TRAINING, DIR_TESTING
-from utils.dataset import BrainTumorDataset
-from funcs.transformer import Transformer
+""" src/__init__.py """
 
 __all__ = ['BrainTumorDataset', 'Transformer', 'DIR_TRAINING', 'DIR_TESTING', 'CATEGORIES']
 
-set_determinism(seed=42)
 
-print_config()
\ No newline at end of file
+def __getattr__(name):
+    """ Resolve exports on first access so importing the package does not load monai, torch or the dataset. """
+    if name == "BrainTumorDataset":
+        from utils.dataset import BrainTumorDataset
+        return BrainTumorDataset
+    if name == "Transformer":
+        from funcs.transformer import Transformer
+        return Transformer
+    if name in ("DIR_TRAINING", "DIR_TESTING", "CATEGORIES"):
+        import config
+        return getattr(config, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,60 @@
+""" benchmarks/augmentation.py """
+
+import time
+import argparse
+import numpy as np
+import torch
+from PIL import Image
+from funcs.transformer import Transformer
+
+
+def synthetic_images(count, size):
+    """ Random RGB PIL images standing in for decoded MRI slices. """
+    rng = np.random.default_rng(42)
+    return [Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8)) for _ in range(count)]
+
+
+def per_sample(images, transformer, batch_size):
+    """ Current path: RandomHorizontalFlip + RandomRotation on each PIL image, then collate. """
+    transform = transformer.get_augmentation_transform()
+    for start in range(0, len(images), batch_size):
+        torch.stack([transform(img) for img in images[start:start + batch_size]])
+
+
+def batched(images, transformer, batch_size):
+    """ Batched path: deterministic per-sample transform, collate, then one affine grid_sample per batch. """
+    transform = transformer.get_basic_transform()
+    augment = transformer.get_batch_augmentation()
+    for start in range(0, len(images), batch_size):
+        augment(torch.stack([transform(img) for img in images[start:start + batch_size]]))
+
+
+def run(count=512, size=256, batch_size=32, repeats=3):
+    """ Time both paths and return images/sec for each. """
+    images = synthetic_images(count, size)
+    transformer = Transformer(resize=(size, size))
+    results = {}
+    for name, fn in (("per_sample", per_sample), ("batched", batched)):
+        torch.manual_seed(42)
+        fn(images[:batch_size], transformer, batch_size)  # warm-up
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn(images, transformer, batch_size)
+            best = min(best, time.perf_counter() - start)
+        results[name] = count / best
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-sample PIL vs batched tensor augmentation throughput.")
+    parser.add_argument("--count", type=int, default=512)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    results = run(args.count, args.size, args.batch_size, args.repeats)
+    for name, throughput in results.items():
+        print(f"{name:>12}: {throughput:8.1f} images/sec", flush=True)
+    print(f"{'speedup':>12}: {results['batched'] / results['per_sample']:8.2f}x", flush=True)
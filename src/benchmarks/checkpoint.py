@@ -0,0 +1,58 @@
+""" benchmarks/checkpoint.py """
+
+import os
+import time
+import argparse
+import tempfile
+import torch
+from models.model import TumorClassifier, Trainer
+from models.checkpoint import Checkpointer, atomic_save, to_cpu
+
+
+def run(saves=5, batch_size=8, size=128):
+    """ Training-thread stall per checkpoint: synchronous torch.save against Checkpointer's snapshot-and-queue. """
+    torch.manual_seed(0)
+    trainer = Trainer(TumorClassifier(), compile=False)
+    images, labels = torch.randn(batch_size, 3, size, size), torch.randint(0, 4, (batch_size,))
+    # One optimizer step so the optimizer state (AdamW moments) is populated and saved too
+    trainer.optimizer.zero_grad()
+    trainer.criterion(trainer.model(images), labels).backward()
+    trainer.optimizer.step()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        start = time.perf_counter()
+        for i in range(saves):
+            atomic_save({"model": to_cpu(trainer.module.state_dict()), "optimizer": to_cpu(trainer.optimizer.state_dict())},
+                        os.path.join(work_dir, f"sync{i}.pt"))
+        results["sync_stall"] = (time.perf_counter() - start) / saves
+
+        checkpointer = Checkpointer(os.path.join(work_dir, "async"), keep_last=2)
+        stalls = []
+        start = time.perf_counter()
+        for i in range(saves):
+            trainer.epoch = i + 1
+            t0 = time.perf_counter()
+            checkpointer.save(trainer, metrics={"accuracy": i / saves})
+            stalls.append(time.perf_counter() - t0)
+            # Stand-in for an epoch of training between checkpoints
+            time.sleep(results["sync_stall"] * 2)
+        checkpointer.close()
+        results["async_stall"] = sum(stalls) / saves
+        results["async_total"] = time.perf_counter() - start
+        results["checkpoint_mb"] = os.path.getsize(Checkpointer.latest(checkpointer.directory)) / 2 ** 20
+        results["kept"] = sorted(name for name in os.listdir(checkpointer.directory) if name.endswith(".pt"))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Checkpoint stall: synchronous torch.save vs background Checkpointer.")
+    parser.add_argument("--saves", type=int, default=5)
+    args = parser.parse_args()
+
+    results = run(args.saves)
+    print(f"checkpoint size {results['checkpoint_mb']:.1f} MB", flush=True)
+    print(f"sync torch.save stall:  {results['sync_stall'] * 1000:8.1f} ms/checkpoint", flush=True)
+    print(f"async snapshot stall:   {results['async_stall'] * 1000:8.1f} ms/checkpoint "
+          f"({results['sync_stall'] / results['async_stall']:.1f}x less)", flush=True)
+    print(f"kept after {args.saves} saves: {results['kept']}", flush=True)
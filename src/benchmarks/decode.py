@@ -0,0 +1,45 @@
+""" benchmarks/decode.py """
+
+import os
+import argparse
+import tempfile
+import torch
+from benchmarks.pipeline import make_synthetic_tree, list_tree, measure, build_pil, build_torchvision
+
+
+def check_agreement(image_paths, labels, count=8):
+    """ Max absolute difference between the PIL and torchvision backends on the same images (decoder rounding only). """
+    pil = build_pil(image_paths, labels, None, "pil")
+    batched = build_torchvision(image_paths, labels, None, "torchvision")
+    reference = torch.stack([pil[i][0] for i in range(count)])
+    return (batched[list(range(count))][0] - reference).abs().max().item()
+
+
+def run(per_class=64, size=256, batch_size=32, workers=(0, 2), epochs=2):
+    """ images/sec and batch latency for the PIL per-sample path against batched torchvision.io decoding. """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_paths, labels = list_tree(make_synthetic_tree(os.path.join(work_dir, "tree"), per_class, size))
+        for name, builder in (("pil", build_pil), ("torchvision", build_torchvision)):
+            dataset = builder(image_paths, labels, work_dir, name)
+            for num_workers in workers:
+                results[f"{name}/w{num_workers}"] = measure(dataset, batch_size, num_workers, False, False, 2, epochs=epochs)
+        results["max_abs_diff"] = check_agreement(image_paths, labels)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="PIL per-sample decoding vs threaded reads + batched torchvision.io decoding.")
+    parser.add_argument("--per-class", type=int, default=64)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2])
+    parser.add_argument("--epochs", type=int, default=2)
+    args = parser.parse_args()
+
+    results = run(args.per_class, args.size, args.batch_size, args.workers, args.epochs)
+    for num_workers in args.workers:
+        pil, batched = results[f"pil/w{num_workers}"], results[f"torchvision/w{num_workers}"]
+        print(f"workers={num_workers}: pil {pil['images_per_sec']:8.1f} img/s | torchvision {batched['images_per_sec']:8.1f} img/s "
+              f"| {batched['images_per_sec'] / pil['images_per_sec']:5.2f}x", flush=True)
+    print(f"max |pil - torchvision| after normalization: {results['max_abs_diff']:.4f}", flush=True)
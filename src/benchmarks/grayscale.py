@@ -0,0 +1,87 @@
+""" benchmarks/grayscale.py """
+
+import os
+import time
+import argparse
+import tempfile
+import numpy as np
+import torch
+from PIL import Image
+from utils.packstore import PackStore
+from utils.dataset import PackedBrainTumorDataset
+from models.model import TumorClassifier
+
+MODES = ("RGB", "L")
+
+
+def synthetic_files(work_dir, count, size):
+    """ Grayscale MRI-like JPEGs saved as RGB (three identical channels), as in the Kaggle dataset. """
+    rng = np.random.default_rng(42)
+    paths = []
+    for idx in range(count):
+        gray = rng.integers(0, 256, (size, size), dtype=np.uint8)
+        path = os.path.join(work_dir, f"{idx:05d}.jpg")
+        Image.fromarray(np.stack([gray] * 3, axis=2)).save(path, quality=90)
+        paths.append(path)
+    return paths
+
+
+def best_of(fn, repeats):
+    """ Fastest wall time of fn over repeats runs. """
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(count=256, size=256, batch_size=32, repeats=3):
+    """ Decode, pack size, normalization and model forward throughput for RGB against single-channel L. """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        paths = synthetic_files(work_dir, count, size)
+        for mode in MODES:
+            def decode():
+                for path in paths:
+                    with Image.open(path) as img:
+                        np.asarray(img.convert(mode))
+
+            store = PackStore.write(os.path.join(work_dir, f"pack_{mode}"), paths, [0] * count, (size, size), mode)
+            dataset = PackedBrainTumorDataset(store)
+
+            def normalize():
+                for idx in range(len(dataset)):
+                    dataset[idx]
+
+            torch.manual_seed(42)
+            model = TumorClassifier(in_channels=len(mode)).to(memory_format=torch.channels_last).eval()
+            batch = torch.randn(batch_size, len(mode), size, size).contiguous(memory_format=torch.channels_last)
+
+            def forward():
+                with torch.inference_mode():
+                    model(batch)
+
+            forward()  # warm-up
+            results[mode] = {
+                "decode_images_per_sec": count / best_of(decode, repeats),
+                "pack_mb": os.path.getsize(store.path + PackStore.DATA_SUFFIX) / 2 ** 20,
+                "batch_tensor_mb": batch.numel() * batch.element_size() / 2 ** 20,
+                "normalize_images_per_sec": count / best_of(normalize, repeats),
+                "forward_images_per_sec": batch_size / best_of(forward, repeats),
+            }
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="RGB vs single-channel grayscale: decode, storage, normalization and forward cost.")
+    parser.add_argument("--count", type=int, default=256)
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    results = run(args.count, args.size, args.batch_size, args.repeats)
+    for metric in results["RGB"]:
+        rgb, gray = results["RGB"][metric], results["L"][metric]
+        print(f"{metric:>26}: RGB {rgb:10.1f} | L {gray:10.1f} | {gray / rgb:5.2f}x", flush=True)
@@ -0,0 +1,62 @@
+""" benchmarks/import_time.py """
+
+import os
+import sys
+import argparse
+import subprocess
+
+# Cumulative import budgets in milliseconds; config must stay free of torch/monai and provisioning
+DEFAULT_BUDGETS = {
+    "config": 50,
+    "funcs.augmentation": 3000,
+    "utils.dataset": 3000,
+}
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def measure(module):
+    """ Import module in a fresh interpreter under -X importtime; return (cumulative ms, top entries by self time). """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=SRC_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    cumulative = None
+    entries = []
+    for line in result.stderr.splitlines():
+        # import time:  self [us] |  cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append((int(self_us), name.strip()))
+        if name.strip() == module:
+            cumulative = int(cumulative_us) / 1000.0
+    entries.sort(reverse=True)
+    return cumulative, entries
+
+
+def check(budgets, top=5):
+    """ Measure every module against its budget; returns whether all were within budget. """
+    ok = True
+    for module, budget_ms in budgets.items():
+        cumulative_ms, entries = measure(module)
+        status = "OK" if cumulative_ms <= budget_ms else "OVER BUDGET"
+        ok = ok and cumulative_ms <= budget_ms
+        print(f"{module:<24} {cumulative_ms:9.1f} ms  (budget {budget_ms} ms)  {status}", flush=True)
+        for self_us, name in entries[:top]:
+            print(f"    {self_us / 1000.0:9.1f} ms  {name}", flush=True)
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enforce import-time budgets using python -X importtime.")
+    parser.add_argument("modules", nargs="*", help="module=budget_ms pairs (defaults to the built-in budgets)")
+    parser.add_argument("--top", type=int, default=5, help="slowest imports to list per module")
+    args = parser.parse_args()
+
+    budgets = DEFAULT_BUDGETS
+    if args.modules:
+        budgets = {module: float(budget) for module, budget in (item.split("=") for item in args.modules)}
+    sys.exit(0 if check(budgets, args.top) else 1)
@@ -0,0 +1,107 @@
+""" benchmarks/inference.py """
+
+import io
+import json
+import time
+import argparse
+import numpy as np
+import torch
+from funcs.transformer import Transformer
+from models.export import calibration_batches, checkpoint_transformer, quantize_int8
+from models.model import load_model, input_channels
+
+
+def model_size_mb(model):
+    """ Serialized state dict size in MB. """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2 ** 20
+
+
+def latency_ms(run, example, repeats=50, warmup=5):
+    """ p50/p99 single-call latency in milliseconds. """
+    for _ in range(warmup):
+        run(example)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run(example)
+        timings.append((time.perf_counter() - start) * 1000.0)
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def evaluate(run, batches):
+    """ Predictions over (images, labels) batches and the wall time spent in the model. """
+    predictions, labels, elapsed = [], [], 0.0
+    for images, targets in batches:
+        start = time.perf_counter()
+        logits = run(images)
+        elapsed += time.perf_counter() - start
+        predictions.append(logits.float().argmax(dim=1))
+        labels.append(targets)
+    return torch.cat(predictions), torch.cat(labels), elapsed
+
+
+def run_benchmark(checkpoint, test_files, test_labels, calibration_files, transformer, batch_size=32, input_size=(256, 256)):
+    """ Compare fp32, bf16 (autocast) and int8 on latency, throughput, size and top-1 accuracy drift. """
+    model = load_model(checkpoint)
+    transformer = transformer or Transformer(channels=input_channels(model))
+    int8 = quantize_int8(model, calibration_batches(calibration_files, transformer))
+
+    def bf16(images):
+        with torch.autocast("cpu", dtype=torch.bfloat16):
+            return model(images)
+
+    variants = {"fp32": (model, model), "bf16": (bf16, model), "int8": (int8, int8)}
+    labels = torch.as_tensor(test_labels)
+    batches = [
+        (images, labels[start:start + len(images)])
+        for start, images in zip(range(0, len(test_files), batch_size), calibration_batches(test_files, transformer, len(test_files), batch_size))
+    ]
+
+    example = torch.randn(1, input_channels(model), *input_size)
+    results, reference = {}, None
+    with torch.inference_mode():
+        for name, (run, module) in variants.items():
+            p50, p99 = latency_ms(run, example)
+            predictions, targets, elapsed = evaluate(run, batches)
+            accuracy = (predictions == targets).float().mean().item()
+            if reference is None:
+                reference = (predictions, accuracy)
+            results[name] = {
+                "latency_ms_p50": p50,
+                "latency_ms_p99": p99,
+                "throughput_images_per_sec": len(targets) / elapsed,
+                "model_size_mb": model_size_mb(module),
+                "top1_accuracy": accuracy,
+                "accuracy_drift": accuracy - reference[1],
+                "agreement_with_fp32": (predictions == reference[0]).float().mean().item(),
+            }
+            print(f"{name:>5}: p50 {p50:7.2f} ms | {results[name]['throughput_images_per_sec']:8.1f} img/s | "
+                  f"{results[name]['model_size_mb']:6.1f} MB | top-1 {accuracy:.4f} ({results[name]['accuracy_drift']:+.4f})", flush=True)
+    return results
+
+
+if __name__ == "__main__":
+    import config
+    from utils.prepdata import PrepData
+
+    parser = argparse.ArgumentParser(description="fp32 vs bf16 vs int8 CPU inference on the Testing split.")
+    parser.add_argument("checkpoint", help="model state dict or training checkpoint to load")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    init_conf = config.get_config()
+    train_prep = PrepData(config=init_conf, train_dir=init_conf.DIR_TRAINING)
+    test_prep = PrepData(config=init_conf, test_dir=init_conf.DIR_TESTING)
+    transformer = checkpoint_transformer(args.checkpoint, train_prep)
+
+    # PrepData labels follow the directory listing; map them to Config.CATEGORIES indices used by the model
+    categories = [init_conf.CATEGORIES.index(name) for name in test_prep.test_class_map]
+    test_labels = [categories[label] for label in test_prep.test_labels]
+    results = run_benchmark(args.checkpoint, test_prep.test_images, test_labels, train_prep.valid_images, transformer,
+                            args.batch_size, input_size=transformer.resize)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
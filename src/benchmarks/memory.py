@@ -0,0 +1,112 @@
+""" benchmarks/memory.py """
+
+import os
+import time
+import argparse
+import tempfile
+from pathlib import Path
+import numpy as np
+from torch.utils.data import DataLoader
+from torchvision import transforms
+from benchmarks.pipeline import make_synthetic_tree, list_tree, RssSampler
+from utils.dataset import BrainTumorDataset
+
+
+def smaps(pid):
+    """ (USS, PSS) of pid in bytes from /proc/<pid>/smaps_rollup: USS counts pages only pid maps (private clean +
+    dirty), PSS adds an equal share of every shared page. (0, 0) when it is gone or /proc is unavailable. """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if value.strip().endswith("kB"):
+                    fields[name] = int(value.split()[0]) * 1024
+    except (FileNotFoundError, ProcessLookupError, PermissionError):
+        pass
+    return fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0), fields.get("Pss", 0)
+
+
+class WorkerMemorySampler(RssSampler):
+    """ Poll USS and PSS of every DataLoader worker (child process) into a per-worker time series. """
+
+    def __init__(self, interval=0.1):
+        super().__init__(interval)
+        self.series = {}
+
+    def run(self):
+        pid = os.getpid()
+        start = time.perf_counter()
+        while not self._stop_event.is_set():
+            for child in self._children(pid):
+                uss, pss = smaps(child)
+                if uss:
+                    self.series.setdefault(child, []).append((time.perf_counter() - start, uss, pss))
+            self._stop_event.wait(self.interval)
+
+    def report(self):
+        """ Per worker: USS/PSS at the first and last sample and the peak, in MB. """
+        rows = []
+        for worker, (pid, samples) in enumerate(sorted(self.series.items())):
+            samples = np.asarray(samples)
+            rows.append({
+                "worker": worker, "pid": pid, "samples": len(samples),
+                "uss_start_mb": samples[0, 1] / 2 ** 20, "uss_end_mb": samples[-1, 1] / 2 ** 20,
+                "uss_peak_mb": samples[:, 1].max() / 2 ** 20,
+                "pss_start_mb": samples[0, 2] / 2 ** 20, "pss_end_mb": samples[-1, 2] / 2 ** 20,
+                "pss_peak_mb": samples[:, 2].max() / 2 ** 20,
+            })
+        return rows
+
+
+def legacy_layout(dataset):
+    """ Switch dataset back to the former storage, a list of pathlib.Path and a list of int labels, for comparison. """
+    dataset.image_paths = [Path(path) for path in dataset.image_paths]
+    dataset.labels = [int(label) for label in dataset.labels]
+    return dataset
+
+
+def epoch_memory(dataset, batch_size, num_workers, interval=0.1):
+    """ One shuffled epoch over dataset while sampling every worker's USS/PSS. """
+    loader = DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers)
+    sampler = WorkerMemorySampler(interval)
+    sampler.start()
+    start = time.perf_counter()
+    for _ in loader:
+        pass
+    elapsed = time.perf_counter() - start
+    sampler.stop()
+    return {"seconds": elapsed, "workers": sampler.report()}
+
+
+def run(num_paths=200000, num_workers=2, batch_size=256, size=16):
+    """ Per-worker USS/PSS over an epoch for the compact (PathArray + int8) layout against the legacy lists.
+    A small synthetic tree is repeated to num_paths entries, so per-sample bookkeeping rather than decoding dominates. """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_paths, labels = list_tree(make_synthetic_tree(os.path.join(work_dir, "tree"), 8, size))
+        repeats = -(-num_paths // len(image_paths))
+        image_paths, labels = (image_paths * repeats)[:num_paths], (labels * repeats)[:num_paths]
+        for layout in ("compact", "legacy"):
+            dataset = BrainTumorDataset(image_paths=image_paths, labels=labels, transform=transforms.ToTensor())
+            if layout == "legacy":
+                legacy_layout(dataset)
+            results[layout] = epoch_memory(dataset, batch_size, num_workers)
+            del dataset
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-worker USS/PSS over an epoch: compact path/label storage vs Python lists.")
+    parser.add_argument("--num-paths", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    results = run(args.num_paths, args.workers, args.batch_size)
+    for layout, result in results.items():
+        print(f"{layout} layout, {args.num_paths} paths, epoch {result['seconds']:.1f}s:", flush=True)
+        for row in result["workers"]:
+            print(f"  worker {row['worker']}: USS {row['uss_start_mb']:7.1f} -> {row['uss_end_mb']:7.1f} MB "
+                  f"(peak {row['uss_peak_mb']:7.1f}) | PSS {row['pss_start_mb']:7.1f} -> {row['pss_end_mb']:7.1f} MB "
+                  f"(peak {row['pss_peak_mb']:7.1f}) | {row['samples']} samples", flush=True)
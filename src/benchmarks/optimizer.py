@@ -0,0 +1,55 @@
+""" benchmarks/optimizer.py """
+
+import time
+import argparse
+import torch
+from funcs.optimizer import build_optimizer, state_nbytes
+from models.model import TumorClassifier
+
+# name -> build_optimizer keyword arguments; "stock" is torch.optim's per-parameter CPU default
+VARIANTS = {
+    "adamw/stock": dict(name="adamw", implementation="stock"),
+    "adamw/foreach": dict(name="adamw", implementation="foreach"),
+    "adamw/fused": dict(name="adamw", implementation="fused"),
+    "adamw/bf16-state": dict(name="adamw", state_dtype=torch.bfloat16),
+    "adamw/int8-state": dict(name="adamw", state_dtype=torch.int8),
+    "sgd/stock": dict(name="sgd", implementation="stock"),
+    "sgd/foreach": dict(name="sgd", implementation="foreach"),
+    "sgd/fused": dict(name="sgd", implementation="fused"),
+}
+
+
+def time_steps(optimizer, model, steps=20, warmup=3):
+    """ Mean optimizer.step() time in ms with fixed random gradients (forward/backward excluded). """
+    for param in model.parameters():
+        param.grad = torch.randn_like(param) * 1e-3
+    for _ in range(warmup):
+        optimizer.step()
+    start = time.perf_counter()
+    for _ in range(steps):
+        optimizer.step()
+    return (time.perf_counter() - start) / steps * 1000.0
+
+
+def run(steps=20):
+    """ Step time and optimizer-state memory per variant. """
+    results = {}
+    for name, kwargs in VARIANTS.items():
+        torch.manual_seed(42)
+        model = TumorClassifier()
+        optimizer = build_optimizer(model, **kwargs)
+        step_ms = time_steps(optimizer, model, steps)
+        results[name] = {"step_ms": step_ms, "state_mb": state_nbytes(optimizer) / 2 ** 20}
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Optimizer step time and state memory against stock torch.optim.")
+    parser.add_argument("--steps", type=int, default=20)
+    args = parser.parse_args()
+
+    results = run(args.steps)
+    for name, metrics in results.items():
+        baseline = results[name.split("/")[0] + "/stock"]
+        print(f"{name:<18} {metrics['step_ms']:8.2f} ms/step ({baseline['step_ms'] / metrics['step_ms']:5.2f}x) "
+              f"{metrics['state_mb']:8.1f} MB state ({metrics['state_mb'] / max(baseline['state_mb'], 1e-9):5.2f}x)", flush=True)
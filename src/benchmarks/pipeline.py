@@ -0,0 +1,241 @@
+""" benchmarks/pipeline.py """
+
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+import itertools
+import tempfile
+import threading
+import numpy as np
+from PIL import Image
+from torch.utils.data import DataLoader
+from config.config import Config
+from funcs.transformer import Transformer
+from utils.dataset import BrainTumorDataset, PackedBrainTumorDataset, BatchDecodeDataset, batch_loader
+from utils.packstore import PackStore
+
+
+def make_synthetic_tree(root, per_class=64, size=256):
+    """ Write a Training-like tree of random grayscale-in-RGB JPEGs, one folder per category. """
+    rng = np.random.default_rng(42)
+    for category in Config.CATEGORIES:
+        os.makedirs(os.path.join(root, category), exist_ok=True)
+        for i in range(per_class):
+            pixels = np.repeat(rng.integers(0, 256, (size, size, 1), dtype=np.uint8), 3, axis=2)
+            Image.fromarray(pixels).save(os.path.join(root, category, f"image({i}).jpg"))
+    return root
+
+
+def list_tree(root):
+    """ Image paths and category labels under root, without the manifest (which would write to DIR_META). """
+    image_paths, labels = [], []
+    for label, category in enumerate(Config.CATEGORIES):
+        class_dir = os.path.join(root, category)
+        if os.path.isdir(class_dir):
+            names = sorted(os.listdir(class_dir))
+            image_paths.extend(os.path.join(class_dir, name) for name in names)
+            labels.extend([label] * len(names))
+    return image_paths, labels
+
+
+def build_pil(image_paths, labels, work_dir, backend):
+    """ BrainTumorDataset decoding JPEGs per sample with the basic transform. """
+    return BrainTumorDataset(image_paths=image_paths, labels=labels, transform=Transformer().get_basic_transform())
+
+
+def build_torchvision(image_paths, labels, work_dir, backend):
+    """ BatchDecodeDataset: threaded raw reads, batched torchvision.io decode, one float/normalize per batch. """
+    transformer = Transformer()  # same statistics as the "pil" builder, so every backend does the same work
+    return BatchDecodeDataset(image_paths, labels, transformer.mean, transformer.std)
+
+
+def build_packed(image_paths, labels, work_dir, backend):
+    """ PackedBrainTumorDataset over a pack written once into work_dir. """
+    path = os.path.join(work_dir, "bench")
+    with contextlib.redirect_stdout(sys.stderr):  # keep stdout clean for the JSON report
+        store = PackStore(path) if PackStore.exists(path) else PackStore.write(path, image_paths, labels)
+    return PackedBrainTumorDataset(store)
+
+
+# Dataset implementation -> builder(image_paths, labels, work_dir, backend) and the decode backends it supports
+DATASETS = {
+    "pil": (build_pil, ("pil",)),
+    "packed": (build_packed, ("none",)),
+    "torchvision": (build_torchvision, ("torchvision",)),
+}
+
+
+class RssSampler(threading.Thread):
+    """ Poll the resident set size of this process and its children (DataLoader workers) from /proc. """
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak_main = 0
+        self.peak_total = 0
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def _rss(pid):
+        """ VmRSS of pid in bytes, 0 when it is gone or /proc is unavailable. """
+        try:
+            with open(f"/proc/{pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            pass
+        return 0
+
+    @staticmethod
+    def _children(pid):
+        """ Direct children of pid, read from /proc/<pid>/task/*/children. """
+        children = []
+        try:
+            for tid in os.listdir(f"/proc/{pid}/task"):
+                with open(f"/proc/{pid}/task/{tid}/children") as f:
+                    children.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, PermissionError):
+            pass
+        return children
+
+    def run(self):
+        pid = os.getpid()
+        while not self._stop_event.is_set():
+            main = self._rss(pid)
+            total = main + sum(self._rss(child) for child in self._children(pid))
+            self.peak_main = max(self.peak_main, main)
+            self.peak_total = max(self.peak_total, total)
+            self._stop_event.wait(self.interval)
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+def measure(dataset, batch_size, num_workers, pin_memory, persistent_workers, prefetch_factor, epochs=2, warmup=2):
+    """ Iterate the DataLoader for a few epochs; return throughput, batch latency percentiles and peak RSS. """
+    kwargs = {}
+    if num_workers > 0:
+        kwargs.update(persistent_workers=persistent_workers, prefetch_factor=prefetch_factor)
+    if isinstance(dataset, BatchDecodeDataset):
+        loader = batch_loader(dataset, batch_size, shuffle=True, num_workers=num_workers, pin_memory=pin_memory, **kwargs)
+    else:
+        loader = DataLoader(dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers, pin_memory=pin_memory, **kwargs)
+
+    if len(loader) <= warmup:
+        raise ValueError(f"{len(dataset)} images give {len(loader)} batches of {batch_size}, not more than the "
+                         f"{warmup} warm-up batches: use a larger tree (--synthetic) or a smaller batch size")
+
+    sampler = RssSampler()
+    sampler.start()
+    latencies, images = [], 0
+    start = None
+    for _ in range(epochs):
+        last = time.perf_counter()
+        for step, (batch, _) in enumerate(loader):
+            now = time.perf_counter()
+            if start is None and step >= warmup:
+                start = last
+            if start is not None:
+                latencies.append(now - last)
+                images += len(batch)
+            last = now
+    elapsed = time.perf_counter() - start if start is not None else float("nan")
+    del loader
+    sampler.stop()
+
+    latencies = np.asarray(latencies) * 1000.0
+    return {
+        "images_per_sec": images / elapsed if images else 0.0,
+        "batch_ms_p50": float(np.percentile(latencies, 50)) if len(latencies) else None,
+        "batch_ms_p99": float(np.percentile(latencies, 99)) if len(latencies) else None,
+        "peak_rss_mb_main": sampler.peak_main / 2 ** 20,
+        "peak_rss_mb_total": sampler.peak_total / 2 ** 20,
+    }
+
+
+def format_ms(value):
+    """ A latency percentile for the progress line, n/a when no batch was timed. """
+    return f"{value:7.1f}" if value is not None else f"{'n/a':>7}"
+
+
+def sweep(root, work_dir, datasets, backends, batch_sizes, workers, pin_memory, persistent, prefetch, epochs):
+    """ Run every combination of the given axes and return {config key: metrics}. """
+    image_paths, labels = list_tree(root)
+    results = {}
+    for name in datasets:
+        builder, supported = DATASETS[name]
+        for backend in (b for b in backends if b in supported) if backends else supported:
+            dataset = builder(image_paths, labels, work_dir, backend)
+            for bs, nw, pin, pers, pf in itertools.product(batch_sizes, workers, pin_memory, persistent, prefetch):
+                if nw == 0 and (pers or pf != prefetch[0]):
+                    continue  # persistent_workers/prefetch_factor only apply with worker processes
+                key = f"{name}/{backend}/bs{bs}/w{nw}/pin{int(pin)}/persist{int(pers)}/pf{pf if nw else '-'}"
+                results[key] = measure(dataset, bs, nw, pin, pers, pf, epochs=epochs)
+                print(f"{key:<48} {results[key]['images_per_sec']:9.1f} img/s  "
+                      f"p50 {format_ms(results[key]['batch_ms_p50'])} ms  p99 {format_ms(results[key]['batch_ms_p99'])} ms  "
+                      f"rss {results[key]['peak_rss_mb_total']:7.1f} MB", file=sys.stderr, flush=True)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """ Configurations whose throughput dropped more than tolerance below the baseline. """
+    regressions = {}
+    for key, metrics in results.items():
+        if key in baseline and metrics["images_per_sec"] < baseline[key]["images_per_sec"] * (1.0 - tolerance):
+            regressions[key] = {"baseline": baseline[key]["images_per_sec"], "current": metrics["images_per_sec"]}
+    return regressions
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def bool_list(value):
+    return [v.strip().lower() in ("1", "true", "yes") for v in value.split(",")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Data-pipeline throughput sweep (images/sec, batch latency, peak RSS).")
+    parser.add_argument("--root", help="image tree with one folder per category (default: synthetic)")
+    parser.add_argument("--synthetic", type=int, default=64, help="images per class for the synthetic tree")
+    parser.add_argument("--datasets", default="pil,packed,torchvision", help=f"comma list of {sorted(DATASETS)}")
+    parser.add_argument("--backends", default="", help="comma list of decode backends (default: all supported)")
+    parser.add_argument("--batch-sizes", type=int_list, default=[32])
+    parser.add_argument("--workers", type=int_list, default=[0, 4])
+    parser.add_argument("--pin-memory", type=bool_list, default=[False])
+    parser.add_argument("--persistent-workers", type=bool_list, default=[False])
+    parser.add_argument("--prefetch-factor", type=int_list, default=[2])
+    parser.add_argument("--epochs", type=int, default=2)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative throughput drop")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results to --baseline instead of comparing")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        root = args.root or make_synthetic_tree(os.path.join(work_dir, "tree"), per_class=args.synthetic)
+        results = sweep(
+            root, work_dir, args.datasets.split(","), [b for b in args.backends.split(",") if b],
+            args.batch_sizes, args.workers, args.pin_memory, args.persistent_workers, args.prefetch_factor, args.epochs,
+        )
+
+    report = {"results": results}
+    if args.baseline and args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    elif args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(results, json.load(f), args.tolerance)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    sys.exit(1 if report.get("regressions") else 0)
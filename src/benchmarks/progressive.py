@@ -0,0 +1,64 @@
+""" benchmarks/progressive.py """
+
+import os
+import sys
+import json
+import argparse
+import contextlib
+import tempfile
+import torch
+from torch.utils.data import DataLoader
+from benchmarks.pipeline import make_synthetic_tree, list_tree
+from models.model import TumorClassifier, Trainer
+from models.progressive import progressive_schedule, fit_progressive
+from utils.dataset import PackedBrainTumorDataset
+from utils.packstore import PyramidStore
+
+
+def run(epochs=4, sizes=(64, 128, 224, 256), per_class=16, batch_size=16):
+    """ Same model and data trained at a fixed full size against a progressive schedule over pyramid levels. """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_paths, labels = list_tree(make_synthetic_tree(os.path.join(work_dir, "Training"), per_class, max(sizes)))
+        with contextlib.redirect_stdout(sys.stderr):
+            pyramid = PyramidStore.write(os.path.join(work_dir, "train"), image_paths, labels, sizes)
+        valid_loader = DataLoader(PackedBrainTumorDataset(pyramid.level(max(sizes))), batch_size=batch_size)
+        schedules = {"fixed": [max(sizes)] * epochs, "progressive": progressive_schedule(epochs, sizes)}
+
+        for name, schedule in schedules.items():
+            torch.manual_seed(42)
+            trainer = Trainer(TumorClassifier(), compile=False)
+            with contextlib.redirect_stdout(sys.stderr):
+                history = fit_progressive(trainer, pyramid, valid_loader, schedule, batch_size)
+            results[name] = {
+                "schedule": schedule,
+                "train_seconds": sum(entry["train_seconds"] for entry in history),
+                "wall_seconds": history[-1]["elapsed"],
+                "bytes_read": sum(entry["bytes_read"] for entry in history),
+                "final_valid_accuracy": history[-1]["valid"]["accuracy"],
+            }
+
+    fixed = results["fixed"]
+    for metrics in results.values():
+        metrics["time_saved"] = 1.0 - metrics["train_seconds"] / fixed["train_seconds"]
+        metrics["bytes_saved"] = 1.0 - metrics["bytes_read"] / fixed["bytes_read"]
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Progressive-resize training from a pyramid pack against fixed-size training.")
+    parser.add_argument("--epochs", type=int, default=4)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[64, 128, 224, 256])
+    parser.add_argument("--per-class", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    results = run(args.epochs, args.sizes, args.per_class, args.batch_size)
+    for name, metrics in results.items():
+        print(f"{name:>12}: sizes {metrics['schedule']} | train {metrics['train_seconds']:7.1f}s ({metrics['time_saved']:+.0%} saved) "
+              f"| read {metrics['bytes_read'] / 2 ** 20:7.1f} MB ({metrics['bytes_saved']:+.0%} saved) "
+              f"| valid acc {metrics['final_valid_accuracy']:.3f}", flush=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
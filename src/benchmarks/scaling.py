@@ -0,0 +1,52 @@
+""" benchmarks/scaling.py """
+
+import os
+import sys
+import json
+import argparse
+import contextlib
+import tempfile
+from benchmarks.pipeline import make_synthetic_tree, list_tree
+from models.distributed import launch
+from utils.packstore import PackStore
+
+
+def run(process_counts=(1, 2, 4), per_class=32, size=128, batch_size=16, epochs=1, master_port=29500):
+    """ Train the same synthetic split with 1..N gloo processes; efficiency is throughput_N / (N * throughput_1). """
+    results = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        image_paths, labels = list_tree(make_synthetic_tree(os.path.join(work_dir, "Training"), per_class, size))
+        with contextlib.redirect_stdout(sys.stderr):
+            train = PackStore.write(os.path.join(work_dir, "train"), image_paths, labels, (size, size))
+            valid = PackStore.write(os.path.join(work_dir, "valid"), image_paths[::8], labels[::8], (size, size))
+        for offset, nproc in enumerate(process_counts):
+            # A fresh port per run avoids TIME_WAIT collisions with the previous group's store
+            history = launch(train.path, valid.path, nproc=nproc, master_port=master_port + offset,
+                             epochs=epochs, batch_size=batch_size)
+            results[nproc] = {"samples_per_sec": history[-1]["train"]["samples_per_sec"], "elapsed": history[-1]["elapsed"]}
+
+    base = results[process_counts[0]]["samples_per_sec"] / process_counts[0]
+    for nproc, metrics in results.items():
+        metrics["speedup"] = metrics["samples_per_sec"] / (base * process_counts[0])
+        metrics["efficiency"] = metrics["samples_per_sec"] / (base * nproc)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Data-parallel scaling efficiency as gloo processes are added on one machine.")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--per-class", type=int, default=32)
+    parser.add_argument("--size", type=int, default=128)
+    parser.add_argument("--batch-size", type=int, default=16, help="per-process batch size")
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON here")
+    args = parser.parse_args()
+
+    results = run(args.processes, args.per_class, args.size, args.batch_size, args.epochs)
+    print(f"{os.cpu_count()} CPUs", flush=True)
+    for nproc, metrics in results.items():
+        print(f"{nproc:>3} processes: {metrics['samples_per_sec']:8.1f} samples/s | speedup {metrics['speedup']:5.2f}x "
+              f"| efficiency {metrics['efficiency']:6.1%}", flush=True)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
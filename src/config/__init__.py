@@ -1,31 +1,72 @@
 """ config/__init__.py """
 
 import os
+from functools import lru_cache
 from .config import Config
-from .cuda_info import CudaInfo
-from .http_fetch import HttpFetch
 
 # GitHub URL for Brain Tumor Classification (MRI) and SHA1 for zip dataset
 URL = "https://github.com/sartajbhuvaji/brain-tumor-classification-dataset/archive/refs/heads/master.zip"
 SHA1 = "6fbf6d0b328aa6db16b26c8a6b780f1e50052a70"
 
-# Initialize configuration
-init_conf = Config()
-DIR_TRAINING = init_conf.DIR_TRAINING
-DIR_TESTING = init_conf.DIR_TESTING
-DIR_META = init_conf.DIR_META
-DIR_ARCHIVE = init_conf.DIR_ARCHIVE
-CATEGORIES = init_conf.CATEGORIES
-
-# Initialize CUDA info and save it under DIR_META
-cuda_info = CudaInfo(output_dir=DIR_META)
-cuda_info.save_to_yaml()
-
-# Set paths within the DIR_ROOT structure
-ARCHIVE_PATH = DIR_ARCHIVE
-DATA_PATH = os.path.join(init_conf.DIR_ROOT, "data")
-LOG_PATH = DIR_META
-
-# Initialize HttpFetch to download and extract dataset
-fetcher = HttpFetch(URL, SHA1, ARCHIVE_PATH, DATA_PATH, LOG_PATH)
-fetcher.fetch_extract()
+# Importing this package has no side effects: configuration, device info and dataset provisioning are
+# computed on first access (attribute lookup or the getters below) and cached for the process lifetime.
+
+
+@lru_cache(maxsize=None)
+def get_config():
+    """ Initialize configuration (creates the project directories). """
+    return Config()
+
+
+@lru_cache(maxsize=None)
+def get_cuda_info():
+    """ Probe CUDA devices and save the report under DIR_META. """
+    from .cuda_info import CudaInfo
+    cuda_info = CudaInfo(output_dir=get_config().DIR_META)
+    cuda_info.save_to_yaml()
+    return cuda_info
+
+
+@lru_cache(maxsize=None)
+def provision_dataset():
+    """ Download and extract the dataset into DATA_PATH. """
+    from .http_fetch import HttpFetch
+    fetcher = HttpFetch(URL, SHA1, _lazy("ARCHIVE_PATH"), _lazy("DATA_PATH"), _lazy("LOG_PATH"))
+    fetcher.fetch_extract()
+    return fetcher
+
+
+_LAZY_ATTRIBUTES = {
+    "init_conf": lambda: get_config(),
+    "DIR_TRAINING": lambda: get_config().DIR_TRAINING,
+    "DIR_TESTING": lambda: get_config().DIR_TESTING,
+    "DIR_META": lambda: get_config().DIR_META,
+    "DIR_ARCHIVE": lambda: get_config().DIR_ARCHIVE,
+    "CATEGORIES": lambda: Config.CATEGORIES,
+    # Set paths within the DIR_ROOT structure
+    "ARCHIVE_PATH": lambda: get_config().DIR_ARCHIVE,
+    "DATA_PATH": lambda: os.path.join(get_config().DIR_ROOT, "data"),
+    "LOG_PATH": lambda: get_config().DIR_META,
+    "cuda_info": get_cuda_info,
+    "fetcher": provision_dataset,
+}
+
+
+def _lazy(name):
+    """ Compute a lazy attribute once and memoize it in the module namespace. """
+    value = _LAZY_ATTRIBUTES[name]()
+    globals()[name] = value
+    return value
+
+
+def __getattr__(name):
+    """ PEP 562 hook resolving the lazy module attributes (and the heavy torch/monai-backed classes). """
+    if name in _LAZY_ATTRIBUTES:
+        return _lazy(name)
+    if name == "CudaInfo":
+        from .cuda_info import CudaInfo
+        return CudaInfo
+    if name == "HttpFetch":
+        from .http_fetch import HttpFetch
+        return HttpFetch
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -5,9 +5,11 @@ import os
 
 class Config:
 
+    # All possible categories of brain tumors, available without instantiating (and creating directories)
+    CATEGORIES = ['glioma_tumor', 'meningioma_tumor', 'no_tumor', 'pituitary_tumor']
+
     def __init__(self, use_env_dir=False):
-        # All possible categories of brain tumors
-        self.CATEGORIES = ['glioma_tumor', 'meningioma_tumor', 'no_tumor', 'pituitary_tumor']
+        self.CATEGORIES = list(Config.CATEGORIES)
 
         if use_env_dir:
             # Use the directory specified in DATA_DIRECTORY environment variable
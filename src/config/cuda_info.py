@@ -15,7 +15,7 @@ class CudaInfo:
         """ Gather CUDA and system compatibility information. """
         cuda_available = torch.cuda.is_available()
         device_count = torch.cuda.device_count()
-        cpu_compatible = True if torch.has_mkl else False
+        cpu_compatible = torch.backends.mkl.is_available()
 
         info = {
             "CUDA_Device_Information": {
@@ -1,27 +1,42 @@
 """ config/http_fetch.py """
 
 import os
+import json
 import stat
-import time
 import shutil
+import hashlib
 import logging
-from monai.apps import download_and_extract
+import zipfile
+import urllib.error
+import urllib.request
 
 
 class HttpFetch:
-    """ Download and extract a dataset zip file from a URL, with logging support. """
+    """ Resumable, streaming download and in-place extraction of the dataset zip file, with logging support. """
 
-    def __init__(self, url, sha1, archive_path="archive", data_path="data", log_dir="meta"):
+    MANIFEST_NAME = "dataset_manifest.json"
+
+    def __init__(self, url, sha1, archive_path="archive", data_path="data", log_dir="meta",
+                 folders=("Training", "Testing"), chunk_size=1 << 20, strict=False):
+        """ url may be http(s):// or a file:// mirror. With strict=False an intact tree only needs every file
+        to be present, since PrepData.resize_images rewrites training images in place; strict also checks sizes. """
         self.url = url
         self.sha1 = sha1
         self.data_path = os.path.abspath(data_path)
         self.archive_path = os.path.abspath(archive_path)
         self.log_dir = os.path.abspath(log_dir)
         self.archive_name = "dataset.zip"
+        self.folders = tuple(folders)
+        self.chunk_size = chunk_size
+        self.strict = strict
+        self.manifest_path = os.path.join(self.log_dir, self.MANIFEST_NAME)
         self.logger = logging.getLogger("HttpFetch")
         self.setup_logger()
 
     def setup_logger(self):
+        if self.logger.handlers:
+            return
+        os.makedirs(self.log_dir, exist_ok=True)
         log_path = os.path.join(self.log_dir, "http_fetch.log")
         self.logger.setLevel(logging.INFO)
 
@@ -39,42 +54,140 @@ class HttpFetch:
         self.logger.addHandler(console_handler)
 
     def fetch_extract(self):
+        """ Provision data_path/{Training,Testing}, skipping all work when the content manifest shows it intact. """
+        if self.is_intact():
+            self.logger.info(f"Dataset at {self.data_path} matches {self.manifest_path}, skipping download.")
+            return False
+
+        zip_path = self.download()
+        files = self.extract(zip_path)
+        self.write_manifest(files)
+        os.remove(zip_path)
+        self.logger.info("Download, extraction, and reorganization complete.\n")
+        return True
+
+    def is_intact(self):
+        """ Whether the manifest belongs to this archive and every file it lists is still on disk. """
+        if not os.path.isfile(self.manifest_path):
+            return False
+        with open(self.manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest.get("sha1") != self.sha1:
+            return False
+
+        for relpath, size in manifest["files"].items():
+            path = os.path.join(self.data_path, relpath)
+            try:
+                if self.strict and os.stat(path).st_size != size:
+                    return False
+            except FileNotFoundError:
+                return False
+            if not self.strict and not os.path.isfile(path):
+                return False
+        return True
+
+    def download(self):
+        """ Stream the archive to a .part file, resuming with an HTTP Range request and hashing SHA-1 on the fly. """
+        os.makedirs(self.archive_path, exist_ok=True)
         zip_path = os.path.join(self.archive_path, self.archive_name)
-
-        self.logger.info("Starting download and extraction using MONAI with SHA-1 verification...")
-        download_and_extract(
-            url=self.url,
-            filepath=zip_path,
-            output_dir=self.archive_path,
-            hash_val=self.sha1,
-            hash_type="sha1",
-        )
-
-        self.logger.info(f"Downloaded and extracted dataset to {self.archive_path}")
-        extracted_root = os.path.join(self.archive_path, os.listdir(self.archive_path)[0])
-
-        for folder_name in ["Training", "Testing"]:
-            src_folder = os.path.join(extracted_root, folder_name)
-            dest_folder = os.path.join(self.data_path, folder_name)
-
-            if os.path.exists(dest_folder):
-                self.logger.info(f"Removing existing {folder_name} folder at destination to prevent conflicts.")
-                shutil.rmtree(dest_folder, onexc=self.remove_readonly)
-
-            if os.path.exists(src_folder):
-                shutil.move(src_folder, dest_folder)
-                self.logger.info(f"Moved {folder_name} folder to {self.data_path}")
-            else:
+        part_path = zip_path + ".part"
+        sha1 = hashlib.sha1()
+
+        # Re-hash what an interrupted run already wrote, so verification still covers the whole file
+        offset = 0
+        if os.path.isfile(part_path):
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(self.chunk_size), b""):
+                    sha1.update(chunk)
+                    offset += len(chunk)
+            self.logger.info(f"Resuming download of {self.url} at byte {offset}")
+        else:
+            self.logger.info(f"Starting download of {self.url}")
+
+        request = urllib.request.Request(self.url)
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+        try:
+            response = urllib.request.urlopen(request)
+        except urllib.error.HTTPError as e:
+            if e.code != 416:
+                raise
+            # Range not satisfiable: the partial file already holds the whole archive
+            response = None
+
+        if response is not None:
+            with response, open(part_path, "ab") as f:
+                skip = offset if offset and getattr(response, "status", None) != 206 else 0
+                if skip:
+                    self.logger.info("Server ignored the Range request, discarding already downloaded bytes")
+                for chunk in iter(lambda: response.read(self.chunk_size), b""):
+                    if skip:
+                        dropped = min(skip, len(chunk))
+                        chunk, skip = chunk[dropped:], skip - dropped
+                    sha1.update(chunk)
+                    f.write(chunk)
+
+        digest = sha1.hexdigest()
+        if digest != self.sha1:
+            os.remove(part_path)
+            self.logger.error(f"SHA-1 mismatch for {self.url}: expected {self.sha1}, got {digest}")
+            raise ValueError(f"SHA-1 mismatch for {self.url}: expected {self.sha1}, got {digest}")
+
+        os.replace(part_path, zip_path)
+        self.logger.info(f"Downloaded and verified dataset to {zip_path}")
+        return zip_path
+
+    def extract(self, zip_path):
+        """ Extract the Training/Testing members straight to their final location and drop stale files. """
+        files = {}
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            for member in zip_ref.infolist():
+                # Members look like <repo>-master/Training/<category>/<image>
+                parts = member.filename.split("/")
+                if member.is_dir() or len(parts) < 3 or parts[1] not in self.folders:
+                    continue
+                relpath = os.path.normpath(os.path.join(*parts[1:]))
+                dest = os.path.join(self.data_path, relpath)
+                # Reject "..", absolute and drive components that would write outside data_path
+                root = os.path.realpath(self.data_path)
+                if os.path.isabs(relpath) or os.path.commonpath([root, os.path.realpath(dest)]) != root:
+                    self.logger.error(f"Archive member {member.filename} resolves outside {self.data_path}")
+                    raise ValueError(f"Archive member {member.filename} resolves outside {self.data_path}")
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                with zip_ref.open(member) as src, open(dest, "wb") as dst:
+                    shutil.copyfileobj(src, dst, self.chunk_size)
+                files[relpath] = member.file_size
+
+        for folder_name in self.folders:
+            if not any(relpath.startswith(folder_name + os.sep) for relpath in files):
                 self.logger.error(f"{folder_name} folder not found in the extracted dataset.")
                 raise FileNotFoundError(f"{folder_name} folder not found in the extracted dataset.")
-
-        shutil.rmtree(extracted_root, onexc=self.remove_readonly)
-        self.logger.info(f"Removed original extraction directory: {extracted_root}")
-        os.remove(zip_path)
-        self.logger.info("Download, extraction, and reorganization complete.\n")
+            self.remove_stale(folder_name, files)
+
+        self.logger.info(f"Extracted {len(files)} files to {self.data_path}")
+        return files
+
+    def remove_stale(self, folder_name, files):
+        """ Delete files under data_path/folder_name that are not part of the archive. """
+        root = os.path.join(self.data_path, folder_name)
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if os.path.relpath(path, self.data_path) not in files:
+                    self.remove_readonly(os.remove, path)
+                    self.logger.info(f"Removed stale file {path}")
+
+    def write_manifest(self, files):
+        """ Record the archive hash and extracted file sizes so later runs can skip provisioning. """
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"url": self.url, "sha1": self.sha1, "files": files}, f)
+        os.replace(tmp_path, self.manifest_path)
 
     def remove_readonly(self, func, path):
-        """ Retry removing the file after clearing readonly and waiting briefly. """
-        os.chmod(path, stat.S_IWRITE)
-        time.sleep(0.5)
-        func(path)
+        """ Remove a file, clearing the readonly flag and retrying if needed. """
+        try:
+            func(path)
+        except PermissionError:
+            os.chmod(path, stat.S_IWRITE)
+            func(path)
@@ -0,0 +1,56 @@
+""" funcs/augmentation.py """
+
+import math
+import torch
+import torch.nn.functional as F
+
+
+class BatchAugmenter:
+    """ Random horizontal flip and rotation applied to whole [B, C, H, W] batches with one affine grid_sample. """
+
+    def __init__(self, flip_p=0.5, degrees=10.0, fill=None, mode="nearest", generator=None):
+        """ Flip each sample with probability flip_p and rotate it uniformly in [-degrees, degrees] with the given
+        grid_sample mode (nearest, like RandomRotation's default, or bilinear).
+        fill is the per-channel value of uncovered pixels (in the batch's value space); samples are drawn from
+        generator, or from the global torch RNG seeded by set_determinism when it is None. """
+        self.flip_p = flip_p
+        self.degrees = degrees
+        self.fill = None if fill is None else torch.as_tensor(fill, dtype=torch.float32).view(1, -1, 1, 1)
+        self.mode = mode
+        self.generator = generator
+
+    def sample_params(self, batch_size):
+        """ Draw the per-sample flip mask and rotation angles (radians) on the CPU so results do not depend on device. """
+        flip = torch.rand(batch_size, generator=self.generator) < self.flip_p
+        angles = (torch.rand(batch_size, generator=self.generator) * 2.0 - 1.0) * math.radians(self.degrees)
+        return flip, angles
+
+    def build_theta(self, flip, angles, height, width):
+        """ Affine matrices mapping output to input normalized coordinates: flip first, then rotate in pixel space. """
+        cos, sin = torch.cos(angles), torch.sin(angles)
+        sign = torch.where(flip, -1.0, 1.0)
+        aspect = width / height
+        theta = torch.zeros(len(angles), 2, 3)
+        # Rotation conjugated by the aspect ratio keeps non-square images undistorted
+        theta[:, 0, 0] = sign * cos
+        theta[:, 0, 1] = sign * -sin / aspect
+        theta[:, 1, 0] = sin * aspect
+        theta[:, 1, 1] = cos
+        return theta
+
+    def __call__(self, images):
+        """ Augment a collated float batch [B, C, H, W] and return a new tensor of the same shape. """
+        batch_size, _, height, width = images.shape
+        flip, angles = self.sample_params(batch_size)
+        theta = self.build_theta(flip, angles, height, width).to(device=images.device, dtype=images.dtype)
+
+        grid = F.affine_grid(theta, list(images.shape), align_corners=False)
+        # The CPU grid_sample kernel is several times faster on channels_last inputs
+        images = images.contiguous(memory_format=torch.channels_last)
+        if self.fill is None:
+            return F.grid_sample(images, grid, mode=self.mode, padding_mode="zeros", align_corners=False)
+
+        # Sampling (x - fill) with zero padding and adding fill back yields fill outside the rotated image
+        fill = self.fill.to(device=images.device, dtype=images.dtype)
+        output = F.grid_sample(images - fill, grid, mode=self.mode, padding_mode="zeros", align_corners=False)
+        return output.add_(fill)
@@ -0,0 +1,192 @@
+""" funcs/optimizer.py """
+
+import torch
+
+
+def param_groups(model, weight_decay=0.01):
+    """ Split parameters into a decayed group and a no-decay group for norm weights and biases (all 0/1-d tensors). """
+    decay, no_decay = [], []
+    for param in model.parameters():
+        if not param.requires_grad:
+            continue
+        (no_decay if param.ndim <= 1 else decay).append(param)
+    return [
+        {"params": decay, "weight_decay": weight_decay},
+        {"params": no_decay, "weight_decay": 0.0},
+    ]
+
+
+def implementation_kwargs(implementation):
+    """ torch.optim keyword selecting the multi-tensor (foreach) or fused kernel; "stock" keeps the per-parameter loop. """
+    if implementation == "fused":
+        return {"fused": True}
+    if implementation == "foreach":
+        return {"foreach": True}
+    return {"foreach": False}
+
+
+class QuantizedState:
+    """ Blockwise-quantized optimizer state: int8 codes with one fp32 absmax scale per block. """
+
+    def __init__(self, tensor, block_size=256, signed=True):
+        self.shape = tensor.shape
+        self.numel = tensor.numel()
+        self.block_size = block_size
+        self.signed = signed
+        self.store(tensor)
+
+    def store(self, tensor):
+        """ Quantize tensor (same shape as the parameter) into codes and scales. """
+        flat = tensor.detach().reshape(-1).float()
+        pad = (-self.numel) % self.block_size
+        if pad:
+            flat = torch.cat([flat, flat.new_zeros(pad)])
+        blocks = flat.view(-1, self.block_size)
+        levels = 127.0 if self.signed else 255.0
+        self.scales = blocks.abs().amax(dim=1, keepdim=True).clamp_min(1e-12) / levels
+        codes = torch.round(blocks / self.scales)
+        self.codes = codes.to(torch.int8) if self.signed else codes.to(torch.uint8)
+
+    @classmethod
+    def from_codes(cls, codes, scales, shape, block_size=256, signed=True):
+        """ Rebuild from the codes and scales of a state_dict() (whatever dtype they were cast to on loading). """
+        state = cls.__new__(cls)
+        state.shape = torch.Size(shape)
+        state.numel = state.shape.numel()
+        state.block_size = block_size
+        state.signed = signed
+        state.codes = codes.to(torch.int8 if signed else torch.uint8)
+        state.scales = scales.float()
+        return state
+
+    def load(self):
+        """ Dequantize back to an fp32 tensor of the parameter's shape. """
+        return (self.codes.float() * self.scales).reshape(-1)[:self.numel].view(self.shape)
+
+    def nbytes(self):
+        return self.codes.numel() * self.codes.element_size() + self.scales.numel() * self.scales.element_size()
+
+
+class LowPrecisionAdamW(torch.optim.Optimizer):
+    """ AdamW keeping exp_avg/exp_avg_sq in bf16 or blockwise int8 to cut optimizer-state memory by 2x/4x. """
+
+    def __init__(self, params, lr=1e-3, betas=(0.9, 0.999), eps=1e-8, weight_decay=0.01, state_dtype=torch.bfloat16, block_size=256):
+        """ state_dtype is torch.bfloat16 or torch.int8; math is always done in fp32. """
+        if state_dtype not in (torch.bfloat16, torch.int8):
+            raise ValueError(f"Unsupported optimizer state dtype: {state_dtype}")
+        defaults = dict(lr=lr, betas=betas, eps=eps, weight_decay=weight_decay)
+        super().__init__(params, defaults)
+        self.state_dtype = state_dtype
+        self.block_size = block_size
+
+    def state_dict(self):
+        """ Optimizer state with every QuantizedState as a plain {"codes", "scales"} dict of tensors, so checkpoints
+        holding it load with torch.load(weights_only=True). """
+        state_dict = super().state_dict()
+        state_dict["state"] = {
+            index: {key: {"codes": value.codes, "scales": value.scales} if isinstance(value, QuantizedState) else value
+                    for key, value in param_state.items()}
+            for index, param_state in state_dict["state"].items()
+        }
+        return state_dict
+
+    def load_state_dict(self, state_dict):
+        """ Load a state_dict() and restore the bf16/int8 storage that Optimizer.load_state_dict casts to the
+        parameters' dtype. """
+        super().load_state_dict(state_dict)
+        for group in self.param_groups:
+            for param in group["params"]:
+                state = self.state.get(param)
+                if not state:
+                    continue
+                for key, signed in (("exp_avg", True), ("exp_avg_sq", False)):
+                    value = state[key]
+                    if isinstance(value, dict) and self.state_dtype == torch.int8:
+                        state[key] = QuantizedState.from_codes(value["codes"], value["scales"], param.shape, self.block_size, signed)
+                    elif torch.is_tensor(value) and self.state_dtype == torch.bfloat16:
+                        state[key] = value.to(torch.bfloat16)
+                    else:
+                        raise ValueError(f"Optimizer state was saved with another state_dtype than {self.state_dtype}")
+
+    def _load(self, stored):
+        return stored.load() if isinstance(stored, QuantizedState) else stored.float()
+
+    def _store(self, state, key, value, signed=True):
+        """ Write back fp32 state; int8 second moments are stored as sqrt(v) to keep their dynamic range. """
+        if self.state_dtype == torch.int8:
+            value = value if signed else value.sqrt()
+            if key in state:
+                state[key].store(value)
+            else:
+                state[key] = QuantizedState(value, self.block_size, signed=signed)
+        else:
+            state[key] = value.to(torch.bfloat16)
+
+    @torch.no_grad()
+    def step(self, closure=None):
+        loss = None
+        if closure is not None:
+            with torch.enable_grad():
+                loss = closure()
+
+        for group in self.param_groups:
+            beta1, beta2 = group["betas"]
+            for param in group["params"]:
+                if param.grad is None:
+                    continue
+                grad = param.grad.float()
+                state = self.state[param]
+                if not state:
+                    state["step"] = 0
+                    exp_avg = torch.zeros_like(grad)
+                    exp_avg_sq = torch.zeros_like(grad)
+                else:
+                    exp_avg = self._load(state["exp_avg"])
+                    exp_avg_sq = self._load(state["exp_avg_sq"])
+                    if self.state_dtype == torch.int8:
+                        exp_avg_sq = exp_avg_sq.square()
+                state["step"] += 1
+
+                exp_avg.lerp_(grad, 1.0 - beta1)
+                exp_avg_sq.mul_(beta2).addcmul_(grad, grad, value=1.0 - beta2)
+                bias_correction1 = 1.0 - beta1 ** state["step"]
+                bias_correction2 = 1.0 - beta2 ** state["step"]
+                denom = (exp_avg_sq / bias_correction2).sqrt_().add_(group["eps"])
+
+                if group["weight_decay"]:
+                    param.mul_(1.0 - group["lr"] * group["weight_decay"])
+                param.addcdiv_(exp_avg.to(param.dtype), denom.to(param.dtype), value=-group["lr"] / bias_correction1)
+
+                self._store(state, "exp_avg", exp_avg, signed=True)
+                self._store(state, "exp_avg_sq", exp_avg_sq, signed=False)
+        return loss
+
+
+def build_optimizer(model, name="adamw", lr=1e-3, weight_decay=0.01, momentum=0.9, betas=(0.9, 0.999), implementation=None,
+                    state_dtype=None):
+    """ AdamW or SGD over decay/no-decay parameter groups using the fused (default) or foreach kernels.
+    state_dtype=torch.bfloat16/torch.int8 selects LowPrecisionAdamW instead, which has only its own per-parameter
+    loop: asking for it together with a fused/foreach implementation is an error rather than silently ignored. """
+    groups = param_groups(model, weight_decay)
+    if name == "adamw" and state_dtype is not None:
+        if implementation not in (None, "stock"):
+            raise ValueError(f"LowPrecisionAdamW has no {implementation} implementation")
+        return LowPrecisionAdamW(groups, lr=lr, betas=betas, state_dtype=state_dtype)
+    implementation = implementation or "fused"
+    if name == "adamw":
+        return torch.optim.AdamW(groups, lr=lr, betas=betas, **implementation_kwargs(implementation))
+    if name == "sgd":
+        return torch.optim.SGD(groups, lr=lr, momentum=momentum, nesterov=True, **implementation_kwargs(implementation))
+    raise ValueError(f"Unknown optimizer: {name}")
+
+
+def state_nbytes(optimizer):
+    """ Bytes held in optimizer state tensors (including quantized codes and scales). """
+    total = 0
+    for state in optimizer.state.values():
+        for value in state.values():
+            if isinstance(value, QuantizedState):
+                total += value.nbytes()
+            elif torch.is_tensor(value):
+                total += value.numel() * value.element_size()
+    return total
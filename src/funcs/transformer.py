@@ -1,41 +1,127 @@
 """ funcs/transformers.py """
 
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image
 from torchvision import transforms
+from funcs.augmentation import BatchAugmenter
+from utils.profiler import timed
+
+# ImageNet statistics, the fallback when no dataset statistics are given; grayscale uses their channel average
+DEFAULT_MEAN = {3: [0.485, 0.456, 0.406], 1: [0.449]}
+DEFAULT_STD = {3: [0.229, 0.224, 0.225], 1: [0.226]}
+
+
+def available_cpus():
+    """ Number of CPUs this process may run on (respects affinity masks and container pinning). """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def resize_file(image_path, target_size):
+    """ Resize one image in place through a temp file and rename; returns whether the file was rewritten. """
+    with Image.open(image_path) as img:
+        # Image.open only parses the header, so already-sized files are never decoded
+        if img.size == tuple(target_size):
+            return False
+        image_format = img.format
+        resized = img.resize(target_size, Image.LANCZOS)
+
+    directory, name = os.path.split(image_path)
+    tmp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    try:
+        resized.save(tmp_path, format=image_format)
+        os.replace(tmp_path, image_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return True
+
+
+def _resize_file_star(args):
+    """ Tuple-unpacking wrapper for ProcessPoolExecutor.map. """
+    return resize_file(*args)
 
 
 class Transformer:
     """ Create and customize transformations for image data preprocessing. """
 
-    def __init__(self, resize=(256, 256), mean=None, std=None):
+    def __init__(self, resize=(256, 256), mean=None, std=None, channels=3):
         """ Transformer: resizing, normalization, ... """
         self.resize = resize
-        self.mean = mean if mean else [0.485, 0.456, 0.406]
-        self.std = std if std else [0.229, 0.224, 0.225]
+        self.channels = channels
+        self.mean = mean if mean else DEFAULT_MEAN[channels]
+        self.std = std if std else DEFAULT_STD[channels]
+
+    def _grayscale(self):
+        """ Leading single-channel conversion in grayscale mode (a cheap no-op copy for images decoded as "L"). """
+        return [("transform.grayscale", transforms.Grayscale(num_output_channels=1))] if self.channels == 1 else []
+
+    def _compose(self, steps):
+        """ Compose (stage name, transform) steps; each step is timed separately when profiling is enabled. """
+        return transforms.Compose([timed(name, step) for name, step in steps])
 
     def get_basic_transform(self):
         """ Transformation pipeline including resizing, tensor conversion, and normalization. """
-        return transforms.Compose([
-            transforms.Resize(self.resize),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=self.mean, std=self.std)
+        return self._compose(self._grayscale() + [
+            ("transform.resize", transforms.Resize(self.resize)),
+            ("transform.to_tensor", transforms.ToTensor()),
+            ("transform.normalize", transforms.Normalize(mean=self.mean, std=self.std)),
         ])
 
     def get_augmentation_transform(self):
         """ Augmented transformation pipeline with random flips and rotation. """
-        return transforms.Compose([
-            transforms.Resize(self.resize),
-            transforms.RandomHorizontalFlip(),
-            transforms.RandomRotation(10),
-            transforms.ToTensor(),
-            transforms.Normalize(mean=self.mean, std=self.std)
+        return self._compose(self._grayscale() + [
+            ("transform.resize", transforms.Resize(self.resize)),
+            ("transform.flip", transforms.RandomHorizontalFlip()),
+            ("transform.rotate", transforms.RandomRotation(10)),
+            ("transform.to_tensor", transforms.ToTensor()),
+            ("transform.normalize", transforms.Normalize(mean=self.mean, std=self.std)),
         ])
 
-    def resize_image_files(self, image_files, target_size):
-        """ Resize a list of images to the target size and save them. """
-        for image_path in image_files:
-            with Image.open(image_path) as img:
-                if img.size != target_size:
-                    img = img.resize(target_size, Image.LANCZOS)
-                    img.save(image_path)
-        print(f"All images resized to {target_size}\n", flush=True)
+    def get_batch_augmentation(self, flip_p=0.5, degrees=10, generator=None):
+        """ Batch-level counterpart of get_augmentation_transform, applied to normalized [B, C, H, W] batches after collation. """
+        # Uncovered pixels become black, as with RandomRotation on the PIL image before normalization
+        fill = [-m / s for m, s in zip(self.mean, self.std)]
+        return BatchAugmenter(flip_p=flip_p, degrees=degrees, fill=fill, generator=generator)
+
+    def resize_image_files(self, image_files, target_size, marker_path=None, processes=None):
+        """ Resize a list of images to the target size across a process pool, writing each file atomically.
+        When marker_path is given, a completed run is recorded there and an unchanged tree is skipped next time. """
+        target_size = tuple(target_size)
+        fingerprint = self._fingerprint(image_files, target_size) if marker_path else None
+        if marker_path and os.path.isfile(marker_path):
+            with open(marker_path, "r") as f:
+                if json.load(f).get("fingerprint") == fingerprint:
+                    print(f"All images already resized to {target_size}, skipping\n", flush=True)
+                    return
+
+        processes = processes or available_cpus()
+        jobs = [(image_path, target_size) for image_path in image_files]
+        if processes > 1 and len(jobs) > processes:
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                rewritten = sum(pool.map(_resize_file_star, jobs, chunksize=64))
+        else:
+            rewritten = sum(map(_resize_file_star, jobs))
+
+        if marker_path:
+            # Fingerprint again: rewritten files have new sizes and mtimes
+            os.makedirs(os.path.dirname(os.path.abspath(marker_path)), exist_ok=True)
+            tmp_path = marker_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"target_size": list(target_size), "count": len(jobs), "fingerprint": self._fingerprint(image_files, target_size)}, f)
+            os.replace(tmp_path, marker_path)
+        print(f"All images resized to {target_size} ({rewritten} rewritten)\n", flush=True)
+
+    @staticmethod
+    def _fingerprint(image_files, target_size):
+        """ Hash of the target size and every file's (path, size, mtime) from a stat call only. """
+        sha1 = hashlib.sha1(repr(target_size).encode())
+        for image_path in sorted(map(str, image_files)):
+            stat = os.stat(image_path)
+            sha1.update(f"{image_path}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+        return sha1.hexdigest()
@@ -7,9 +7,10 @@ from src.config.config import CATEGORIES
 class BrainTumorDataset(Dataset):
     """ Lazy loading dataset only when they are necessary for batches. """
 
-    def __init__(self, root_dir, transform=None):
-        """ Dataset for brain tumors based oon images from MRI. """
+    def __init__(self, root_dir, transform=None, mode="RGB"):
+        """ Dataset for brain tumors based oon images from MRI, decoded in mode ("RGB" or single-channel "L"). """
         self.root_dir = Path(root_dir)
+        self.mode = mode
         self.transform = transform
         self.image_paths, self.labels = self._load_paths_and_labels()
 
@@ -39,7 +40,7 @@ class BrainTumorDataset(Dataset):
     def __getitem__(self, idx):
         """ Load and return image and label corresponding to the given index. """
         image_path = self.image_paths[idx]
-        image = Image.open(image_path).convert('RGB')
+        image = Image.open(image_path).convert(self.mode)
         label = self.labels[idx]
 
         if self.transform:
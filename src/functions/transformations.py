@@ -4,15 +4,21 @@ from torchvision import transforms
 class Transformations:
     """ Create and customize transformations for image data preprocessing."""
 
-    def __init__(self, resize=(224, 224), mean=None, std=None):
+    def __init__(self, resize=(224, 224), mean=None, std=None, channels=3):
         """ Transformations: resizing, normalization, ... """
         self.resize = resize
-        self.mean = mean if mean else [0.485, 0.456, 0.406]
-        self.std = std if std else [0.229, 0.224, 0.225]
+        self.channels = channels
+        # Single-channel (grayscale MRI) mode collapses the ImageNet defaults to their channel average
+        self.mean = mean if mean else ([0.485, 0.456, 0.406] if channels == 3 else [0.449])
+        self.std = std if std else ([0.229, 0.224, 0.225] if channels == 3 else [0.226])
+
+    def _grayscale(self):
+        """ Leading single-channel conversion in grayscale mode (a cheap no-op copy for images decoded as "L"). """
+        return [transforms.Grayscale(num_output_channels=1)] if self.channels == 1 else []
 
     def get_basic_transform(self):
         """ Transformation pipeline including resizing, tensor conversion, and normalization. """
-        return transforms.Compose([
+        return transforms.Compose(self._grayscale() + [
             transforms.Resize(self.resize),
             transforms.ToTensor(),
             transforms.Normalize(mean=self.mean, std=self.std)
@@ -20,7 +26,7 @@ class Transformations:
 
     def get_augmentation_transform(self):
         """ Augmented transformation pipeline with random flips and rotation. """
-        return transforms.Compose([
+        return transforms.Compose(self._grayscale() + [
             transforms.Resize(self.resize),
             transforms.RandomHorizontalFlip(),
             transforms.RandomRotation(10),
@@ -0,0 +1,231 @@
+""" models/checkpoint.py """
+
+import os
+import copy
+import json
+import queue
+import random
+import threading
+import numpy as np
+import torch
+
+
+def to_cpu(obj):
+    """ Deep copy of a (nested) state dict with every tensor cloned to CPU memory, detached from live training state. """
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {key: to_cpu(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(value) for value in obj)
+    return copy.deepcopy(obj)
+
+
+def rng_state():
+    """ Python, NumPy and torch generator states (the ones seeded by monai's set_determinism), as tensors and plain
+    containers: with the model and optimizer state dicts also tensor-only (LowPrecisionAdamW included), a whole
+    checkpoint loads with torch.load(weights_only=True), which load_checkpoint and load_model use. """
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+    numpy_state = {"name": name, "keys": torch.from_numpy(keys.astype(np.int64)), "pos": pos,
+                   "has_gauss": has_gauss, "cached_gaussian": cached_gaussian}
+    state = {"python": random.getstate(), "numpy": numpy_state, "torch": torch.get_rng_state()}
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def set_rng_state(state):
+    """ Restore generator states captured by rng_state(). """
+    random.setstate(state["python"])
+    numpy_state = state["numpy"]
+    np.random.set_state((numpy_state["name"], numpy_state["keys"].numpy().astype(np.uint32), numpy_state["pos"],
+                         numpy_state["has_gauss"], numpy_state["cached_gaussian"]))
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def _fsync_dir(directory):
+    """ Persist a rename in directory (no-op where directories cannot be opened, e.g. Windows). """
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_save(obj, path):
+    """ torch.save to a temporary file, fsync it and rename over path: readers see the old or the new file, never half of one. """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        torch.save(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(os.path.dirname(os.path.abspath(path)))
+
+
+class Checkpointer:
+    """ Crash-safe checkpoints of a Trainer written off the training thread.
+    save() snapshots model, optimizer, scheduler, RNG and sampler state to CPU memory and returns; a background
+    thread serializes the snapshot with an atomic rename and then rewrites the index (checkpoints.json), so a crash
+    at any point leaves the previous checkpoint and index intact. The last keep_last checkpoints are kept, plus
+    the best one by the validation metric. At most one snapshot waits behind the one being written; a save()
+    issued while the writer is still behind blocks until that slot frees, bounding the extra host memory. """
+
+    INDEX = "checkpoints.json"
+
+    def __init__(self, directory, keep_last=3, metric="accuracy", mode="max", extra=None):
+        """ metric is a key of Trainer.evaluate()'s result, maximized (mode "max") or minimized ("min"); extra is
+        stored verbatim in every checkpoint (e.g. {"split": PrepData.split_state()}). """
+        if mode not in ("max", "min"):
+            raise ValueError(f"Unknown mode: {mode}")
+        self.directory = directory
+        self.keep_last = max(int(keep_last), 1)
+        self.metric = metric
+        self.mode = mode
+        self.extra = extra or {}
+        os.makedirs(directory, exist_ok=True)
+        self.index = self.read_index(directory)
+        self._queue = queue.Queue(maxsize=1)
+        self._error = None
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def read_index(cls, directory):
+        """ {"checkpoints": [...oldest first], "best": entry or None} from directory, empty when there is none yet. """
+        path = os.path.join(directory, cls.INDEX)
+        if not os.path.isfile(path):
+            return {"checkpoints": [], "best": None}
+        with open(path) as f:
+            return json.load(f)
+
+    @classmethod
+    def latest(cls, directory):
+        """ Path of the most recent checkpoint in directory, or None. """
+        checkpoints = cls.read_index(directory)["checkpoints"] if os.path.isdir(directory) else []
+        return os.path.join(directory, checkpoints[-1]["file"]) if checkpoints else None
+
+    @classmethod
+    def best(cls, directory):
+        """ Path of the best checkpoint in directory by the tracked metric, or None. """
+        best = cls.read_index(directory)["best"] if os.path.isdir(directory) else None
+        return os.path.join(directory, best["file"]) if best else None
+
+    def _improved(self, value):
+        best = self.index["best"]
+        if value is None:
+            return False
+        if best is None or best["metric"] is None:
+            return True
+        return value > best["metric"] if self.mode == "max" else value < best["metric"]
+
+    def snapshot(self, trainer, sampler=None, consumed=0, metrics=None):
+        """ CPU copy of everything needed to resume trainer; consumed is the number of samples of the current
+        epoch already trained when checkpointing mid-epoch (0 at epoch end). """
+        mid_epoch = consumed > 0
+        state = {
+            "model": to_cpu(trainer.module.state_dict()),
+            "optimizer": to_cpu(trainer.optimizer.state_dict()),
+            "scheduler": to_cpu(trainer.scheduler.state_dict()) if trainer.scheduler is not None else None,
+            # A mid-epoch checkpoint resumes inside the epoch it was taken in
+            "epoch": trainer.epoch - 1 if mid_epoch else trainer.epoch,
+            "rng": rng_state(),
+            "sampler": sampler.state_dict(consumed) if hasattr(sampler, "state_dict") else None,
+            "metrics": metrics,
+            **to_cpu(self.extra),
+        }
+        return state
+
+    def save(self, trainer, sampler=None, consumed=0, metrics=None):
+        """ Queue a checkpoint of trainer (rank 0 only) and return once its state is copied to CPU memory. """
+        self._raise()
+        if trainer.rank != 0:
+            return
+        state = self.snapshot(trainer, sampler, consumed, metrics)
+        value = metrics.get(self.metric) if metrics else None
+        position = state["sampler"]["start"] if consumed and state["sampler"] else consumed
+        suffix = f"_sample{position:08d}" if consumed else ""
+        entry = {"file": f"epoch{trainer.epoch:04d}{suffix}.pt", "epoch": trainer.epoch, "position": position, "metric": value}
+        self._queue.put((state, entry))
+
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, state, entry):
+        """ Write one checkpoint, then the index that references it, then prune files the index no longer names. """
+        atomic_save(state, os.path.join(self.directory, entry["file"]))
+        index = {"checkpoints": [e for e in self.index["checkpoints"] if e["file"] != entry["file"]] + [entry],
+                 "best": self.index["best"]}
+        if self._improved(entry["metric"]):
+            index["best"] = entry
+        index["checkpoints"] = index["checkpoints"][-self.keep_last:]
+
+        tmp_path = os.path.join(self.directory, self.INDEX + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.directory, self.INDEX))
+        _fsync_dir(self.directory)
+
+        keep = {e["file"] for e in index["checkpoints"] + [index["best"]] if e}
+        for e in self.index["checkpoints"] + [self.index["best"]]:
+            if e and e["file"] not in keep and os.path.isfile(os.path.join(self.directory, e["file"])):
+                os.remove(os.path.join(self.directory, e["file"]))
+        self.index = index
+
+    def _raise(self):
+        """ Re-raise a failure of the background writer on the training thread. """
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError(f"Checkpoint write failed: {error}") from error
+
+    def wait(self):
+        """ Block until every queued checkpoint is on disk. """
+        self._queue.join()
+        self._raise()
+
+    def close(self):
+        """ Flush pending checkpoints and stop the writer thread. """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise()
+
+
+def load_checkpoint(path):
+    """ Checkpoint dict written by Checkpointer, loaded without unpickling arbitrary objects. """
+    return torch.load(path, map_location="cpu", weights_only=True)
+
+
+def restore(trainer, state, sampler=None):
+    """ Load a checkpoint (dict or path) into trainer (model, optimizer, scheduler, epoch), restore the RNG state and
+    the sampler position, and return the checkpoint dict, whose extra entries (e.g. "split") the caller applies.
+    Samplers with load_state_dict (ShardedSampler) resume mid-epoch at the saved sample; with any other sampler an
+    interrupted epoch is replayed from its start. Epoch-end checkpoints resume bit-exactly; mid-epoch ones repeat
+    the sample order but not batch augmentation, whose RNG the prefetch thread has already advanced. """
+    if not isinstance(state, dict):
+        state = load_checkpoint(state)
+    trainer.module.load_state_dict(state["model"])
+    trainer.optimizer.load_state_dict(state["optimizer"])
+    if trainer.scheduler is not None and state["scheduler"] is not None:
+        trainer.scheduler.load_state_dict(state["scheduler"])
+    trainer.epoch = state["epoch"]
+    set_rng_state(state["rng"])
+    if sampler is not None and state["sampler"] is not None and hasattr(sampler, "load_state_dict"):
+        sampler.load_state_dict(state["sampler"])
+    return state
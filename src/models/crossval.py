@@ -0,0 +1,127 @@
+""" models/crossval.py """
+
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Subset
+from funcs.transformer import available_cpus
+from funcs.optimizer import build_optimizer
+from utils.dataset import PackedBrainTumorDataset
+from utils.packstore import PackStore
+from utils.folds import fold_indices
+from utils.stats import store_stats
+from models.model import TumorClassifier, Trainer
+
+
+def _init_fold_worker(threads):
+    """ Pin each pool process to its share of the CPU budget. """
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def run_fold(fold, pack_path, folds, options):
+    """ Train and validate one fold on index subsets of the shared pack; returns its per-epoch history and final metrics.
+    Normalization statistics come from the fold's training images only, so its validation images never leak into them. """
+    start = time.perf_counter()
+    train_idx, valid_idx = fold_indices(folds, fold)
+    store = PackStore(pack_path)
+    stats = store_stats(store, train_idx)
+    dataset = PackedBrainTumorDataset(store, mean=stats.mean.tolist(), std=stats.std.tolist())
+    train_loader = DataLoader(Subset(dataset, train_idx.tolist()), batch_size=options["batch_size"], shuffle=True,
+                              generator=torch.Generator().manual_seed(options["seed"] + fold))
+    valid_loader = DataLoader(Subset(dataset, valid_idx.tolist()), batch_size=options["batch_size"], shuffle=False)
+
+    torch.manual_seed(options["seed"])
+    model = TumorClassifier(in_channels=dataset.mean.shape[0])
+    trainer = Trainer(model, optimizer=build_optimizer(model, lr=options["lr"]), compile=options["compile"])
+    history = trainer.fit(train_loader, valid_loader, options["epochs"])
+    final = history[-1]["valid"]
+    return {
+        "fold": fold,
+        "train_size": len(train_idx),
+        "valid_size": len(valid_idx),
+        "mean": stats.mean.tolist(),
+        "std": stats.std.tolist(),
+        "valid_loss": final["loss"],
+        "valid_accuracy": final["accuracy"],
+        "best_valid_accuracy": max(entry["valid"]["accuracy"] for entry in history),
+        "seconds": time.perf_counter() - start,
+        "history": history,
+    }
+
+
+def summarize(results):
+    """ Mean, std, min and max of each scalar fold metric. """
+    summary = {}
+    for metric in ("valid_loss", "valid_accuracy", "best_valid_accuracy", "seconds"):
+        values = np.array([result[metric] for result in results], dtype=np.float64)
+        summary[metric] = {"mean": float(values.mean()), "std": float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+                           "min": float(values.min()), "max": float(values.max())}
+    return summary
+
+
+class CrossValidator:
+    """ Run the k folds of a stratified split concurrently under a total CPU budget, all reading one memory-mapped pack. """
+
+    def __init__(self, pack_path, folds, cpu_budget=None, threads_per_fold=1, epochs=5, batch_size=32, lr=1e-3,
+                 seed=42, compile=False):
+        """ pack_path is the "full" PackStore aligned with folds (fold ids from PrepData.folds()); cpu_budget cores
+        (all available by default) are split into cpu_budget // threads_per_fold concurrent folds. Each fold
+        normalizes with the mean/std of its own training images. """
+        self.pack_path = pack_path
+        self.folds = np.asarray(folds)
+        self.k = int(self.folds.max()) + 1
+        self.cpu_budget = cpu_budget or available_cpus()
+        self.threads_per_fold = max(min(threads_per_fold, self.cpu_budget), 1)
+        self.options = dict(epochs=epochs, batch_size=batch_size, lr=lr, seed=seed, compile=compile)
+
+    def run(self):
+        """ Train every fold and return per-fold results (in fold order) with their aggregate. """
+        workers = max(min(self.cpu_budget // self.threads_per_fold, self.k), 1)
+        print(f"Cross-validating {self.k} folds, {workers} at a time with {self.threads_per_fold} threads each", flush=True)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_fold_worker, initargs=(self.threads_per_fold,)) as pool:
+            futures = [pool.submit(run_fold, fold, self.pack_path, self.folds, self.options) for fold in range(self.k)]
+            results = [future.result() for future in futures]
+
+        summary = summarize(results)
+        for result in results:
+            print(f"Fold {result['fold']}: valid acc {result['valid_accuracy']:.3f} (best {result['best_valid_accuracy']:.3f}), "
+                  f"loss {result['valid_loss']:.4f}, {result['seconds']:.1f}s", flush=True)
+        accuracy = summary["valid_accuracy"]
+        print(f"{self.k}-fold valid accuracy: {accuracy['mean']:.3f} +/- {accuracy['std']:.3f}", flush=True)
+        return {"folds": results, "summary": summary}
+
+
+if __name__ == "__main__":
+    import config
+    from utils.prepdata import PrepData
+
+    parser = argparse.ArgumentParser(description="Parallel stratified k-fold cross-validation on the Training directory.")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--cpu-budget", type=int, default=None, help="total cores for all folds (default: all available)")
+    parser.add_argument("--threads-per-fold", type=int, default=1)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--grayscale", action="store_true")
+    parser.add_argument("--output", help="write per-fold results and the summary JSON here")
+    args = parser.parse_args()
+
+    mode = "L" if args.grayscale else "RGB"
+    init_conf = config.get_config()
+    data_prep = PrepData(config=init_conf, train_dir=init_conf.DIR_TRAINING)
+    _, _, folds = data_prep.folds(args.folds)
+    # One decoded pack of the whole directory, shared read-only by every fold process
+    store = data_prep.pack(mode=mode, splits=("full",))["full"]
+    results = CrossValidator(
+        store.path, folds, cpu_budget=args.cpu_budget, threads_per_fold=args.threads_per_fold, epochs=args.epochs,
+        batch_size=args.batch_size, lr=args.lr,
+    ).run()
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
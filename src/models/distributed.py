@@ -0,0 +1,115 @@
+""" models/distributed.py """
+
+import os
+import json
+import math
+import argparse
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.utils.data import DataLoader
+from funcs.transformer import available_cpus
+from funcs.optimizer import build_optimizer
+from utils.dataset import PackedBrainTumorDataset
+from utils.optimizer import warmup_cosine
+from utils.sampler import ShardedSampler
+from models.model import TumorClassifier, Trainer
+
+
+def init_process(rank, world_size, master_addr=None, master_port=None, threads=None):
+    """ Join the gloo process group and split the machine's cores between the local processes. An explicit
+    master_addr/master_port wins over an inherited MASTER_ADDR/MASTER_PORT, which win over 127.0.0.1:29500. """
+    os.environ["MASTER_ADDR"] = master_addr or os.environ.get("MASTER_ADDR", "127.0.0.1")
+    os.environ["MASTER_PORT"] = str(master_port or os.environ.get("MASTER_PORT", 29500))
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    torch.set_num_threads(threads or max(available_cpus() // max(int(os.environ.get("LOCAL_WORLD_SIZE", world_size)), 1), 1))
+
+
+def train_worker(local_rank, options, results=None):
+    """ One data-parallel rank: identical seeded model, a ShardedSampler over the shared PackStore, DDP training.
+    Rank 0 puts the training history on results when given. """
+    rank = options["node_rank"] * options["nproc"] + local_rank
+    world_size = options["nnodes"] * options["nproc"]
+    os.environ["LOCAL_WORLD_SIZE"] = str(options["nproc"])
+    init_process(rank, world_size, options["master_addr"], options["master_port"], options.get("threads"))
+    try:
+        # Packs are memory-mapped, so every process shares one page cache instead of copying the split lists
+        train_dataset = PackedBrainTumorDataset(options["train_pack"], mean=options["mean"], std=options["std"])
+        valid_dataset = PackedBrainTumorDataset(options["valid_pack"], mean=options["mean"], std=options["std"])
+        train_sampler = ShardedSampler(len(train_dataset), world_size, rank, seed=options["seed"])
+        valid_sampler = ShardedSampler(len(valid_dataset), world_size, rank, shuffle=False, pad=False)
+        batch_size = options["batch_size"]
+        train_loader = DataLoader(train_dataset, batch_size=batch_size, sampler=train_sampler, num_workers=options["num_workers"])
+        valid_loader = DataLoader(valid_dataset, batch_size=batch_size, sampler=valid_sampler, num_workers=options["num_workers"])
+
+        torch.manual_seed(options["seed"])
+        model = TumorClassifier(in_channels=train_dataset.mean.shape[0])
+        # Global batch grows with the world size; scale the learning rate linearly with it
+        optimizer = build_optimizer(model, lr=options["lr"] * world_size)
+        steps_per_epoch = math.ceil(len(train_loader) / options["accumulation_steps"])
+        scheduler = warmup_cosine(optimizer, warmup_steps=steps_per_epoch, total_steps=steps_per_epoch * options["epochs"])
+        trainer = Trainer(
+            model,
+            optimizer=optimizer,
+            scheduler=scheduler,
+            accumulation_steps=options["accumulation_steps"],
+            compile=options["compile"],
+            bucket_cap_mb=options["bucket_cap_mb"],
+        )
+        history = trainer.fit(train_loader, valid_loader, options["epochs"], target_accuracy=options.get("target_accuracy"))
+        if rank == 0:
+            if options.get("checkpoint"):
+                torch.save(trainer.module.state_dict(), options["checkpoint"])
+            if results is not None:
+                results.put(history)
+    finally:
+        dist.destroy_process_group()
+
+
+def launch(train_pack, valid_pack, nproc=1, nnodes=1, node_rank=0, master_addr="127.0.0.1", master_port=29500,
+           epochs=1, batch_size=32, lr=1e-3, accumulation_steps=1, mean=None, std=None, seed=42, compile=False,
+           bucket_cap_mb=25, num_workers=0, threads=None, target_accuracy=None, checkpoint=None):
+    """ Spawn nproc local ranks (of nnodes * nproc in total) and return rank 0's history when it runs on this node. """
+    options = dict(locals())
+    context = mp.get_context("spawn")
+    results = context.SimpleQueue() if node_rank == 0 else None
+    mp.spawn(train_worker, args=(options, results), nprocs=nproc, join=True)
+    return results.get() if results is not None and not results.empty() else None
+
+
+if __name__ == "__main__":
+    import config
+    from utils.prepdata import PrepData
+
+    parser = argparse.ArgumentParser(description="Data-parallel CPU training over gloo: N local processes, optionally on several machines.")
+    parser.add_argument("--nproc", type=int, default=2, help="processes on this machine")
+    parser.add_argument("--nnodes", type=int, default=1)
+    parser.add_argument("--node-rank", type=int, default=0)
+    parser.add_argument("--master-addr", default="127.0.0.1")
+    parser.add_argument("--master-port", type=int, default=29500)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32, help="per-process batch size")
+    parser.add_argument("--lr", type=float, default=1e-3, help="single-process learning rate, scaled by the world size")
+    parser.add_argument("--accumulation-steps", type=int, default=1)
+    parser.add_argument("--bucket-cap-mb", type=float, default=25)
+    parser.add_argument("--target-accuracy", type=float, default=0.9)
+    parser.add_argument("--grayscale", action="store_true")
+    parser.add_argument("--compile", action="store_true")
+    parser.add_argument("--output", help="write rank 0's training history JSON here")
+    args = parser.parse_args()
+
+    mode = "L" if args.grayscale else "RGB"
+    init_conf = config.get_config()
+    data_prep = PrepData(config=init_conf, train_dir=init_conf.DIR_TRAINING)
+    stores = data_prep.pack(mode=mode)
+    stats = data_prep.dataset_stats(mode=mode)
+    history = launch(
+        stores["train"].path, stores["valid"].path, nproc=args.nproc, nnodes=args.nnodes, node_rank=args.node_rank,
+        master_addr=args.master_addr, master_port=args.master_port, epochs=args.epochs, batch_size=args.batch_size,
+        lr=args.lr, accumulation_steps=args.accumulation_steps, mean=stats["mean"], std=stats["std"],
+        compile=args.compile, bucket_cap_mb=args.bucket_cap_mb, target_accuracy=args.target_accuracy,
+        checkpoint=os.path.join(init_conf.DIR_META, "ddp_model.pt"),
+    )
+    if args.output and history is not None:
+        with open(args.output, "w") as f:
+            json.dump(history, f, indent=2)
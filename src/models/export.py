@@ -0,0 +1,109 @@
+""" models/export.py """
+
+import os
+import copy
+import argparse
+import importlib.util
+import torch
+from PIL import Image
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+from funcs.transformer import Transformer
+from models.model import load_model, load_preprocessing, input_channels
+
+
+def checkpoint_transformer(checkpoint, data_prep):
+    """ Transformer with the mean/std/resize checkpoint was trained with, so calibration and accuracy checks see the
+    inputs serving will. Checkpoints without a "preprocess" entry fall back, with a warning, to the statistics of
+    data_prep's current training split, which differ from training's after --dedup or a restored split. """
+    channels = input_channels(load_model(checkpoint))
+    preprocess = load_preprocessing(checkpoint) or {}
+    if "mean" not in preprocess:
+        print(f"Warning: {checkpoint} stores no preprocessing statistics, using those of the current training split", flush=True)
+        stats = data_prep.dataset_stats(mode="L" if channels == 1 else "RGB")
+        preprocess = {**preprocess, "mean": stats["mean"], "std": stats["std"]}
+    return Transformer(resize=tuple(preprocess.get("resize", data_prep.target_size)), mean=preprocess["mean"],
+                       std=preprocess["std"], channels=channels)
+
+
+def calibration_batches(image_files, transformer=None, num_images=256, batch_size=32):
+    """ Yield normalized batches from the first num_images files (e.g. PrepData.valid_images) for int8 calibration. """
+    transformer = transformer or Transformer()
+    transform = transformer.get_basic_transform()
+    mode = "L" if transformer.channels == 1 else "RGB"
+    image_files = list(image_files)[:num_images]
+    for start in range(0, len(image_files), batch_size):
+        batch = []
+        for image_path in image_files[start:start + batch_size]:
+            with Image.open(image_path) as img:
+                batch.append(transform(img.convert(mode)))
+        yield torch.stack(batch)
+
+
+def export_torchscript(model, path, example):
+    """ Trace and freeze the model to a TorchScript file. """
+    with torch.no_grad():
+        traced = torch.jit.freeze(torch.jit.trace(model.eval(), example))
+    traced.save(path)
+    return path
+
+
+def export_onnx(model, path, example):
+    """ Export to ONNX with a dynamic batch axis; returns None when the onnx package is not installed. """
+    if importlib.util.find_spec("onnx") is None:
+        print("onnx is not installed, skipping ONNX export", flush=True)
+        return None
+    torch.onnx.export(
+        model.eval(), (example,), path, input_names=["images"], output_names=["logits"],
+        dynamic_axes={"images": {0: "batch"}, "logits": {0: "batch"}},
+    )
+    return path
+
+
+def quantize_int8(model, calibration, backend="x86"):
+    """ Post-training static int8 quantization (FX graph mode), calibrated on an iterable of input batches. """
+    torch.backends.quantized.engine = backend
+    model = copy.deepcopy(model).eval().to(memory_format=torch.contiguous_format)
+    batches = iter(calibration)
+    first = next(batches)
+    prepared = prepare_fx(model, get_default_qconfig_mapping(backend), example_inputs=(first,))
+    with torch.no_grad():
+        prepared(first)
+        for batch in batches:
+            prepared(batch)
+    return convert_fx(prepared)
+
+
+def export_all(checkpoint, out_dir, calibration_files, input_size=(256, 256), transformer=None):
+    """ Write fp32 TorchScript/ONNX and an int8 TorchScript artifact; returns their paths by name. """
+    os.makedirs(out_dir, exist_ok=True)
+    model = load_model(checkpoint)
+    example = torch.randn(1, input_channels(model), *input_size)
+    transformer = transformer or Transformer(channels=input_channels(model))
+
+    artifacts = {
+        "fp32_torchscript": export_torchscript(model, os.path.join(out_dir, "model_fp32.pt"), example),
+        "fp32_onnx": export_onnx(model, os.path.join(out_dir, "model_fp32.onnx"), example),
+    }
+    int8 = quantize_int8(model, calibration_batches(calibration_files, transformer))
+    artifacts["int8_torchscript"] = export_torchscript(int8, os.path.join(out_dir, "model_int8.pt"), example)
+    for name, path in artifacts.items():
+        if path:
+            print(f"{name}: {path} ({os.path.getsize(path) / 2 ** 20:.1f} MB)", flush=True)
+    return artifacts
+
+
+if __name__ == "__main__":
+    import config
+    from utils.prepdata import PrepData
+
+    parser = argparse.ArgumentParser(description="Export TorchScript/ONNX and int8-quantized CPU inference artifacts.")
+    parser.add_argument("checkpoint", help="model state dict or training checkpoint to load")
+    parser.add_argument("--out-dir", default=None, help="output directory (default: DIR_META/export)")
+    args = parser.parse_args()
+
+    init_conf = config.get_config()
+    data_prep = PrepData(config=init_conf, train_dir=init_conf.DIR_TRAINING)
+    transformer = checkpoint_transformer(args.checkpoint, data_prep)
+    export_all(args.checkpoint, args.out_dir or os.path.join(init_conf.DIR_META, "export"), data_prep.valid_images,
+               input_size=transformer.resize, transformer=transformer)
@@ -0,0 +1,99 @@
+""" models/features.py """
+
+import os
+import json
+import hashlib
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+from funcs.optimizer import build_optimizer
+from utils.dataset import PackedBrainTumorDataset
+from models.model import Trainer
+
+
+def backbone_digest(model):
+    """ Hash of every backbone parameter and buffer except the classification head. """
+    sha1 = hashlib.sha1()
+    for name, tensor in sorted(model.state_dict().items()):
+        if name.startswith("backbone.fc."):
+            continue
+        sha1.update(name.encode())
+        sha1.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return sha1.hexdigest()
+
+
+class FeatureCache:
+    """ Frozen-backbone embeddings per split in memory-mapped .npy files, row i belonging to image i of the split.
+    Entries are keyed by the backbone weights, the preprocessing config and the split's manifest digest, so any
+    change to one of them selects a new entry instead of serving stale features. """
+
+    def __init__(self, meta_dir, batch_size=64):
+        """ Features are cached as meta_dir/features/<key>.npy with labels in <key>.labels.npy. """
+        self.cache_dir = os.path.join(meta_dir, "features")
+        self.batch_size = batch_size
+
+    @staticmethod
+    def key(model_digest, transform_config, data_key):
+        """ Cache key from backbone_digest(), a JSON-serializable preprocessing config and a manifest digest. """
+        transform = json.dumps(transform_config, sort_keys=True)
+        return hashlib.sha1(f"{model_digest}\0{transform}\0{data_key}".encode()).hexdigest()
+
+    @torch.no_grad()
+    def extract(self, model, dataset, labels, key):
+        """ (features, labels) for dataset, running the backbone once and reusing the cached arrays afterwards. """
+        if not len(dataset):
+            raise ValueError(f"Cannot extract features for cache entry {key}: the dataset is empty")
+        path = os.path.join(self.cache_dir, f"{key}.npy")
+        labels_path = os.path.join(self.cache_dir, f"{key}.labels.npy")
+        if os.path.isfile(path) and os.path.isfile(labels_path):
+            return np.load(path, mmap_mode="c"), np.load(labels_path)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        model = model.eval()
+        loader = DataLoader(dataset, batch_size=self.batch_size, shuffle=False)
+        tmp_path = path + ".tmp.npy"
+        features = None
+        start = 0
+        for images, _ in loader:
+            embeddings = model.features(images.contiguous(memory_format=torch.channels_last)).float().numpy()
+            if features is None:
+                features = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(len(dataset), embeddings.shape[1]))
+            features[start:start + len(embeddings)] = embeddings
+            start += len(embeddings)
+        features.flush()
+        del features
+        np.save(labels_path, np.asarray(labels, dtype=np.int64))
+        os.replace(tmp_path, path)
+        print(f"Cached {len(dataset)} backbone features to {path}", flush=True)
+        return np.load(path, mmap_mode="c"), np.load(labels_path)
+
+
+def feature_loader(features, labels, batch_size=256, shuffle=False):
+    """ DataLoader over cached features (zero-copy from the copy-on-write memory map) and integer labels. """
+    dataset = TensorDataset(torch.from_numpy(np.asarray(features)), torch.from_numpy(np.asarray(labels)))
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle)
+
+
+def cached_splits(model, stores, data_keys, transform_config, meta_dir, mean=None, std=None):
+    """ Extract (or load) features for every split in stores ({split: PackStore}), keyed by data_keys[split]. """
+    cache = FeatureCache(meta_dir)
+    model_digest = backbone_digest(model)
+    return {
+        split: cache.extract(model, PackedBrainTumorDataset(store, mean=mean, std=std), store.labels,
+                             FeatureCache.key(model_digest, transform_config, data_keys[split]))
+        for split, store in stores.items()
+    }
+
+
+def train_head(model, splits, epochs=20, lr=1e-3, batch_size=256):
+    """ Train model.backbone.fc on cached (train, valid) features and evaluate on test when present; the trained
+    head is written back into model, which then classifies images end to end. """
+    head = model.backbone.fc
+    train_loader = feature_loader(*splits["train"], batch_size=batch_size, shuffle=True)
+    valid_loader = feature_loader(*splits["valid"], batch_size=batch_size)
+    trainer = Trainer(head, optimizer=build_optimizer(head, lr=lr), compile=False, channels_last=False, bf16=False)
+    history = trainer.fit(train_loader, valid_loader, epochs)
+    if "test" in splits:
+        test_metrics = trainer.evaluate(feature_loader(*splits["test"], batch_size=batch_size))
+        print(f"Head-only test loss {test_metrics['loss']:.4f}, accuracy {test_metrics['accuracy']:.3f}", flush=True)
+    return history
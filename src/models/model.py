@@ -0,0 +1,308 @@
+""" models/model.py """
+
+import time
+import queue
+import threading
+import contextlib
+import torch
+import torch.nn as nn
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
+from torchvision import models
+from config.config import Config
+from funcs.optimizer import build_optimizer
+from utils import profiler
+from utils.profiler import stage
+
+
+class TumorClassifier(nn.Module):
+    """ ResNet-18 backbone with a classification head over Config.CATEGORIES. """
+
+    def __init__(self, num_classes=len(Config.CATEGORIES), pretrained=False, in_channels=3):
+        """ Build the network; pretrained loads the torchvision ImageNet weights (downloaded on first use).
+        in_channels=1 takes grayscale input: the stem is rebuilt with the RGB filters summed over the input channels. """
+        super().__init__()
+        weights = models.ResNet18_Weights.DEFAULT if pretrained else None
+        self.backbone = models.resnet18(weights=weights)
+        if in_channels != 3:
+            conv1 = self.backbone.conv1
+            stem = nn.Conv2d(in_channels, conv1.out_channels, conv1.kernel_size, conv1.stride, conv1.padding, bias=False)
+            with torch.no_grad():
+                # A gray image replicated to RGB gives the same response as the summed filter on one channel
+                stem.weight.copy_(conv1.weight.sum(dim=1, keepdim=True).expand_as(stem.weight) / in_channels)
+            self.backbone.conv1 = stem
+        self.backbone.fc = nn.Linear(self.backbone.fc.in_features, num_classes)
+
+    def forward(self, x):
+        return self.backbone(x)
+
+    def features(self, x):
+        """ Pooled backbone embedding (the input of the classification head). """
+        backbone = self.backbone
+        x = backbone.maxpool(backbone.relu(backbone.bn1(backbone.conv1(x))))
+        x = backbone.layer4(backbone.layer3(backbone.layer2(backbone.layer1(x))))
+        return torch.flatten(backbone.avgpool(x), 1)
+
+
+def load_model(checkpoint=None):
+    """ TumorClassifier in eval mode and channels_last, loading a state dict (or a checkpoint dict with a "model" entry) if given.
+    The input channel count (RGB or grayscale) is taken from the checkpoint's stem. """
+    if not checkpoint:
+        return TumorClassifier().to(memory_format=torch.channels_last).eval()
+    state = torch.load(checkpoint, map_location="cpu", weights_only=True)
+    state = state.get("model", state)
+    model = TumorClassifier(in_channels=state["backbone.conv1.weight"].shape[1])
+    model.load_state_dict(state)
+    return model.to(memory_format=torch.channels_last).eval()
+
+
+def load_preprocessing(checkpoint):
+    """ Transformer arguments {"resize", "mean", "std"} the checkpoint's model was trained with, or None for a bare
+    state dict. Serving with other statistics than training's silently skews every prediction. """
+    state = torch.load(checkpoint, map_location="cpu", weights_only=True, mmap=True)
+    return state.get("preprocess") if "model" in state else None
+
+
+def input_channels(model):
+    """ Number of image channels the model expects (3 for RGB, 1 for grayscale). """
+    return model.backbone.conv1.in_channels
+
+
+def bf16_supported():
+    """ Whether this CPU has native bf16 matmul support (AVX512-BF16 or AMX), where bf16 autocast pays off. """
+    cpu = getattr(torch, "cpu", None)
+    return any(getattr(cpu, name, lambda: False)() for name in ("_is_avx512_bf16_supported", "_is_amx_tile_supported"))
+
+
+class Prefetcher:
+    """ Pull batches from a DataLoader on a background thread, preparing them (layout, device, augmentation) while the model computes. """
+
+    def __init__(self, loader, prepare, depth=2):
+        self.loader = loader
+        self.prepare = prepare
+        self.depth = depth
+
+    def __len__(self):
+        return len(self.loader)
+
+    def __iter__(self):
+        batches = queue.Queue(maxsize=self.depth)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            # Gives up once the consumer stopped early (break, exception) instead of blocking on a full queue forever
+            while not stop.is_set():
+                try:
+                    batches.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def produce():
+            try:
+                iterator = iter(self.loader)
+                while not stop.is_set():
+                    # Time spent waiting on DataLoader workers (decode, transform, collate) or loading inline
+                    with stage("loader.next"):
+                        batch = next(iterator, None)
+                    if batch is None:
+                        break
+                    images, labels = batch
+                    if not put(self.prepare(images, labels)):
+                        return
+            except Exception as e:  # re-raised in the consumer thread
+                put(e)
+            put(done)
+
+        thread = threading.Thread(target=produce, daemon=True)
+        thread.start()
+        try:
+            while True:
+                with stage("loader.wait"):
+                    item = batches.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+            # Drop prepared batches nobody will consume so the producer's pending put returns at once
+            while True:
+                try:
+                    batches.get_nowait()
+                except queue.Empty:
+                    break
+            thread.join()
+
+
+class Trainer:
+    """ CPU-oriented training loop: channels_last, bf16 autocast, torch.compile, gradient accumulation and prefetching. """
+
+    def __init__(self, model, optimizer=None, categories=None, device="cpu", accumulation_steps=1,
+                 bf16=None, compile=True, channels_last=True, augment=None, scheduler=None, bucket_cap_mb=25,
+                 checkpointer=None, checkpoint_every=0):
+        """ bf16=None enables autocast only on CPUs with native bf16 support; augment is an optional batch-level
+        augmentation (e.g. Transformer.get_batch_augmentation()) applied on the prefetch thread. scheduler is
+        stepped once per optimizer step. When a process group is initialized the model is wrapped in
+        DistributedDataParallel, whose bucket_cap_mb gradient buckets are all-reduced while backward still runs.
+        checkpointer (a models.checkpoint.Checkpointer) saves after every epoch and, with checkpoint_every > 0,
+        every checkpoint_every optimizer steps within an epoch. """
+        self.device = torch.device(device)
+        self.channels_last = channels_last
+        self.memory_format = torch.channels_last if channels_last else torch.contiguous_format
+        self.model = model.to(self.device, memory_format=self.memory_format)
+        self.optimizer = optimizer or build_optimizer(self.model)
+        self.module = self.model
+        self.distributed = dist.is_available() and dist.is_initialized()
+        self.rank = dist.get_rank() if self.distributed else 0
+        if self.distributed:
+            self.model = DistributedDataParallel(self.model, bucket_cap_mb=bucket_cap_mb, gradient_as_bucket_view=True)
+        self.epoch = 0
+        self.scheduler = scheduler
+        self.checkpointer = checkpointer
+        self.checkpoint_every = checkpoint_every
+        self.categories = list(categories or Config.CATEGORIES)
+        self.label_index = {name: idx for idx, name in enumerate(self.categories)}
+        self.accumulation_steps = max(int(accumulation_steps), 1)
+        self.bf16 = bf16_supported() if bf16 is None else bf16
+        self.augment = augment
+        self.criterion = nn.CrossEntropyLoss()
+
+        # Compiled graph is used for forward passes; the eager module keeps owning the parameters
+        self.forward = self.model
+        self._compiled = False
+        if compile and hasattr(torch, "compile"):
+            self.forward = torch.compile(self.model)
+            self._compiled = True
+
+    def _targets(self, labels):
+        """ Class indices from either an int tensor or the label names returned by the datasets. """
+        if torch.is_tensor(labels):
+            return labels.long()
+        return torch.tensor([self.label_index[label] for label in labels], dtype=torch.long)
+
+    def _prepare(self, images, labels, augment=False):
+        """ Move a batch to the device in the model's memory format, augmenting it when training. """
+        with stage("batch.to_device"):
+            images = images.to(self.device, non_blocking=True)
+        if augment and self.augment is not None:
+            with stage("batch.augment"):
+                images = self.augment(images)
+        with stage("batch.layout"):
+            images = images.contiguous(memory_format=self.memory_format)
+            return images, self._targets(labels).to(self.device, non_blocking=True)
+
+    def _reduce(self, *values):
+        """ Sum metric counters over all ranks (identity when not distributed). """
+        if not self.distributed:
+            return values
+        totals = torch.tensor(values, dtype=torch.float64)
+        dist.all_reduce(totals)
+        return tuple(totals.tolist())
+
+    def _logits(self, images, forward=None):
+        """ Forward under autocast; falls back to eager mode if the first compiled call fails (e.g. no C++ toolchain). """
+        with torch.autocast(device_type=self.device.type, dtype=torch.bfloat16, enabled=self.bf16):
+            if forward is not None:
+                return forward(images)
+            try:
+                return self.forward(images)
+            except Exception as e:
+                if not self._compiled:
+                    raise
+                print(f"torch.compile unavailable ({type(e).__name__}: {e}), falling back to eager mode", flush=True)
+                self.forward = self.model
+                self._compiled = False
+                return self.forward(images)
+
+    def train_epoch(self, loader):
+        """ One pass over loader; returns loss, accuracy and samples/sec (summed over all ranks when distributed). """
+        self.model.train()
+        self.epoch += 1
+        # Sharded samplers draw a new, rank-consistent permutation each epoch
+        sampler = getattr(loader, "sampler", None)
+        if hasattr(sampler, "set_epoch"):
+            sampler.set_epoch(self.epoch)
+        total_loss, correct, seen, optimizer_steps = 0.0, 0, 0, 0
+        start = time.perf_counter()
+        self.optimizer.zero_grad(set_to_none=True)
+        batches = Prefetcher(loader, lambda images, labels: self._prepare(images, labels, augment=True))
+
+        for step, (images, targets) in enumerate(batches, start=1):
+            sync = step % self.accumulation_steps == 0 or step == len(batches)
+            # The last group of an epoch may hold fewer batches; average its gradients over the batches it has
+            group_start = (step - 1) // self.accumulation_steps * self.accumulation_steps
+            group_size = min(self.accumulation_steps, len(batches) - group_start)
+            # Accumulation steps skip the gradient all-reduce; only the step before optimizer.step() communicates
+            with self.model.no_sync() if self.distributed and not sync else contextlib.nullcontext():
+                with stage("train.forward"):
+                    logits = self._logits(images)
+                    loss = self.criterion(logits.float(), targets)
+                with stage("train.backward"):
+                    (loss / group_size).backward()
+            if sync:
+                with stage("train.optimizer"):
+                    self.optimizer.step()
+                    self.optimizer.zero_grad(set_to_none=True)
+                    if self.scheduler is not None:
+                        self.scheduler.step()
+                optimizer_steps += 1
+            profiler.step()
+
+            total_loss += loss.item() * len(targets)
+            correct += (logits.argmax(dim=1) == targets).sum().item()
+            seen += len(targets)
+            if (sync and self.checkpointer is not None and self.checkpoint_every
+                    and optimizer_steps % self.checkpoint_every == 0 and step != len(batches)):
+                self.checkpointer.save(self, sampler, consumed=seen)
+
+        elapsed = time.perf_counter() - start
+        total_loss, correct, seen = self._reduce(total_loss, correct, seen)
+        return {"loss": total_loss / max(seen, 1), "accuracy": correct / max(seen, 1), "samples_per_sec": seen / elapsed}
+
+    @torch.no_grad()
+    def evaluate(self, loader):
+        """ Loss and accuracy over loader without gradient tracking; each rank evaluates its own shard. """
+        self.model.eval()
+        # The bare module runs no collectives, so unevenly sized evaluation shards cannot deadlock
+        forward = self.module if self.distributed else None
+        total_loss, correct, seen = 0.0, 0, 0
+        start = time.perf_counter()
+        for images, targets in Prefetcher(loader, self._prepare):
+            with stage("eval.forward"):
+                logits = self._logits(images, forward).float()
+            total_loss += self.criterion(logits, targets).item() * len(targets)
+            correct += (logits.argmax(dim=1) == targets).sum().item()
+            seen += len(targets)
+        elapsed = time.perf_counter() - start
+        total_loss, correct, seen = self._reduce(total_loss, correct, seen)
+        return {"loss": total_loss / max(seen, 1), "accuracy": correct / max(seen, 1), "samples_per_sec": seen / elapsed}
+
+    def fit(self, train_loader, valid_loader, epochs, target_accuracy=None):
+        """ Train for epochs, printing throughput and the wall-clock time to first reach target_accuracy on validation. """
+        history = []
+        start = time.perf_counter()
+        time_to_accuracy = None
+        # A trainer restored from a checkpoint continues after its last completed epoch
+        for epoch in range(self.epoch + 1, epochs + 1):
+            train = self.train_epoch(train_loader)
+            valid = self.evaluate(valid_loader)
+            if self.checkpointer is not None:
+                self.checkpointer.save(self, getattr(train_loader, "sampler", None), metrics=valid)
+            elapsed = time.perf_counter() - start
+            if target_accuracy is not None and time_to_accuracy is None and valid["accuracy"] >= target_accuracy:
+                time_to_accuracy = elapsed
+
+            history.append({"epoch": epoch, "elapsed": elapsed, "train": train, "valid": valid, "time_to_accuracy": time_to_accuracy})
+            if self.rank != 0:
+                continue
+            reached = f"{time_to_accuracy:.1f}s" if time_to_accuracy is not None else "not yet"
+            print(f"Epoch {epoch}/{epochs}: train loss {train['loss']:.4f} acc {train['accuracy']:.3f} "
+                  f"({train['samples_per_sec']:.1f} samples/s) | valid loss {valid['loss']:.4f} acc {valid['accuracy']:.3f} "
+                  f"| elapsed {elapsed:.1f}s | time to {target_accuracy} acc: {reached}", flush=True)
+        if self.checkpointer is not None:
+            self.checkpointer.wait()
+        return history
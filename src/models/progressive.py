@@ -0,0 +1,53 @@
+""" models/progressive.py """
+
+import time
+from torch.utils.data import DataLoader
+from utils.dataset import PackedBrainTumorDataset
+
+
+def progressive_schedule(epochs, sizes=(64, 128, 224, 256), final_fraction=0.25):
+    """ Image size per epoch: a linear ramp from the smallest to the largest size, holding the largest for the last
+    final_fraction of the epochs; every entry is one of sizes. """
+    sizes = sorted(sizes)
+    final_epochs = max(int(round(epochs * final_fraction)), 1)
+    ramp_epochs = max(epochs - final_epochs, 0)
+    schedule = []
+    for epoch in range(ramp_epochs):
+        target = sizes[0] + (sizes[-1] - sizes[0]) * epoch / max(ramp_epochs, 1)
+        schedule.append(min(sizes, key=lambda size: abs(size - target)))
+    return schedule + [sizes[-1]] * final_epochs
+
+
+def fit_progressive(trainer, pyramid, valid_loader, schedule, batch_size=32, mean=None, std=None, num_workers=0,
+                    target_accuracy=None):
+    """ Trainer epochs over pyramid levels following schedule (one size per epoch), validating at full size.
+    Each epoch reads the nearest stored level directly, so no image is resized again during training. A trainer
+    restored from a checkpoint skips the epochs it already completed. """
+    history = []
+    start = time.perf_counter()
+    time_to_accuracy = None
+    for epoch, size in enumerate(schedule, start=1):
+        if epoch <= trainer.epoch:
+            continue
+        store = pyramid.level(size)
+        loader = DataLoader(PackedBrainTumorDataset(store, mean=mean, std=std), batch_size=batch_size, shuffle=True,
+                            num_workers=num_workers)
+        epoch_start = time.perf_counter()
+        train = trainer.train_epoch(loader)
+        train_seconds = time.perf_counter() - epoch_start
+        valid = trainer.evaluate(valid_loader)
+        if trainer.checkpointer is not None:
+            trainer.checkpointer.save(trainer, metrics=valid)
+        elapsed = time.perf_counter() - start
+        if target_accuracy is not None and time_to_accuracy is None and valid["accuracy"] >= target_accuracy:
+            time_to_accuracy = elapsed
+
+        history.append({"epoch": epoch, "size": store.size, "bytes_read": pyramid.level_nbytes(size),
+                        "train_seconds": train_seconds, "elapsed": elapsed,
+                        "train": train, "valid": valid, "time_to_accuracy": time_to_accuracy})
+        print(f"Epoch {epoch}/{len(schedule)} @ {store.size}px: train loss {train['loss']:.4f} acc {train['accuracy']:.3f} "
+              f"({train['samples_per_sec']:.1f} samples/s) | valid loss {valid['loss']:.4f} acc {valid['accuracy']:.3f} "
+              f"| elapsed {elapsed:.1f}s", flush=True)
+    if trainer.checkpointer is not None:
+        trainer.checkpointer.wait()
+    return history
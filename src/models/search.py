@@ -0,0 +1,281 @@
+""" models/search.py """
+
+import os
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import torch
+from torch.utils.data import DataLoader
+from funcs.transformer import Transformer, available_cpus
+from funcs.optimizer import build_optimizer
+from utils.dataset import PackedBrainTumorDataset
+from utils.packstore import PyramidStore
+from utils.sampler import ShardedSampler
+from models.model import TumorClassifier, Trainer
+from models.checkpoint import Checkpointer, restore
+
+DEFAULT_SPACE = {
+    "lr": (1e-4, 3e-3),
+    "batch_size": [16, 32, 64],
+    "degrees": [0, 5, 10, 20],
+    "flip_p": [0.0, 0.5],
+    "resize": [128, 224, 256],
+}
+
+
+def sample_configs(space, trials, seed=42):
+    """ trials random configurations from space: a list is a set of choices, a (low, high) tuple a log-uniform range.
+    The same (space, trials, seed) always yields the same configurations, which is what lets a search resume. """
+    rng = random.Random(seed)
+    configs = []
+    for _ in range(trials):
+        config = {}
+        for name, values in sorted(space.items()):
+            if isinstance(values, tuple):
+                low, high = values
+                config[name] = math.exp(rng.uniform(math.log(low), math.log(high)))
+            else:
+                config[name] = rng.choice(list(values))
+        configs.append(config)
+    return configs
+
+
+def rung_epochs(min_epochs, max_epochs, eta=3):
+    """ Training budget of each successive-halving rung: min_epochs * eta**k, capped at (and ending with) max_epochs. """
+    rungs = [min_epochs]
+    while rungs[-1] < max_epochs:
+        rungs.append(min(rungs[-1] * eta, max_epochs))
+    return rungs
+
+
+def _init_trial_worker(threads):
+    """ Pin each pool process to its share of the CPU budget. """
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def run_trial(trial, config, epochs, pyramid_paths, trial_dir, options):
+    """ Train trial's configuration up to epochs total, continuing from its last rung's checkpoint in trial_dir,
+    and return the validation metrics. Images come from the shared pyramid packs at the config's resize level. """
+    start = time.perf_counter()
+    train_store = PyramidStore(pyramid_paths["train"]).level(config["resize"])
+    valid_store = PyramidStore(pyramid_paths["valid"]).level(config["resize"])
+    mean, std = options["mean"], options["std"]
+    train_dataset = PackedBrainTumorDataset(train_store, mean=mean, std=std)
+    sampler = ShardedSampler(len(train_dataset), seed=options["seed"] + trial)
+    train_loader = DataLoader(train_dataset, batch_size=config["batch_size"], sampler=sampler)
+    valid_loader = DataLoader(PackedBrainTumorDataset(valid_store, mean=mean, std=std), batch_size=64)
+
+    latest = Checkpointer.latest(trial_dir)
+    if latest and Checkpointer.read_index(trial_dir)["checkpoints"][-1]["epoch"] > epochs:
+        # Already past this rung (its record was lost): retrain rather than report a longer run as this rung
+        shutil.rmtree(trial_dir)
+        latest = None
+
+    torch.manual_seed(options["seed"] + trial)
+    transformer = Transformer(resize=(train_store.size,) * 2, mean=mean, std=std, channels=train_store.channels)
+    model = TumorClassifier(in_channels=train_store.channels)
+    trainer = Trainer(
+        model,
+        optimizer=build_optimizer(model, lr=config["lr"]),
+        compile=options["compile"],
+        augment=transformer.get_batch_augmentation(flip_p=config["flip_p"], degrees=config["degrees"]),
+        checkpointer=Checkpointer(trial_dir, keep_last=1),
+    )
+    if latest:
+        restore(trainer, latest, sampler)
+    history = trainer.fit(train_loader, valid_loader, epochs)
+    trainer.checkpointer.close()
+    # A rung whose checkpoint was written before an interruption has nothing left to train
+    valid = history[-1]["valid"] if history else trainer.evaluate(valid_loader)
+    return {"valid_accuracy": valid["accuracy"], "valid_loss": valid["loss"], "seconds": time.perf_counter() - start}
+
+
+class TrialStore:
+    """ Append-only JSONL record of finished (trial, rung) evaluations, flushed per record so a killed search loses
+    at most the rungs still in flight. """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def load(self):
+        """ Every recorded evaluation; a partially written last line from an interrupted run is truncated away. """
+        if not os.path.isfile(self.path):
+            return []
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            end = data.rfind(b"\n") + 1
+            if end != len(data):
+                f.truncate(end)
+        return [json.loads(line) for line in data[:end].decode("utf-8").splitlines() if line]
+
+    def append(self, record):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ASHA:
+    """ Asynchronous successive halving over sampled configurations: whenever a worker frees up, the best
+    not-yet-promoted trial in the top 1/eta of the highest possible rung moves up one rung; otherwise a new trial
+    starts at the bottom rung. Trials left behind are stopped early without waiting for their rung to fill. """
+
+    def __init__(self, configs, rungs, eta=3):
+        self.configs = configs
+        self.rungs = rungs
+        self.eta = eta
+        self.results = [{} for _ in rungs]
+        self.running = set()
+
+    def record(self, trial, rung, accuracy):
+        self.results[rung][trial] = accuracy
+        self.running.discard((trial, rung))
+
+    def next_job(self):
+        """ (trial, rung) to run next, or None when every trial has started and nothing can be promoted yet. """
+        for rung in range(len(self.rungs) - 2, -1, -1):
+            done = self.results[rung]
+            ranked = sorted(done, key=lambda trial: (-done[trial], trial))[:len(done) // self.eta]
+            for trial in ranked:
+                if trial not in self.results[rung + 1] and (trial, rung + 1) not in self.running:
+                    self.running.add((trial, rung + 1))
+                    return trial, rung + 1
+        for trial in range(len(self.configs)):
+            if trial not in self.results[0] and (trial, 0) not in self.running:
+                self.running.add((trial, 0))
+                return trial, 0
+        return None
+
+    def leaderboard(self):
+        """ (trial, highest rung reached, accuracy there) sorted best first. """
+        best = {}
+        for rung, done in enumerate(self.results):
+            for trial, accuracy in done.items():
+                best[trial] = (rung, accuracy)
+        return sorted(((trial, rung, accuracy) for trial, (rung, accuracy) in best.items()), key=lambda row: (-row[1], -row[2]))
+
+
+class HyperparameterSearch:
+    """ ASHA search over learning rate, batch size, augmentation strength and resize, trials running concurrently in
+    a process pool under a total CPU budget. All trials read the same decoded pyramid packs (one level per resize
+    choice) instead of re-reading images, and every finished rung is appended to search_dir/trials.jsonl so a
+    search restarted with the same arguments skips the rungs already recorded. """
+
+    def __init__(self, pyramid_paths, search_dir, space=None, trials=20, min_epochs=1, max_epochs=9, eta=3,
+                 cpu_budget=None, threads_per_trial=1, mean=None, std=None, seed=42, compile=False):
+        """ pyramid_paths maps "train" and "valid" to PyramidStore paths holding every size in space["resize"]. """
+        self.pyramid_paths = pyramid_paths
+        self.search_dir = search_dir
+        self.space = space or DEFAULT_SPACE
+        self.configs = sample_configs(self.space, trials, seed)
+        self.rungs = rung_epochs(min_epochs, max_epochs, eta)
+        self.eta = eta
+        self.cpu_budget = cpu_budget or available_cpus()
+        self.threads_per_trial = max(min(threads_per_trial, self.cpu_budget), 1)
+        self.store = TrialStore(os.path.join(search_dir, "trials.jsonl"))
+        self.options = dict(mean=mean, std=std, seed=seed, compile=compile)
+
+    def _trial_dir(self, trial):
+        return os.path.join(self.search_dir, f"trial{trial:04d}")
+
+    def _resume(self, scheduler):
+        """ Replay recorded rungs into scheduler; raises ValueError if they come from a different search. """
+        records = self.store.load()
+        for record in records:
+            trial = record["trial"]
+            if trial >= len(self.configs) or record["config"] != self.configs[trial]:
+                raise ValueError(f"{self.store.path} holds trial {trial} with another configuration; use a new search_dir")
+            scheduler.record(trial, record["rung"], record["valid_accuracy"])
+        return len(records)
+
+    def run(self):
+        """ Run the search to completion and return the records and leaderboard; only the best trial's checkpoint is kept. """
+        scheduler = ASHA(self.configs, self.rungs, self.eta)
+        resumed = self._resume(scheduler)
+        workers = max(self.cpu_budget // self.threads_per_trial, 1)
+        print(f"ASHA over {len(self.configs)} trials, rungs at {self.rungs} epochs, {workers} at a time with "
+              f"{self.threads_per_trial} threads each" + (f" ({resumed} rungs already recorded)" if resumed else ""), flush=True)
+
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_trial_worker, initargs=(self.threads_per_trial,)) as pool:
+            pending = {}
+            while True:
+                while len(pending) < workers:
+                    job = scheduler.next_job()
+                    if job is None:
+                        break
+                    trial, rung = job
+                    future = pool.submit(run_trial, trial, self.configs[trial], self.rungs[rung], self.pyramid_paths,
+                                         self._trial_dir(trial), self.options)
+                    pending[future] = job
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    trial, rung = pending.pop(future)
+                    result = future.result()
+                    record = {"trial": trial, "rung": rung, "epochs": self.rungs[rung], "config": self.configs[trial], **result}
+                    self.store.append(record)
+                    scheduler.record(trial, rung, result["valid_accuracy"])
+                    print(f"Trial {trial} rung {rung} ({self.rungs[rung]} epochs): valid acc {result['valid_accuracy']:.3f} "
+                          f"in {result['seconds']:.1f}s | {self.configs[trial]}", flush=True)
+
+        leaderboard = scheduler.leaderboard()
+        if not leaderboard:
+            print("No trial completed a rung, nothing to report", flush=True)
+            return {"records": self.store.load(), "leaderboard": [], "best": None, "best_checkpoint": None}
+        best_trial = leaderboard[0][0]
+        for trial in range(len(self.configs)):
+            if trial != best_trial and os.path.isdir(self._trial_dir(trial)):
+                shutil.rmtree(self._trial_dir(trial))
+        print(f"Best trial {best_trial} ({self.rungs[leaderboard[0][1]]} epochs, valid acc {leaderboard[0][2]:.3f}): "
+              f"{self.configs[best_trial]}", flush=True)
+        return {"records": self.store.load(), "leaderboard": leaderboard, "best": self.configs[best_trial],
+                "best_checkpoint": Checkpointer.latest(self._trial_dir(best_trial))}
+
+
+if __name__ == "__main__":
+    import config
+    from utils.prepdata import PrepData
+
+    parser = argparse.ArgumentParser(description="Parallel ASHA hyperparameter search on the Training directory.")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--min-epochs", type=int, default=1, help="budget of the bottom rung")
+    parser.add_argument("--max-epochs", type=int, default=9, help="budget of the top rung")
+    parser.add_argument("--eta", type=int, default=3, help="keep the top 1/eta of each rung")
+    parser.add_argument("--cpu-budget", type=int, default=None, help="total cores for all trials (default: all available)")
+    parser.add_argument("--threads-per-trial", type=int, default=1)
+    parser.add_argument("--lr", type=float, nargs=2, default=list(DEFAULT_SPACE["lr"]), help="log-uniform learning rate range")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_SPACE["batch_size"])
+    parser.add_argument("--degrees", type=float, nargs="+", default=DEFAULT_SPACE["degrees"], help="rotation augmentation strengths")
+    parser.add_argument("--flip-p", type=float, nargs="+", default=DEFAULT_SPACE["flip_p"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SPACE["resize"], help="Transformer resize choices")
+    parser.add_argument("--grayscale", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--search-dir", default=None, help="trial store and checkpoints (default: DIR_META/search)")
+    args = parser.parse_args()
+    if args.trials < 1:
+        parser.error("--trials must be at least 1")
+
+    mode = "L" if args.grayscale else "RGB"
+    init_conf = config.get_config()
+    data_prep = PrepData(config=init_conf, train_dir=init_conf.DIR_TRAINING)
+    # Decoded once at every candidate size; trials memory-map the level their resize selects
+    stores = data_prep.pack(mode=mode, splits=("train", "valid"), levels=args.sizes)
+    stats = data_prep.dataset_stats(mode=mode)
+    space = {"lr": tuple(args.lr), "batch_size": args.batch_sizes, "degrees": args.degrees, "flip_p": args.flip_p,
+             "resize": args.sizes}
+    HyperparameterSearch(
+        {split: store.path for split, store in stores.items()},
+        args.search_dir or os.path.join(init_conf.DIR_META, "search"),
+        space=space, trials=args.trials, min_epochs=args.min_epochs, max_epochs=args.max_epochs, eta=args.eta,
+        cpu_budget=args.cpu_budget, threads_per_trial=args.threads_per_trial, mean=stats["mean"], std=stats["std"],
+        seed=args.seed,
+    ).run()
@@ -0,0 +1,213 @@
+""" models/server.py """
+
+import io
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import torch
+from PIL import Image
+from config.config import Config
+from funcs.transformer import Transformer
+from models.model import load_model, load_preprocessing, input_channels
+
+_transform = None
+_mode = "RGB"
+
+
+def _init_preprocess(resize, mean, std):
+    """ Build the basic transform once per pool process; one-channel statistics select grayscale decoding. """
+    global _transform, _mode
+    _mode = "L" if len(mean) == 1 else "RGB"
+    _transform = Transformer(resize=resize, mean=mean, std=std, channels=len(_mode)).get_basic_transform()
+
+
+def preprocess(data):
+    """ Decode image bytes and apply Transformer.get_basic_transform() in a pool process. """
+    with Image.open(io.BytesIO(data)) as img:
+        return _transform(img.convert(_mode)).numpy()
+
+
+class ServerMetrics:
+    """ Queue depth, batch-size histogram and request latency percentiles. """
+
+    def __init__(self, window=10000):
+        self.batch_sizes = Counter()
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+
+    def snapshot(self, queue_depth):
+        latencies = np.asarray(self.latencies) * 1000.0
+        percentiles = {f"p{p}_ms": float(np.percentile(latencies, p)) if len(latencies) else None for p in (50, 95, 99)}
+        return {
+            "requests": self.requests,
+            "queue_depth": queue_depth,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "latency": percentiles,
+        }
+
+
+class MicroBatcher:
+    """ Coalesce concurrent single-image requests into batches bounded by max_batch_size and max_latency. """
+
+    def __init__(self, model, categories, max_batch_size=16, max_latency=0.01, metrics=None):
+        self.model = model
+        self.categories = list(categories)
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.metrics = metrics or ServerMetrics()
+        self.queue = asyncio.Queue()
+
+    async def submit(self, image):
+        """ Enqueue one preprocessed CHW array and wait for its (label, probabilities). """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((image, future))
+        return await future
+
+    async def run(self):
+        """ Batching loop: wait for a first request, then collect more until the batch is full or the deadline passes. """
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(items) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self.metrics.batch_sizes[len(items)] += 1
+            batch = np.stack([image for image, _ in items])
+            try:
+                probabilities = await loop.run_in_executor(None, self._infer, batch)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), probs in zip(items, probabilities):
+                if not future.done():
+                    future.set_result((self.categories[int(probs.argmax())], probs.tolist()))
+
+    @torch.inference_mode()
+    def _infer(self, batch):
+        """ Run the model on a stacked batch off the event loop thread. """
+        logits = self.model(torch.from_numpy(batch).contiguous(memory_format=torch.channels_last))
+        return torch.softmax(logits.float(), dim=1).numpy()
+
+
+class InferenceServer:
+    """ Minimal asyncio HTTP/1.1 server: POST /predict (raw image bytes), GET /metrics, GET /health. """
+
+    def __init__(self, model, transformer, categories=None, host="127.0.0.1", port=8080,
+                 max_batch_size=16, max_latency=0.01, preprocess_workers=2):
+        """ transformer must normalize with the training statistics (see load_preprocessing); it is not defaulted
+        to ImageNet's, which would preprocess served images differently from training. """
+        if transformer.channels != input_channels(model):
+            raise ValueError(f"Transformer has {transformer.channels} channels, the model expects {input_channels(model)}")
+        self.host = host
+        self.port = port
+        self.metrics = ServerMetrics()
+        self.batcher = MicroBatcher(model, categories or Config.CATEGORIES, max_batch_size, max_latency, self.metrics)
+        self.pool = ProcessPoolExecutor(
+            max_workers=preprocess_workers,
+            initializer=_init_preprocess,
+            initargs=(transformer.resize, transformer.mean, transformer.std),
+        )
+
+    async def handle(self, reader, writer):
+        """ Serve requests on one connection (keep-alive) until the client closes it. """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                try:
+                    status, payload = await self.route(method, path, body)
+                except Exception as e:
+                    status, payload = "500 Internal Server Error", {"error": f"{type(e).__name__}: {e}"}
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        """ Dispatch one request and return (status line, JSON payload). """
+        if method == "POST" and path == "/predict":
+            start = time.perf_counter()
+            try:
+                image = await asyncio.get_running_loop().run_in_executor(self.pool, preprocess, body)
+            except Exception as e:
+                return "400 Bad Request", {"error": f"could not decode image: {e}"}
+            try:
+                label, probabilities = await self.batcher.submit(image)
+            except Exception as e:
+                return "500 Internal Server Error", {"error": f"inference failed: {type(e).__name__}: {e}"}
+            self.metrics.latencies.append(time.perf_counter() - start)
+            self.metrics.requests += 1
+            return "200 OK", {"label": label, "probabilities": dict(zip(self.batcher.categories, probabilities))}
+        if method == "GET" and path == "/metrics":
+            return "200 OK", self.metrics.snapshot(self.batcher.queue.qsize())
+        if method == "GET" and path == "/health":
+            return "200 OK", {"status": "ok"}
+        return "404 Not Found", {"error": f"no route for {method} {path}"}
+
+    async def serve(self):
+        """ Start the batching loop and accept connections until cancelled. """
+        batching = asyncio.create_task(self.batcher.run())
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(f"Serving on http://{self.host}:{self.port} (max batch {self.batcher.max_batch_size}, "
+              f"max latency {self.batcher.max_latency * 1000:.1f} ms)", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batching.cancel()
+            self.pool.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dynamic-batching local inference server for the tumor classifier.")
+    parser.add_argument("--checkpoint", required=True, help="model state dict or training checkpoint to load")
+    parser.add_argument("--stats", help="DatasetStats JSON with the training mean/std (required unless the checkpoint stores them)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-latency-ms", type=float, default=10.0)
+    parser.add_argument("--preprocess-workers", type=int, default=2)
+    args = parser.parse_args()
+
+    model = load_model(args.checkpoint)
+    preprocess = load_preprocessing(args.checkpoint) or {}
+    if args.stats:
+        with open(args.stats) as f:
+            stats = json.load(f)
+        preprocess = {**preprocess, "mean": stats["mean"], "std": stats["std"]}
+    if "mean" not in preprocess:
+        parser.error("no normalization statistics: the checkpoint does not store them, pass --stats")
+    transformer = Transformer(resize=tuple(preprocess.get("resize", (256, 256))), mean=preprocess["mean"], std=preprocess["std"],
+                              channels=input_channels(model))
+    server = InferenceServer(
+        model, transformer, host=args.host, port=args.port, max_batch_size=args.max_batch_size,
+        max_latency=args.max_latency_ms / 1000.0, preprocess_workers=args.preprocess_workers,
+    )
+    asyncio.run(server.serve())
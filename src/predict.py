@@ -0,0 +1,210 @@
+""" predict.py """
+
+import os
+import csv
+import json
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from PIL import Image
+from config.config import Config
+from funcs.transformer import Transformer, available_cpus
+from models.model import load_model, load_preprocessing, input_channels
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+
+def iter_images(root, extensions=IMAGE_EXTENSIONS):
+    """ Yield image paths under root depth-first in sorted order, holding one directory listing at a time. """
+    with os.scandir(root) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_images(entry.path, extensions)
+        elif entry.is_file() and entry.name.lower().endswith(extensions):
+            yield entry.path
+
+
+def batched(iterable, size):
+    """ Yield lists of up to size items from iterable. """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Predictor:
+    """ Score a stream of image paths: decode/transform on a thread pool, prefetch_batches ahead of the model. """
+
+    def __init__(self, model, transformer=None, categories=None, batch_size=32, workers=None, prefetch_batches=2):
+        self.model = model.eval()
+        self.channels = input_channels(model)
+        self.transformer = transformer or Transformer(channels=self.channels)
+        self.transform = self.transformer.get_basic_transform()
+        self.mode = "L" if self.channels == 1 else "RGB"
+        self.categories = list(categories or Config.CATEGORIES)
+        self.batch_size = batch_size
+        self.workers = workers or available_cpus()
+        self.prefetch_batches = prefetch_batches
+
+    def _load(self, path):
+        """ Decoded, normalized tensor for path, or the error message when the file cannot be read. """
+        try:
+            with Image.open(path) as img:
+                return self.transform(img.convert(self.mode))
+        except (IOError, SyntaxError, ValueError) as e:
+            return f"{type(e).__name__}: {e}"
+
+    def _score(self, paths, futures):
+        """ Run the model on one decoded batch and build its result records in input order. """
+        loaded = [future.result() for future in futures]
+        good = [i for i, item in enumerate(loaded) if torch.is_tensor(item)]
+        records = [{"path": path, "error": loaded[i]} for i, path in enumerate(paths)]
+        if good:
+            images = torch.stack([loaded[i] for i in good]).contiguous(memory_format=torch.channels_last)
+            with torch.inference_mode():
+                probabilities = torch.softmax(self.model(images).float(), dim=1)
+            for i, probs in zip(good, probabilities.tolist()):
+                best = max(range(len(probs)), key=probs.__getitem__)
+                records[i] = {"path": paths[i], "label": self.categories[best], "confidence": probs[best],
+                              **{f"p_{name}": p for name, p in zip(self.categories, probs)}}
+        return records
+
+    def predict(self, paths):
+        """ Yield one result record per path; at most prefetch_batches + 1 batches are decoded or in flight. """
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for batch in batched(paths, self.batch_size):
+                pending.append((batch, [pool.submit(self._load, path) for path in batch]))
+                if len(pending) > self.prefetch_batches:
+                    yield from self._score(*pending.popleft())
+            while pending:
+                yield from self._score(*pending.popleft())
+
+
+def walk_key(root, path):
+    """ Sort key of path in iter_images(root) order: its components below root, compared element by element. """
+    return tuple(os.path.relpath(path, root).split(os.sep))
+
+
+def last_completed_path(output_path, output_format, block_size=1 << 16):
+    """ Path of the last record in output_path, or None when there is none; only the file's tail is read, and a
+    partially written last line from an interrupted run is truncated away. """
+    if not os.path.isfile(output_path):
+        return None
+    with open(output_path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        tail, position = b"", size
+        # Read backwards until the tail holds the last complete line and the newline before it (or the file start)
+        while position > 0 and tail[:tail.rfind(b"\n")].count(b"\n") < 1:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+        end = tail.rfind(b"\n") + 1
+        if position + end != size:
+            f.truncate(position + end)
+    lines = tail[:end].decode("utf-8").splitlines()
+    if not lines or not lines[-1]:
+        return None
+    if output_format == "jsonl":
+        return json.loads(lines[-1])["path"]
+    if position == 0 and len(lines) == 1:
+        return None  # only the CSV header
+    return next(csv.reader(lines[-1:]))[0]
+
+
+class ResultWriter:
+    """ Append result records to CSV or JSONL, flushing after every batch so an interrupted run loses nothing written. """
+
+    def __init__(self, output_path, output_format, categories, resume=False):
+        exists = resume and os.path.isfile(output_path) and os.path.getsize(output_path) > 0
+        self.file = open(output_path, "a" if exists else "w", newline="")
+        self.format = output_format
+        if output_format == "csv":
+            fields = ["path", "label", "confidence"] + [f"p_{name}" for name in categories] + ["error"]
+            self.writer = csv.DictWriter(self.file, fieldnames=fields)
+            if not exists:
+                self.writer.writeheader()
+
+    def write(self, records):
+        for record in records:
+            if self.format == "jsonl":
+                self.file.write(json.dumps(record) + "\n")
+            else:
+                self.writer.writerow(record)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def run(root, output_path, checkpoint, output_format=None, resume=True, batch_size=32, workers=None,
+        mean=None, std=None, resize=None):
+    """ Score every image under root into output_path, skipping paths a previous run already wrote.
+    Images are normalized with the mean/std/resize stored in the checkpoint; mean, std and resize override them.
+    Raises ValueError when neither provides normalization statistics. """
+    output_format = output_format or ("jsonl" if output_path.endswith(".jsonl") else "csv")
+    preprocess = load_preprocessing(checkpoint) or {}
+    mean, std = mean or preprocess.get("mean"), std or preprocess.get("std")
+    if mean is None or std is None:
+        raise ValueError(f"{checkpoint} stores no normalization statistics, pass mean and std")
+    model = load_model(checkpoint)
+    resize = tuple(resize or preprocess.get("resize", (256, 256)))
+    transformer = Transformer(resize=resize, mean=mean, std=std, channels=input_channels(model))
+    predictor = Predictor(model, transformer, batch_size=batch_size, workers=workers)
+    last = last_completed_path(output_path, output_format) if resume else None
+    if last is not None:
+        print(f"Resuming after {last}, the last image scored in {output_path}", flush=True)
+
+    writer = ResultWriter(output_path, output_format, predictor.categories, resume=resume)
+    scored = skipped = 0
+
+    def todo():
+        # Records are written in iter_images order, so everything up to the last written path is done
+        nonlocal skipped
+        last_key = walk_key(root, last) if last is not None else None
+        for path in iter_images(root):
+            if last_key is not None and walk_key(root, path) <= last_key:
+                skipped += 1
+                continue
+            last_key = None
+            yield path
+
+    try:
+        for records in batched(predictor.predict(todo()), batch_size):
+            writer.write(records)
+            scored += len(records)
+            if scored % (batch_size * 50) < batch_size:
+                print(f"Scored {scored} images", flush=True)
+    finally:
+        writer.close()
+    print(f"Scored {scored} new images ({skipped} skipped) into {output_path}", flush=True)
+    return scored
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream-score every image under a directory tree into CSV or JSONL.")
+    parser.add_argument("root", help="directory to scan recursively")
+    parser.add_argument("output", help="results file (.csv or .jsonl)")
+    parser.add_argument("--checkpoint", required=True, help="model state dict or training checkpoint to load")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None, help="default: from the output extension")
+    parser.add_argument("--no-resume", action="store_true", help="overwrite the output instead of skipping scored paths")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=None, help="decode threads (default: available CPUs)")
+    parser.add_argument("--stats", help="DatasetStats JSON with the training mean/std (required unless the checkpoint stores them)")
+    args = parser.parse_args()
+
+    mean = std = None
+    if args.stats:
+        with open(args.stats) as f:
+            stats = json.load(f)
+        mean, std = stats["mean"], stats["std"]
+    elif "mean" not in (load_preprocessing(args.checkpoint) or {}):
+        parser.error("no normalization statistics: the checkpoint does not store them, pass --stats")
+    run(args.root, args.output, args.checkpoint, args.format, not args.no_resume, args.batch_size, args.workers, mean, std)
@@ -0,0 +1,35 @@
+""" tests/conftest.py """
+
+import os
+import sys
+import types
+import numpy as np
+import pytest
+from PIL import Image
+
+# Modules import each other as top-level packages (utils, models, ...), the way the scripts in src run
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.config import Config  # noqa: E402
+
+
+def write_tree(root, per_class=3, size=(20, 16), seed=0):
+    """ Training-like tree of small random RGB PNGs, one folder per category; returns root. """
+    rng = np.random.default_rng(seed)
+    for category in Config.CATEGORIES:
+        os.makedirs(os.path.join(root, category), exist_ok=True)
+        for i in range(per_class):
+            pixels = rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(os.path.join(root, category, f"image({i}).png"))
+    return str(root)
+
+
+@pytest.fixture
+def image_tree(tmp_path):
+    return write_tree(tmp_path / "Training")
+
+
+@pytest.fixture
+def meta_config(tmp_path):
+    """ Stand-in for config.Config pointing DIR_META at a temporary directory. """
+    return types.SimpleNamespace(DIR_META=str(tmp_path / "meta"), CATEGORIES=list(Config.CATEGORIES))
@@ -0,0 +1,79 @@
+""" tests/test_cache.py """
+
+import multiprocessing as mp
+import numpy as np
+import pytest
+import config
+from config.config import Config
+from utils.cache import SharedSampleCache
+from utils.dataset import BrainTumorDataset
+from utils.manifest import Manifest
+
+
+def _fill(cache):
+    cache.put(3, np.full((2, 2, 3), 7, dtype=np.uint8))
+
+
+def test_put_get_round_trip():
+    cache = SharedSampleCache(4 * 12, num_items=8, slot_bytes=12)
+    try:
+        pixels = np.arange(12, dtype=np.uint8).reshape(2, 2, 3)
+        assert cache.get(0) is None
+        assert cache.put(0, pixels)
+        hit = cache.get(0)
+        assert np.array_equal(hit, pixels)
+        hit[:] = 0  # a private copy, the cached pixels stay intact
+        assert np.array_equal(cache.get(0), pixels)
+        assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+    finally:
+        cache.close()
+
+
+def test_clock_evicts_unreferenced_slots_first():
+    cache = SharedSampleCache(2 * 4, num_items=4, slot_bytes=4)
+    try:
+        cache.put(0, np.zeros((2, 2), dtype=np.uint8))
+        cache.put(1, np.ones((2, 2), dtype=np.uint8))
+        cache.get(0)  # sets 0's reference bit
+        cache.put(2, np.ones((2, 2), dtype=np.uint8))
+        assert cache.get(0) is not None
+        assert cache.get(1) is None
+        assert cache.stats()["evictions"] == 1
+    finally:
+        cache.close()
+
+
+def test_oversize_samples_are_counted_not_cached():
+    cache = SharedSampleCache(64, num_items=2, slot_bytes=4)
+    try:
+        assert not cache.put(0, np.zeros((4, 4), dtype=np.uint8))
+        assert cache.get(0) is None
+        assert cache.stats()["oversize"] == 1
+    finally:
+        cache.close()
+
+
+def test_spawned_worker_shares_the_cache():
+    context = mp.get_context("spawn")
+    cache = SharedSampleCache(4 * 12, num_items=8, slot_bytes=12, mp_context=context)
+    try:
+        worker = context.Process(target=_fill, args=(cache,))
+        worker.start()
+        worker.join()
+        assert worker.exitcode == 0
+        assert np.array_equal(cache.get(3), np.full((2, 2, 3), 7, dtype=np.uint8))
+    finally:
+        cache.close()
+
+
+def test_dataset_sizes_slots_from_the_manifest(image_tree, meta_config, monkeypatch):
+    monkeypatch.setattr(config, "init_conf", meta_config, raising=False)
+    listing = Manifest(meta_config.DIR_META, Config.CATEGORIES).scan(image_tree)
+    paths = [record["path"] for records in listing.values() for record in records]
+    dataset = BrainTumorDataset(image_paths=paths, labels=[0] * len(paths), cache_bytes=2 ** 16)
+    try:
+        assert dataset.cache.slot_bytes == 20 * 16 * 3
+    finally:
+        dataset.cache.close()
+    with pytest.raises(ValueError):
+        BrainTumorDataset(image_paths=[f"{image_tree}/unknown.png"], labels=[0], cache_bytes=2 ** 16)
@@ -0,0 +1,78 @@
+""" tests/test_checkpoint.py """
+
+import os
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, TensorDataset
+from models.model import Trainer
+from models.checkpoint import Checkpointer, load_checkpoint, restore
+from utils.sampler import ShardedSampler
+
+
+def _trainer(checkpointer=None):
+    torch.manual_seed(0)
+    model = nn.Linear(4, 4)
+    return Trainer(model, optimizer=torch.optim.AdamW(model.parameters(), lr=0.1), compile=False, channels_last=False,
+                   bf16=False, checkpointer=checkpointer)
+
+
+def _loader():
+    generator = torch.Generator().manual_seed(0)
+    dataset = TensorDataset(torch.randn(24, 4, generator=generator), torch.randint(0, 4, (24,), generator=generator))
+    return DataLoader(dataset, batch_size=4, sampler=ShardedSampler(24, seed=7))
+
+
+def test_index_keeps_last_and_best(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path), keep_last=1)
+    trainer = _trainer()
+    for epoch, accuracy in enumerate([0.5, 0.9, 0.7], start=1):
+        trainer.epoch = epoch
+        checkpointer.save(trainer, metrics={"accuracy": accuracy})
+    checkpointer.close()
+
+    assert Checkpointer.latest(str(tmp_path)).endswith("epoch0003.pt")
+    assert Checkpointer.best(str(tmp_path)).endswith("epoch0002.pt")
+    assert sorted(name for name in os.listdir(tmp_path) if name.endswith(".pt")) == ["epoch0002.pt", "epoch0003.pt"]
+    assert load_checkpoint(Checkpointer.best(str(tmp_path)))["metrics"] == {"accuracy": 0.9}
+
+
+def test_epoch_end_resume_is_bit_exact(tmp_path):
+    straight = _trainer()
+    straight.fit(_loader(), _loader(), epochs=2)
+
+    first = _trainer(Checkpointer(str(tmp_path), extra={"split": {"train": ["a"], "valid": ["b"]}}))
+    first.fit(_loader(), _loader(), epochs=1)
+    first.checkpointer.close()
+
+    resumed = _trainer()
+    loader = _loader()
+    state = restore(resumed, Checkpointer.latest(str(tmp_path)), loader.sampler)
+    assert resumed.epoch == 1 and state["split"] == {"train": ["a"], "valid": ["b"]}
+    resumed.fit(loader, _loader(), epochs=2)
+    for expected, actual in zip(straight.module.parameters(), resumed.module.parameters()):
+        assert torch.equal(expected, actual)
+
+
+def test_mid_epoch_checkpoint_restores_sampler_position(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path))
+    trainer, loader = _trainer(), _loader()
+    trainer.epoch = 3
+    loader.sampler.set_epoch(3)
+    checkpointer.save(trainer, loader.sampler, consumed=8)
+    checkpointer.close()
+
+    resumed, resumed_loader = _trainer(), _loader()
+    restore(resumed, Checkpointer.latest(str(tmp_path)), resumed_loader.sampler)
+    assert resumed.epoch == 2
+    resumed_loader.sampler.set_epoch(3)
+    assert list(resumed_loader.sampler) == list(loader.sampler)[8:]
+
+
+def test_rng_state_round_trips(tmp_path):
+    checkpointer = Checkpointer(str(tmp_path))
+    checkpointer.save(_trainer())
+    checkpointer.close()
+    expected = torch.rand(3)
+    torch.rand(5)
+    restore(_trainer(), Checkpointer.latest(str(tmp_path)))
+    assert torch.equal(torch.rand(3), expected)
@@ -0,0 +1,50 @@
+""" tests/test_manifest.py """
+
+import os
+from config.config import Config
+from utils.manifest import Manifest
+
+
+def test_scan_records_every_category(image_tree, tmp_path):
+    listing = Manifest(str(tmp_path / "meta"), Config.CATEGORIES).scan(image_tree)
+    assert sorted(listing) == sorted(Config.CATEGORIES)
+    for category, records in listing.items():
+        assert len(records) == 3
+        assert all(record["valid"] and record["label"] == Config.CATEGORIES.index(category) for record in records)
+        assert all((record["width"], record["height"]) == (20, 16) for record in records)
+
+
+def test_rescan_verifies_only_changed_files(image_tree, tmp_path, capsys):
+    meta_dir = str(tmp_path / "meta")
+    Manifest(meta_dir, Config.CATEGORIES).scan(image_tree)
+    capsys.readouterr()
+
+    Manifest(meta_dir, Config.CATEGORIES).scan(image_tree)
+    assert "verified" not in capsys.readouterr().out
+
+    broken = os.path.join(image_tree, "no_tumor", "image(1).png")
+    with open(broken, "wb") as f:
+        f.write(b"not an image")
+    manifest = Manifest(meta_dir, Config.CATEGORIES)
+    records = {record["path"]: record for record in manifest.scan(image_tree)["no_tumor"]}
+    assert "verified 1 new or changed files" in capsys.readouterr().out
+    assert not records[broken]["valid"]
+
+
+def test_removed_files_leave_the_manifest_and_digest_changes(image_tree, tmp_path):
+    meta_dir = str(tmp_path / "meta")
+    manifest = Manifest(meta_dir, Config.CATEGORIES)
+    manifest.scan(image_tree)
+    before = manifest.digest()
+
+    removed = os.path.join(image_tree, "glioma_tumor", "image(0).png")
+    os.remove(removed)
+    manifest.scan(image_tree)
+    assert removed not in Manifest(meta_dir, Config.CATEGORIES).records
+    assert manifest.digest() != before
+
+
+def test_save_leaves_no_temporary_file(image_tree, tmp_path):
+    meta_dir = str(tmp_path / "meta")
+    Manifest(meta_dir, Config.CATEGORIES).scan(image_tree)
+    assert os.listdir(meta_dir) == [Manifest.FILENAME]
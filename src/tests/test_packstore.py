@@ -0,0 +1,52 @@
+""" tests/test_packstore.py """
+
+import os
+import numpy as np
+from PIL import Image
+from funcs.transformer import Transformer
+from utils.dataset import PackedBrainTumorDataset
+from utils.packstore import PackStore
+from utils.prepdata import PrepData
+
+
+def test_write_and_view_round_trip(image_tree, tmp_path):
+    paths = sorted(os.path.join(image_tree, "glioma_tumor", name) for name in os.listdir(os.path.join(image_tree, "glioma_tumor")))
+    store = PackStore.write(str(tmp_path / "pack"), paths, [0, 1, 2], target_size=(20, 16))
+
+    assert PackStore.exists(store.path)
+    reopened = PackStore(store.path)
+    assert len(reopened) == 3
+    assert reopened.labels.tolist() == [0, 1, 2]
+    assert reopened.paths.tolist() == paths
+    for i, path in enumerate(paths):
+        with Image.open(path) as img:
+            expected = np.asarray(img.convert("RGB")).transpose(2, 0, 1)
+        assert np.array_equal(reopened.view(i), expected)
+
+
+def test_grayscale_pack_is_single_channel(image_tree, tmp_path):
+    path = os.path.join(image_tree, "no_tumor", "image(0).png")
+    store = PackStore.write(str(tmp_path / "pack_L"), [path], [2], target_size=(8, 8), mode="L")
+    assert store.view(0).shape == (1, 8, 8)
+
+    # Without dataset statistics the packed loader falls back to the same grayscale defaults as the Transformer
+    dataset = PackedBrainTumorDataset(store)
+    transformer = Transformer(channels=1)
+    assert np.allclose(dataset.mean.flatten().numpy() / 255.0, transformer.mean)
+    assert np.allclose(dataset.std.flatten().numpy() / 255.0, transformer.std)
+
+
+def test_prepdata_reuses_packs_until_the_split_changes(image_tree, meta_config):
+    prep = PrepData(meta_config, train_dir=image_tree, target_size=(20, 16))
+    stores = prep.pack(splits=("train", "valid"))
+    data_file = stores["train"].path + PackStore.DATA_SUFFIX
+    mtime = os.stat(data_file).st_mtime_ns
+
+    again = PrepData(meta_config, train_dir=image_tree, target_size=(20, 16)).pack(splits=("train", "valid"))
+    assert os.stat(data_file).st_mtime_ns == mtime
+    assert again["train"].paths.tolist() == [str(path) for path in prep.train_images]
+
+    removed = prep.train_images[0]
+    changed = PrepData(meta_config, train_dir=image_tree, target_size=(20, 16), exclude=[removed]).pack(splits=("train", "valid"))
+    assert removed not in changed["train"].paths.tolist() + changed["valid"].paths.tolist()
+    assert len(changed["train"]) + len(changed["valid"]) == len(prep.train_images) + len(prep.valid_images) - 1
@@ -0,0 +1,40 @@
+""" tests/test_patharray.py """
+
+import pickle
+import numpy as np
+import pytest
+from utils.patharray import PathArray
+from utils.dataset import BrainTumorDataset
+
+
+PATHS = ["/data/Training/glioma_tumor/image(1).jpg", "/data/Training/no_tumor/ünïcode.png", "", "/data/short.png"]
+
+
+def test_indexing_matches_the_input_list():
+    paths = PathArray(PATHS)
+    assert len(paths) == 4
+    assert [paths[i] for i in range(4)] == PATHS
+    assert list(paths) == PATHS
+    assert paths[-1] == PATHS[-1] and paths[-4] == PATHS[0]
+
+
+@pytest.mark.parametrize("idx", [4, -5])
+def test_out_of_range_raises_index_error(idx):
+    with pytest.raises(IndexError):
+        PathArray(PATHS)[idx]
+
+
+def test_storage_is_two_arrays_and_pickles():
+    paths = PathArray(PATHS)
+    assert paths.buffer.dtype == np.uint8 and paths.offsets.dtype == np.int64
+    assert paths.nbytes == paths.buffer.nbytes + paths.offsets.nbytes
+    assert list(pickle.loads(pickle.dumps(paths))) == PATHS
+    assert len(PathArray([])) == 0
+
+
+def test_dataset_stores_paths_and_int8_labels(image_tree):
+    path = f"{image_tree}/pituitary_tumor/image(0).png"
+    dataset = BrainTumorDataset(image_paths=[path], labels=[3])
+    assert isinstance(dataset.image_paths, PathArray) and dataset.labels.dtype == np.int8
+    image, label = dataset[0]
+    assert image.size == (20, 16) and label == "pituitary_tumor"
@@ -0,0 +1,49 @@
+""" tests/test_predict.py """
+
+import json
+import pytest
+import predict
+from models.model import TumorClassifier
+from models.checkpoint import atomic_save
+from tests.conftest import write_tree
+
+PREPROCESS = {"resize": [32, 24], "mean": [0.1, 0.2, 0.3], "std": [0.4, 0.5, 0.6]}
+
+
+def _checkpoint(path, preprocess=PREPROCESS):
+    state = TumorClassifier().state_dict()
+    atomic_save({"model": state, "preprocess": preprocess} if preprocess else state, str(path))
+    return str(path)
+
+
+@pytest.fixture
+def transformer_args(monkeypatch):
+    """ Keyword arguments of every Transformer predict.run builds. """
+    seen = []
+    transformer_cls = predict.Transformer
+    monkeypatch.setattr(predict, "Transformer", lambda **kwargs: seen.append(kwargs) or transformer_cls(**kwargs))
+    return seen
+
+
+def test_checkpoint_preprocess_reaches_the_transformer(tmp_path, transformer_args):
+    root = write_tree(tmp_path / "tree", per_class=1)
+    output = str(tmp_path / "out.jsonl")
+
+    assert predict.run(root, output, _checkpoint(tmp_path / "model.pt"), batch_size=2, workers=1) == 4
+    assert transformer_args[-1]["mean"] == PREPROCESS["mean"] and transformer_args[-1]["std"] == PREPROCESS["std"]
+    assert transformer_args[-1]["resize"] == (32, 24)
+    with open(output) as f:
+        assert all("label" in json.loads(line) for line in f)
+
+
+def test_explicit_stats_override_the_checkpoint(tmp_path, transformer_args):
+    (tmp_path / "empty").mkdir()
+    predict.run(str(tmp_path / "empty"), str(tmp_path / "out.csv"), _checkpoint(tmp_path / "model.pt"),
+                mean=[0.5] * 3, std=[0.2] * 3)
+    assert transformer_args[-1]["mean"] == [0.5] * 3 and transformer_args[-1]["std"] == [0.2] * 3
+    assert transformer_args[-1]["resize"] == (32, 24)
+
+
+def test_missing_statistics_are_an_error(tmp_path):
+    with pytest.raises(ValueError):
+        predict.run(str(tmp_path), str(tmp_path / "out.csv"), _checkpoint(tmp_path / "bare.pt", preprocess=None))
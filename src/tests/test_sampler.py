@@ -0,0 +1,49 @@
+""" tests/test_sampler.py """
+
+import pytest
+from utils.sampler import ShardedSampler
+
+
+def test_shards_partition_the_global_order():
+    whole = ShardedSampler(10, seed=1)
+    shards = [list(ShardedSampler(10, num_replicas=2, rank=rank, seed=1)) for rank in range(2)]
+    order = list(whole)
+    assert sorted(order) == list(range(10))
+    assert shards[0] == order[0::2] and shards[1] == order[1::2]
+
+
+def test_padding_keeps_ranks_in_lockstep():
+    shards = [ShardedSampler(7, num_replicas=3, rank=rank) for rank in range(3)]
+    assert [len(shard) for shard in shards] == [3, 3, 3]
+    assert set().union(*(set(shard) for shard in shards)) == set(range(7))
+    unpadded = [list(ShardedSampler(7, num_replicas=3, rank=rank, shuffle=False, pad=False)) for rank in range(3)]
+    assert sorted(sum(unpadded, [])) == list(range(7))
+
+
+def test_order_depends_only_on_seed_and_epoch():
+    sampler = ShardedSampler(20, seed=3)
+    sampler.set_epoch(1)
+    first = list(sampler)
+    sampler.set_epoch(2)
+    assert list(sampler) != first
+    sampler.set_epoch(1)
+    assert list(sampler) == first
+
+
+def test_state_dict_resumes_mid_epoch():
+    sampler = ShardedSampler(12, seed=5)
+    sampler.set_epoch(4)
+    order = list(sampler)
+    state = sampler.state_dict(consumed=5)
+
+    resumed = ShardedSampler(12, seed=0)
+    resumed.load_state_dict(state)
+    resumed.set_epoch(4)  # the trainer sets the saved epoch again, which must keep the position
+    assert list(resumed) == order[5:] and len(resumed) == 7
+    resumed.set_epoch(5)
+    assert len(list(resumed)) == 12
+
+
+def test_invalid_rank_is_rejected():
+    with pytest.raises(ValueError):
+        ShardedSampler(4, num_replicas=2, rank=2)
@@ -0,0 +1,65 @@
+""" tests/test_search.py """
+
+import pytest
+from models.search import ASHA, HyperparameterSearch, TrialStore, rung_epochs, sample_configs, DEFAULT_SPACE
+
+
+def test_rungs_grow_by_eta_and_end_at_the_budget():
+    assert rung_epochs(1, 9, 3) == [1, 3, 9]
+    assert rung_epochs(1, 10, 3) == [1, 3, 9, 10]
+    assert rung_epochs(2, 2) == [2]
+
+
+def test_configs_are_reproducible():
+    assert sample_configs(DEFAULT_SPACE, 5, seed=1) == sample_configs(DEFAULT_SPACE, 5, seed=1)
+    assert sample_configs(DEFAULT_SPACE, 5, seed=1) != sample_configs(DEFAULT_SPACE, 5, seed=2)
+
+
+def test_trial_store_replays_and_truncates_a_partial_line(tmp_path):
+    store = TrialStore(str(tmp_path / "trials.jsonl"))
+    store.append({"trial": 0, "rung": 0, "valid_accuracy": 0.5})
+    store.append({"trial": 1, "rung": 0, "valid_accuracy": 0.7})
+    with open(store.path, "a") as f:
+        f.write('{"trial": 2, "ru')  # killed mid-write
+
+    assert [record["trial"] for record in store.load()] == [0, 1]
+    store.append({"trial": 2, "rung": 0, "valid_accuracy": 0.6})
+    assert [record["trial"] for record in store.load()] == [0, 1, 2]
+
+
+def test_asha_starts_every_trial_and_promotes_the_top_fraction():
+    scheduler = ASHA([{}] * 6, rungs=[1, 3, 9], eta=3)
+    started = [scheduler.next_job() for _ in range(3)]
+    assert started == [(0, 0), (1, 0), (2, 0)]
+    for trial, accuracy in [(0, 0.2), (1, 0.9), (2, 0.5)]:
+        scheduler.record(trial, 0, accuracy)
+
+    # The best of three bottom-rung results moves up before any new trial starts
+    assert scheduler.next_job() == (1, 1)
+    assert scheduler.next_job() == (3, 0)
+    scheduler.record(1, 1, 0.95)
+    assert [row[0] for row in scheduler.leaderboard()] == [1, 2, 0]
+
+
+def test_asha_stops_when_nothing_can_run():
+    scheduler = ASHA([{}], rungs=[1, 3], eta=3)
+    assert scheduler.next_job() == (0, 0)
+    assert scheduler.next_job() is None
+    scheduler.record(0, 0, 0.4)
+    assert scheduler.next_job() is None  # one result is below the 1/eta needed to promote
+
+
+def test_resume_rejects_records_from_another_search(tmp_path):
+    search = HyperparameterSearch({}, str(tmp_path), trials=2, cpu_budget=1)
+    search.store.append({"trial": 0, "rung": 0, "config": {"lr": -1}, "valid_accuracy": 0.5})
+    with pytest.raises(ValueError):
+        search._resume(ASHA(search.configs, search.rungs, search.eta))
+
+
+def test_resume_replays_recorded_rungs(tmp_path):
+    search = HyperparameterSearch({}, str(tmp_path), trials=2, cpu_budget=1)
+    search.store.append({"trial": 1, "rung": 0, "config": search.configs[1], "valid_accuracy": 0.5})
+    scheduler = ASHA(search.configs, search.rungs, search.eta)
+    assert search._resume(scheduler) == 1
+    assert scheduler.next_job() == (0, 0)
+    assert scheduler.next_job() is None
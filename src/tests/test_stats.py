@@ -0,0 +1,52 @@
+""" tests/test_stats.py """
+
+import os
+import numpy as np
+from PIL import Image
+from utils.stats import RunningStats, DatasetStats, partial_stats
+
+
+def _images(count=5, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, (rng.integers(4, 12), rng.integers(4, 12), 3), dtype=np.uint8) for _ in range(count)]
+
+
+def test_running_stats_match_numpy():
+    images = _images()
+    stats = RunningStats(3)
+    for pixels in images:
+        stats.update(pixels)
+    flat = np.concatenate([pixels.reshape(-1, 3) for pixels in images]).astype(np.float64) / 255.0
+    assert stats.count == len(flat)
+    assert np.allclose(stats.mean, flat.mean(axis=0))
+    assert np.allclose(stats.std, flat.std(axis=0))
+    assert stats.hist.sum() == flat.size
+
+
+def test_merged_partials_equal_one_pass():
+    images = _images(8)
+    whole, left, right = RunningStats(3), RunningStats(3), RunningStats(3)
+    for i, pixels in enumerate(images):
+        whole.update(pixels)
+        (left if i < 3 else right).update(pixels)
+    merged = RunningStats(3).merge(left).merge(right)
+    assert merged.count == whole.count
+    assert np.allclose(merged.mean, whole.mean)
+    assert np.allclose(merged.m2, whole.m2)
+    assert np.array_equal(merged.hist, whole.hist)
+
+
+def test_dataset_stats_are_cached_by_key(tmp_path):
+    paths = []
+    for i, pixels in enumerate(_images(4)):
+        paths.append(str(tmp_path / f"{i}.png"))
+        Image.fromarray(pixels).save(paths[-1])
+    meta_dir = str(tmp_path / "meta")
+    result = DatasetStats(meta_dir, processes=1).compute(paths, [0, 1, 1, 3], ["a", "b", "c", "d"], "key")
+
+    expected = partial_stats(paths)
+    assert np.allclose(result["mean"], expected.mean) and np.allclose(result["std"], expected.std)
+    assert result["class_counts"] == {"a": 1, "b": 2, "c": 0, "d": 1}
+
+    os.remove(paths[0])  # a cache hit never reads the images again
+    assert DatasetStats(meta_dir).compute(paths, [0, 1, 1, 3], ["a", "b", "c", "d"], "key") == result
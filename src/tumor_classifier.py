@@ -1,36 +1,103 @@
 """ tumor_classifier.py """
 
-from torch.utils.data import DataLoader
-from config import DIR_TRAINING, DIR_TESTING, init_conf
+import os
+import math
+import argparse
+import contextlib
+import config
+from monai.utils import set_determinism
+from monai.config import print_config
+from torch.utils.data import DataLoader, default_collate
 from utils.prepdata import PrepData
-from utils.dataset import BrainTumorDataset
+from utils.dataset import PackedBrainTumorDataset
 from funcs.transformer import Transformer
 from models.plots import Plotter
+from models.model import TumorClassifier, Trainer, Prefetcher
+from models.features import cached_splits, train_head
+from models.progressive import progressive_schedule, fit_progressive
+from models.checkpoint import Checkpointer, atomic_save, load_checkpoint, restore
+from funcs.optimizer import build_optimizer
+from utils.optimizer import warmup_cosine
+from utils import profiler
+from utils.dedup import Deduplicator
+from utils.sampler import ShardedSampler
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Brain tumor MRI classifier: data preparation and CPU training.")
+    parser.add_argument("--epochs", type=int, default=10, help="training epochs (0 only prepares data and plots)")
+    parser.add_argument("--target-accuracy", type=float, default=0.9, help="validation accuracy for time-to-accuracy")
+    parser.add_argument("--lr", type=float, default=1e-3, help="peak learning rate (one warmup epoch, then cosine decay)")
+    parser.add_argument("--accumulation-steps", type=int, default=1, help="batches per optimizer step")
+    parser.add_argument("--no-compile", action="store_true", help="disable torch.compile")
+    parser.add_argument("--grayscale", action="store_true", help="single-channel (L) images and model stem instead of RGB")
+    parser.add_argument("--progressive", action="store_true", help="ramp training image size 64 -> 256 over a pyramid pack")
+    parser.add_argument("--head-only", action="store_true", help="freeze a pretrained backbone and train the head on cached features")
+    parser.add_argument("--dedup", action="store_true", help="drop near-duplicate and test-leaking training images first")
+    parser.add_argument("--checkpoint-dir", default=None, help="checkpoint directory (default: DIR_META/checkpoints)")
+    parser.add_argument("--keep-last", type=int, default=3, help="checkpoints kept besides the best one")
+    parser.add_argument("--checkpoint-every", type=int, default=0, help="also checkpoint every N optimizer steps within an epoch")
+    parser.add_argument("--resume", action="store_true", help="continue from the latest checkpoint: weights, optimizer, RNG, sampler and split")
+    parser.add_argument("--profile", action="store_true", help="time every data/training stage across all processes")
+    parser.add_argument("--profile-dir", default=None, help="profile output directory (default: DIR_META/profile)")
+    parser.add_argument("--torch-profile-steps", type=int, default=0, help="also capture this many training steps with torch.profiler")
+    args = parser.parse_args()
+
+    mode = "L" if args.grayscale else "RGB"
+
+    set_determinism(seed=42)
+    print_config()
+
+    # Configuration, device report and dataset provisioning are lazy; run them once, here, not on import
+    init_conf = config.get_config()
+    config.get_cuda_info()
+    config.provision_dataset()
+    DIR_TRAINING, DIR_TESTING = init_conf.DIR_TRAINING, init_conf.DIR_TESTING
+
+    # Enabled before any dataset, transform or DataLoader worker exists so they all record stages
+    profile_dir = args.profile_dir or os.path.join(init_conf.DIR_META, "profile")
+    if args.profile:
+        profiler.configure(profile_dir)
+    collate = profiler.timed("loader.collate", default_collate)
+
+    exclude = None
+    if args.dedup:
+        print(f"Detecting near-duplicates and train/test leakage...", flush=True)
+        exclude = Deduplicator(init_conf.DIR_META, init_conf.CATEGORIES).run(DIR_TRAINING, DIR_TESTING)["exclude"]
+
     print(f"Preprocessing data for Training, Validating, Testing Samples...", flush=True)
-    data_prep = PrepData(config=init_conf, train_dir=DIR_TRAINING)
+    data_prep = PrepData(config=init_conf, train_dir=DIR_TRAINING, exclude=exclude)
+
+    # The saved split wins over a fresh one, so files added since the interrupted run cannot leak into validation
+    checkpoint_dir = args.checkpoint_dir or os.path.join(init_conf.DIR_META, "checkpoints")
+    resume_path = Checkpointer.latest(checkpoint_dir) if args.resume else None
+    resume_state = load_checkpoint(resume_path) if resume_path else None
+    if resume_state is not None:
+        print(f"Resuming from {resume_path} (epoch {resume_state['epoch']})", flush=True)
+        data_prep.restore_split(resume_state["split"])
 
     print(f"[TRAINING DIRECTORY]: Resizing images in training and validation sets...", flush=True)
     data_prep.resize_images()
     print(f"[TRAINING DIRECTORY]:", flush=True)
     data_prep.summary()
 
-    train_dataset = BrainTumorDataset(
-        image_paths=data_prep.train_images, 
-        labels=data_prep.train_labels,
-        transform=Transformer().get_basic_transform()
-    )
+    # One-time pack stage: decoded, resized images in a single memory-mapped file shared by all workers
+    print(f"[TRAINING DIRECTORY]: Packing training and validation sets...", flush=True)
+    train_stores = data_prep.pack(mode=mode)
+    # Normalize with the dataset's own statistics instead of the ImageNet defaults
+    stats = data_prep.dataset_stats(mode=mode)
+    transformer = Transformer(mean=stats["mean"], std=stats["std"], channels=len(mode))
+    print(f"[TRAINING DIRECTORY]: mean={stats['mean']}, std={stats['std']}", flush=True)
+    # Saved with every checkpoint so serving, export and predict normalize exactly as training did
+    preprocess = {"resize": list(data_prep.target_size), "mean": transformer.mean, "std": transformer.std}
 
-    valid_dataset = BrainTumorDataset(
-        image_paths=data_prep.valid_images,
-        labels=data_prep.valid_labels,
-        transform=Transformer().get_basic_transform()
-    )
+    train_dataset = PackedBrainTumorDataset(train_stores["train"], mean=transformer.mean, std=transformer.std)
+    valid_dataset = PackedBrainTumorDataset(train_stores["valid"], mean=transformer.mean, std=transformer.std)
 
-    train_loader = DataLoader(train_dataset, batch_size=32, shuffle=True, num_workers=4)
-    valid_loader = DataLoader(valid_dataset, batch_size=32, shuffle=False, num_workers=4)
+    # Order depends only on (seed, epoch), so a checkpoint can resume at the exact sample it stopped at
+    train_sampler = ShardedSampler(len(train_dataset), seed=42)
+    train_loader = DataLoader(train_dataset, batch_size=32, sampler=train_sampler, num_workers=4, collate_fn=collate)
+    valid_loader = DataLoader(valid_dataset, batch_size=32, shuffle=False, num_workers=4, collate_fn=collate)
 
     print(f"\nTotal number of training images: {len(train_dataset)}", flush=True)
     print(f"Total number of validation images: {len(valid_dataset)}", flush=True)
@@ -41,8 +108,9 @@ if __name__ == "__main__":
     print(f"[TESTING DIRECTORY]:", flush=True)
     test_prep.summary()
 
-    test_dataset = BrainTumorDataset(root_dir=DIR_TESTING, transform=Transformer().get_basic_transform())
-    test_loader = DataLoader(test_dataset, batch_size=32, shuffle=False, num_workers=4)
+    test_stores = test_prep.pack(mode=mode)
+    test_dataset = PackedBrainTumorDataset(test_stores["test"], mean=transformer.mean, std=transformer.std)
+    test_loader = DataLoader(test_dataset, batch_size=32, shuffle=False, num_workers=4, collate_fn=collate)
 
     print(f"\nTotal number of testing images: {len(test_dataset)}", flush=True)
     print(f"----------------------------------------\n", flush=True)
@@ -62,3 +130,60 @@ if __name__ == "__main__":
         test_prep.test_class_counts,
         save_name="before"
     )
+
+    if args.epochs > 0 and args.head_only:
+        # The backbone runs once per split; every epoch after that only touches the memory-mapped embeddings
+        model = TumorClassifier(pretrained=True, in_channels=len(mode))
+        stores = {**train_stores, "test": test_stores["test"]}
+        data_keys = {
+            "train": "train\0" + data_prep.manifest.digest(data_prep.train_images),
+            "valid": "valid\0" + data_prep.manifest.digest(data_prep.valid_images),
+            "test": "test\0" + test_prep.manifest.digest(test_prep.test_images),
+        }
+        transform_config = {"mode": mode, "size": list(data_prep.target_size), "mean": transformer.mean, "std": transformer.std}
+        splits = cached_splits(model, stores, data_keys, transform_config, init_conf.DIR_META, transformer.mean, transformer.std)
+        train_head(model, splits, epochs=args.epochs, lr=args.lr)
+        # A full-model checkpoint (pretrained backbone + trained head) that serving, export and predict load as is
+        head_only_path = os.path.join(checkpoint_dir, "head_only.pt")
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        atomic_save({"model": model.state_dict(), "preprocess": preprocess}, head_only_path)
+        print(f"Saved head-only model to {head_only_path}", flush=True)
+    elif args.epochs > 0:
+        model = TumorClassifier(in_channels=len(mode))
+        optimizer = build_optimizer(model, lr=args.lr)
+        steps_per_epoch = math.ceil(len(train_loader) / args.accumulation_steps)
+        scheduler = warmup_cosine(optimizer, warmup_steps=steps_per_epoch, total_steps=steps_per_epoch * args.epochs)
+        trainer = Trainer(
+            model,
+            optimizer=optimizer,
+            scheduler=scheduler,
+            accumulation_steps=args.accumulation_steps,
+            compile=not args.no_compile,
+            augment=transformer.get_batch_augmentation(),
+            checkpointer=Checkpointer(checkpoint_dir, keep_last=args.keep_last,
+                                      extra={"split": data_prep.split_state(), "preprocess": preprocess}),
+            checkpoint_every=args.checkpoint_every,
+        )
+        if resume_state is not None:
+            restore(trainer, resume_state, train_sampler)
+        torch_profile = profiler.torch_profile(profile_dir, args.torch_profile_steps) if args.profile else contextlib.nullcontext()
+        with torch_profile:
+            if args.progressive:
+                # Early epochs read small pyramid levels instead of resizing; validation stays at full size
+                sizes = sorted({64, 128, 224, data_prep.target_size[0]})
+                pyramid = data_prep.pack(mode=mode, splits=("train",), levels=sizes)["train"]
+                fit_progressive(trainer, pyramid, valid_loader, progressive_schedule(args.epochs, sizes), mean=transformer.mean,
+                                std=transformer.std, num_workers=4, target_accuracy=args.target_accuracy)
+            else:
+                trainer.fit(train_loader, valid_loader, args.epochs, target_accuracy=args.target_accuracy)
+        trainer.checkpointer.close()
+        test_metrics = trainer.evaluate(test_loader)
+        print(f"Test loss {test_metrics['loss']:.4f}, accuracy {test_metrics['accuracy']:.3f}", flush=True)
+    elif args.profile:
+        # Data path only: one pass over the training loader
+        for _ in Prefetcher(train_loader, lambda images, labels: (images, labels)):
+            pass
+
+    if args.profile:
+        # DataLoader workers flush their records when each epoch's iterator shuts them down
+        profiler.report(profile_dir)
@@ -0,0 +1,159 @@
+""" utils/cache.py """
+
+import os
+import weakref
+import numpy as np
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+
+
+class SharedSampleCache:
+    """ Byte-budgeted CLOCK cache of decoded pixels living in shared memory, visible to every DataLoader worker. """
+
+    # Per-slot metadata columns and global counters stored in the shared meta block
+    KEY, HEIGHT, WIDTH, CHANNELS, REF = range(5)
+    HITS, MISSES, EVICTIONS, HAND, OVERSIZE = range(5)
+
+    def __init__(self, capacity_bytes, num_items, slot_bytes=256 * 256 * 3, mp_context=None):
+        """ Allocate enough fixed-size slots to fit capacity_bytes; entries larger than slot_bytes are not cached,
+        counted as "oversize" in stats() and reported once per process. Pass the DataLoader's multiprocessing_context
+        as mp_context when workers are not forked. """
+        self.slot_bytes = int(slot_bytes)
+        self.num_slots = max(int(capacity_bytes) // self.slot_bytes, 1)
+        self.num_items = int(num_items)
+        self.lock = (mp_context or mp).Lock()
+
+        self._owner_pid = os.getpid()
+        sizes = {
+            "data": self.num_slots * self.slot_bytes,
+            "slots": self.num_slots * 5 * 8,
+            "table": max(self.num_items, 1) * 8,
+            "counters": 5 * 8,
+        }
+        blocks = {name: shared_memory.SharedMemory(create=True, size=size) for name, size in sizes.items()}
+        self._names = {name: shm.name for name, shm in blocks.items()}
+        self._attach(blocks)
+
+        self.slots[:, self.KEY] = -1
+        self.slots[:, self.REF] = 0
+        self.table[:] = -1
+        self.counters[:] = 0
+
+    def _attach(self, blocks):
+        """ Build numpy views over the shared blocks and register their release. """
+        self._blocks = blocks
+        self.data = np.ndarray((self.num_slots, self.slot_bytes), dtype=np.uint8, buffer=blocks["data"].buf)
+        self.slots = np.ndarray((self.num_slots, 5), dtype=np.int64, buffer=blocks["slots"].buf)
+        self.table = np.ndarray((max(self.num_items, 1),), dtype=np.int64, buffer=blocks["table"].buf)
+        self.counters = np.ndarray((5,), dtype=np.int64, buffer=blocks["counters"].buf)
+        self._warned_oversize = False
+        self._finalizer = weakref.finalize(self, SharedSampleCache._release, list(blocks.values()), self._owner_pid)
+
+    @staticmethod
+    def _release(blocks, owner_pid):
+        """ Close the shared blocks, unlinking them only from the process that created them (forked workers included). """
+        for shm in blocks:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # numpy views still alive at interpreter exit, the mapping goes away with the process
+            if os.getpid() == owner_pid:
+                try:
+                    # A worker sharing this process's resource tracker may have unregistered the block already
+                    resource_tracker.register(shm._name, "shared_memory")
+                    shm.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def __getstate__(self):
+        """ Pickle only the block names; workers re-attach to the same shared memory. """
+        state = {k: v for k, v in self.__dict__.items() if k in ("slot_bytes", "num_slots", "num_items", "lock", "_owner_pid", "_names")}
+        return state
+
+    def __setstate__(self, state):
+        """ Attach to the blocks created by the owning process. """
+        self.__dict__.update(state)
+        self._attach({name: self._open_block(shm_name) for name, shm_name in self._names.items()})
+
+    @staticmethod
+    def _open_block(name):
+        """ Attach to an existing block without tracking it: the owning process alone unlinks it, and a tracked
+        attachment makes the resource tracker report it as leaked (or unlink it) when the worker exits. """
+        try:
+            return shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13 always registers the block
+            shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(shm._name, "shared_memory")
+            return shm
+
+    def close(self):
+        """ Release the shared memory (unlinking it in the owning process). """
+        del self.data, self.slots, self.table, self.counters
+        self._finalizer()
+
+    def get(self, key):
+        """ Return a private copy of the cached pixels for key, or None on a miss. """
+        with self.lock:
+            slot = self.table[key]
+            if slot < 0:
+                self.counters[self.MISSES] += 1
+                return None
+            height, width, channels = self.slots[slot, self.HEIGHT:self.CHANNELS + 1]
+            self.slots[slot, self.REF] = 1
+            self.counters[self.HITS] += 1
+            # Copy under the lock so a concurrent eviction cannot overwrite the slot mid-read
+            pixels = self.data[slot, :height * width * channels].copy()
+        return pixels.reshape(height, width, channels)
+
+    def put(self, key, pixels):
+        """ Store a HxWxC uint8 array for key, evicting with the CLOCK policy when full. Returns whether it was cached. """
+        pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+        if pixels.ndim == 2:
+            pixels = pixels[:, :, None]
+        if pixels.nbytes > self.slot_bytes:
+            with self.lock:
+                self.counters[self.OVERSIZE] += 1
+            if not self._warned_oversize:
+                self._warned_oversize = True
+                print(f"SharedSampleCache: a {'x'.join(map(str, pixels.shape))} sample ({pixels.nbytes} bytes) exceeds "
+                      f"slot_bytes={self.slot_bytes} and is not cached; raise slot_bytes to cache such samples", flush=True)
+            return False
+
+        with self.lock:
+            if self.table[key] >= 0:
+                return True
+            slot = self._find_victim()
+            victim = self.slots[slot, self.KEY]
+            if victim >= 0:
+                self.table[victim] = -1
+                self.counters[self.EVICTIONS] += 1
+            self.data[slot, :pixels.nbytes] = pixels.reshape(-1)
+            self.slots[slot] = (key, *pixels.shape, 0)
+            self.table[key] = slot
+        return True
+
+    def _find_victim(self):
+        """ Advance the clock hand past referenced slots, clearing their bits, and return the first free or cold slot. """
+        hand = int(self.counters[self.HAND])
+        while self.slots[hand, self.KEY] >= 0 and self.slots[hand, self.REF]:
+            self.slots[hand, self.REF] = 0
+            hand = (hand + 1) % self.num_slots
+        self.counters[self.HAND] = (hand + 1) % self.num_slots
+        return hand
+
+    def stats(self):
+        """ Hit/miss/eviction counters aggregated over every process using the cache. """
+        with self.lock:
+            hits, misses, evictions, _, oversize = (int(v) for v in self.counters)
+            entries = int((self.slots[:, self.KEY] >= 0).sum())
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": evictions,
+            "oversize": oversize,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "capacity_entries": self.num_slots,
+            "capacity_bytes": self.num_slots * self.slot_bytes,
+        }
@@ -1,69 +1,224 @@
 """ utils/dataset.py """
 
+import io
+import os
+import torch
+import numpy as np
 from PIL import Image
 from pathlib import Path
-from torch.utils.data import Dataset
-from config import init_conf
+from concurrent.futures import ThreadPoolExecutor
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
+from torchvision.io import ImageReadMode, decode_image, decode_jpeg
+from torchvision.transforms.v2 import functional as F
+import config
+from config.config import Config
+from funcs.transformer import DEFAULT_MEAN, DEFAULT_STD
+from utils.packstore import PackStore
+from utils.patharray import PathArray
+from utils.cache import SharedSampleCache
+from utils.manifest import Manifest
+from utils.profiler import stage
 
 
 class BrainTumorDataset(Dataset):
     """ Dataset for brain tumor MRI images, supporting both directory-based and list-based initialization. """
 
-    def __init__(self, root_dir=None, image_paths=None, labels=None, transform=None):
-        """ Initialize the dataset with either a root directory or lists of image paths and labels, with optional transform. """
-        self.cache = {}
+    def __init__(self, root_dir=None, image_paths=None, labels=None, transform=None, cache_bytes=0, cache=None, mode="RGB",
+                 cache_slot_bytes=None):
+        """ Initialize the dataset with either a root directory or lists of image paths and labels, with optional transform.
+        Decoded pixels are cached before the transform in a SharedSampleCache of cache_bytes (0 disables caching)
+        with cache_slot_bytes per entry, by default the decoded size of the largest image according to the manifest.
+        mode is the PIL decode mode: "RGB", or "L" to keep grayscale MRI scans single-channel end to end. """
         self.transform = transform
+        self.mode = mode
 
+        records = None
         if root_dir:
             self.root_dir = Path(root_dir)
-            self.image_paths, self.labels = self._load_paths_and_labels()
-            self.label_map = {idx: category for idx, category in enumerate(init_conf.CATEGORIES)}
-        elif image_paths and labels:
-            self.image_paths = image_paths
-            self.labels = labels
-            self.label_map = {idx: category for idx, category in enumerate(init_conf.CATEGORIES)}
-        else:
+            image_paths, labels, records = self._load_paths_and_labels()
+        elif image_paths is None or labels is None or not len(image_paths):
             raise ValueError("Either root_dir or image_paths and labels must be provided.")
+        # Flat arrays instead of lists of Path/int objects: forked DataLoader workers read them without touching
+        # (and so copying) any per-sample Python object, keeping their memory flat over an epoch
+        self.image_paths = PathArray(image_paths)
+        self.labels = np.asarray(labels, dtype=np.int8)
+        self.label_map = {idx: category for idx, category in enumerate(Config.CATEGORIES)}
+
+        self.cache = cache
+        if self.cache is None and cache_bytes:
+            if cache_slot_bytes is None:
+                if records is None:
+                    records = Manifest(config.init_conf.DIR_META, Config.CATEGORIES).records
+                cache_slot_bytes = self._largest_image_bytes(records)
+            self.cache = SharedSampleCache(cache_bytes, len(self.image_paths), slot_bytes=cache_slot_bytes)
 
     def _load_paths_and_labels(self):
-        """ Load image paths and labels from the specified directory. """
+        """ Load valid image paths and labels for the specified directory from the incremental manifest, plus its records. """
         image_paths = []
         labels = []
-        label_map = {category: idx for idx, category in enumerate(init_conf.CATEGORIES)}
+        manifest = Manifest(config.init_conf.DIR_META, Config.CATEGORIES)
 
-        for category, label in label_map.items():
-            category_path = self.root_dir / category
-            if not category_path.exists() or not category_path.is_dir():
-                continue
+        for records in manifest.scan(self.root_dir).values():
+            for record in records:
+                if record["valid"]:
+                    image_paths.append(record["path"])
+                    labels.append(record["label"])
 
-            for entry in category_path.glob("*"):
-                if entry.is_file():
-                    try:
-                        with Image.open(entry) as img:
-                            img.verify()
-                        image_paths.append(entry)
-                        labels.append(label)
-                    except (IOError, SyntaxError):
-                        print(f"File {entry} is not a valid image and will be skipped.", flush=True)
+        return image_paths, labels, manifest.records
 
-        return image_paths, labels
+    def _largest_image_bytes(self, records):
+        """ Decoded size in self.mode of the largest image, from the width/height the manifest stored for every file
+        (no image is opened): the cache slot size that fits every sample. """
+        largest = 0
+        for path in self.image_paths:
+            record = records.get(os.path.abspath(path))
+            if record is None or not record["valid"]:
+                raise ValueError(f"{path} has no valid manifest record to size the cache from; pass cache_slot_bytes")
+            largest = max(largest, record["width"] * record["height"])
+        return largest * len(self.mode)
 
     def __len__(self):
         """ Return the total number of images in the dataset. """
         return len(self.image_paths)
 
-    def __getitem__(self, idx):
-        """ Return the image and label name corresponding to the given index, with caching. """
-        if idx in self.cache:
-            return self.cache[idx]
+    def _decode(self, idx):
+        """ Read the file bytes, then decode them in self.mode (timed separately under --profile). """
+        with stage("dataset.read"):
+            with open(self.image_paths[idx], "rb") as f:
+                data = f.read()
+        with stage("dataset.decode"):
+            with Image.open(io.BytesIO(data)) as img:
+                return img.convert(self.mode)
+
+    def _load_image(self, idx):
+        """ Decode the image at idx in self.mode, going through the shared pixel cache when one is configured. """
+        if self.cache is None:
+            return self._decode(idx)
+
+        with stage("dataset.cache_get"):
+            pixels = self.cache.get(idx)
+        if pixels is None:
+            pixels = np.asarray(self._decode(idx))
+            self.cache.put(idx, pixels)
+        return Image.fromarray(pixels.squeeze(axis=2) if self.mode == "L" and pixels.ndim == 3 else pixels, mode=self.mode)
 
-        image_path = self.image_paths[idx]
+    def __getitem__(self, idx):
+        """ Return the image and label name corresponding to the given index; the transform always runs, so random augmentation stays random. """
         label_idx = self.labels[idx]
-        label_name = init_conf.CATEGORIES[label_idx]
+        label_name = Config.CATEGORIES[label_idx]
 
-        image = Image.open(image_path).convert("RGB")
+        image = self._load_image(idx)
         if self.transform:
-            image = self.transform(image)
+            with stage("dataset.transform"):
+                image = self.transform(image)
 
-        self.cache[idx] = (image, label_name)
         return image, label_name
+
+
+class PackedBrainTumorDataset(Dataset):
+    """ Dataset serving zero-copy tensor views from a PackStore, so every worker shares the same page cache. """
+
+    def __init__(self, store, mean=None, std=None, transform=None):
+        """ Initialize from a PackStore (or its path), normalization statistics and an optional tensor transform. """
+        self.store = store if isinstance(store, PackStore) else PackStore(store)
+        self.transform = transform
+        self.labels = self.store.labels
+        self.label_map = {idx: category for idx, category in enumerate(Config.CATEGORIES)}
+
+        channels = int(self.store.shapes[0][0]) if len(self.store) else 3
+        mean = mean if mean else DEFAULT_MEAN[channels]
+        std = std if std else DEFAULT_STD[channels]
+        # Fold the 1/255 scaling into the statistics: (x / 255 - mean) / std == (x - 255 * mean) / (255 * std)
+        self.mean = torch.tensor(mean[:channels], dtype=torch.float32).view(-1, 1, 1) * 255.0
+        self.std = torch.tensor(std[:channels], dtype=torch.float32).view(-1, 1, 1) * 255.0
+
+    def __len__(self):
+        """ Return the total number of images in the pack. """
+        return len(self.store)
+
+    def __getitem__(self, idx):
+        """ Return the normalized image tensor and label name at idx, reading only a slice of the mapped file. """
+        with stage("dataset.read"):
+            image = torch.from_numpy(self.store.view(idx))
+        with stage("dataset.normalize"):
+            image = image.float().sub_(self.mean).div_(self.std)
+        if self.transform:
+            with stage("dataset.transform"):
+                image = self.transform(image)
+        return image, self.label_map[int(self.labels[idx])]
+
+
+class BatchDecodeDataset(Dataset):
+    """ Batch-at-a-time dataset for the "torchvision" backend: __getitem__ takes a list of indices (from a
+    BatchSampler, see batch_loader), reads the raw file bytes on a thread pool, decodes them with
+    torchvision.io straight into uint8 tensors and converts to float and normalizes once for the whole batch. """
+
+    def __init__(self, image_paths, labels, mean, std, resize=(256, 256), mode="RGB", threads=4):
+        """ image_paths/labels as for BrainTumorDataset; mean/std are the per-channel statistics of the training set
+        (e.g. PrepData.dataset_stats()), required so a batch is never silently normalized with another dataset's.
+        Images not already at resize are resized as uint8 tensors. """
+        self.image_paths = PathArray(image_paths)
+        self.labels = np.asarray(labels, dtype=np.int8)
+        self.resize = list(resize)
+        self.mode = mode
+        self.read_mode = ImageReadMode.GRAY if mode == "L" else ImageReadMode.RGB
+        self.threads = threads
+        self._pool = None
+        self._pool_pid = None
+
+        channels = len(mode)
+        if len(mean) < channels or len(std) < channels:
+            raise ValueError(f"mean and std need {channels} values for mode {mode}, got {list(mean)} and {list(std)}")
+        # Same folding of the 1/255 scaling as PackedBrainTumorDataset, applied to [B, C, H, W]
+        self.mean = torch.tensor(mean[:channels], dtype=torch.float32).view(1, -1, 1, 1) * 255.0
+        self.std = torch.tensor(std[:channels], dtype=torch.float32).view(1, -1, 1, 1) * 255.0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_pool"] = None
+        return state
+
+    def __len__(self):
+        """ Return the total number of images in the dataset. """
+        return len(self.image_paths)
+
+    @staticmethod
+    def _read(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def _decode(self, raw):
+        """ uint8 CHW tensors for a list of encoded files: JPEGs in one batched decode_jpeg call, others one by one. """
+        tensors = [torch.frombuffer(bytearray(data), dtype=torch.uint8) for data in raw]
+        jpegs = [i for i, data in enumerate(raw) if data[:2] == b"\xff\xd8"]
+        images = [None] * len(raw)
+        if jpegs:
+            for i, image in zip(jpegs, decode_jpeg([tensors[i] for i in jpegs], mode=self.read_mode)):
+                images[i] = image
+        for i, image in enumerate(images):
+            if image is None:
+                images[i] = decode_image(tensors[i], mode=self.read_mode)
+        return images
+
+    def __getitem__(self, indices):
+        """ Return a normalized [B, C, H, W] float batch and the label names for a list of indices. """
+        # Thread pools do not survive fork: each DataLoader worker starts its own on first use
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.threads)
+            self._pool_pid = os.getpid()
+        with stage("dataset.read"):
+            raw = list(self._pool.map(self._read, (self.image_paths[idx] for idx in indices)))
+        with stage("dataset.decode"):
+            images = self._decode(raw)
+        with stage("dataset.resize"):
+            images = [image if list(image.shape[-2:]) == self.resize else F.resize(image, self.resize, antialias=True)
+                      for image in images]
+        with stage("dataset.normalize"):
+            batch = torch.stack(images).float().sub_(self.mean).div_(self.std)
+        return batch, [Config.CATEGORIES[self.labels[idx]] for idx in indices]
+
+
+def batch_loader(dataset, batch_size=32, shuffle=False, drop_last=False, generator=None, **kwargs):
+    """ DataLoader handing whole index batches to a BatchDecodeDataset (automatic batching disabled). """
+    sampler = RandomSampler(dataset, generator=generator) if shuffle else SequentialSampler(dataset)
+    return DataLoader(dataset, sampler=BatchSampler(sampler, batch_size, drop_last), batch_size=None, **kwargs)
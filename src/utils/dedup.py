@@ -0,0 +1,226 @@
+""" utils/dedup.py """
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+from utils.manifest import Manifest
+
+_POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def popcount64(values):
+    """ Set bits per uint64 element; np.bitwise_count on NumPy >= 2, a byte lookup table otherwise. """
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(np.uint8)
+    return _POPCOUNT_TABLE[values.view(np.uint8)].reshape(*values.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def _pack_bits(bits):
+    """ 64 booleans (row-major) to one uint64, first bit most significant. """
+    return int(np.packbits(bits.reshape(-1)).view(">u8")[0])
+
+
+def dhash(img):
+    """ 64-bit difference hash: sign of horizontal gradients on a 9x8 grayscale thumbnail. """
+    pixels = np.asarray(img.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    return _pack_bits(pixels[:, 1:] > pixels[:, :-1])
+
+
+_DCT = None
+
+
+def phash(img):
+    """ 64-bit perceptual hash: low 8x8 DCT coefficients of a 32x32 grayscale thumbnail against their median. """
+    global _DCT
+    if _DCT is None:
+        n = np.arange(32)
+        _DCT = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / 64.0)
+    pixels = np.asarray(img.convert("L").resize((32, 32), Image.BILINEAR), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8].reshape(-1)
+    return _pack_bits(low > np.median(low[1:]))
+
+
+HASHES = {"dhash": dhash, "phash": phash}
+
+
+def hash_files(image_files, method="dhash"):
+    """ Hash a chunk of image files (already verified by the manifest) into a uint64 array. """
+    hash_fn = HASHES[method]
+    hashes = np.zeros(len(image_files), dtype=np.uint64)
+    for i, path in enumerate(image_files):
+        with Image.open(path) as img:
+            hashes[i] = hash_fn(img)
+    return hashes
+
+
+def _bucket_pairs(hashes, members, radius, max_pairs):
+    """ Pairs (i, j), i < j, of members (indices into hashes) within radius, comparing at most max_pairs at a time
+    so a large bucket (e.g. many blank or identical scans) never materializes all of its size^2 / 2 candidates. """
+    size = len(members)
+    member_hashes = hashes[members]
+    rows_per_block = max(max_pairs // size, 1)
+    found, distances = [], []
+    for start in range(0, size, rows_per_block):
+        block = member_hashes[start:start + rows_per_block]
+        dist = popcount64(block[:, None] ^ member_hashes[None, start:])
+        i, j = np.nonzero(dist <= radius)
+        keep = j > i
+        found.append(np.stack([members[i[keep] + start], members[j[keep] + start]], axis=1))
+        distances.append(dist[i[keep], j[keep]])
+    return np.concatenate(found), np.concatenate(distances)
+
+
+def multi_index_pairs(hashes, radius, max_pairs=1 << 22):
+    """ All (i, j), i < j, with Hamming distance <= radius, without comparing every pair.
+    The 64 bits are cut into radius + 1 substrings; by pigeonhole two hashes within radius agree exactly on at
+    least one of them, so candidates come from equal-substring buckets, verified with a vectorized popcount in
+    blocks of at most max_pairs comparisons. """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    chunks = radius + 1
+    bounds = np.linspace(0, 64, chunks + 1).astype(int)
+    found, distances = [], []
+    for low, high in zip(bounds[:-1], bounds[1:]):
+        keys = (hashes >> np.uint64(low)) & np.uint64((1 << (high - low)) - 1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        sizes = np.diff(np.r_[starts, len(keys)])
+        for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+            pairs, dist = _bucket_pairs(hashes, order[start:start + size], radius, max_pairs)
+            found.append(pairs)
+            distances.append(dist)
+    if not found:
+        return np.empty((0, 2), dtype=np.int64), np.empty(0, dtype=np.uint8)
+
+    # A pair agreeing on several substrings is found in several buckets
+    pairs, first = np.unique(np.sort(np.concatenate(found), axis=1), axis=0, return_index=True)
+    return pairs, np.concatenate(distances)[first]
+
+
+def brute_force_pairs(hashes, radius, block_size=2048):
+    """ Reference O(n^2) search in blocks with vectorized popcount, for verification and benchmarks. """
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    found, distances = [], []
+    for start in range(0, len(hashes), block_size):
+        block = hashes[start:start + block_size]
+        dist = popcount64(block[:, None] ^ hashes[None, start:])
+        i, j = np.nonzero(dist <= radius)
+        keep = j > i
+        found.append(np.stack([i[keep] + start, j[keep] + start], axis=1))
+        distances.append(dist[i[keep], j[keep]])
+    return np.concatenate(found), np.concatenate(distances)
+
+
+def connected_components(num_items, pairs):
+    """ Component id per item for the undirected graph given by pairs (union-find with path halving). """
+    parent = np.arange(num_items)
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in pairs:
+        root_i, root_j = find(i), find(j)
+        if root_i != root_j:
+            parent[max(root_i, root_j)] = min(root_i, root_j)
+    return np.array([find(x) for x in range(num_items)])
+
+
+class Deduplicator:
+    """ Perceptual-hash index over the Training and Testing trees: near-duplicates within each and train/test leakage. """
+
+    def __init__(self, meta_dir, categories, method="dhash", radius=4, processes=None, chunk_size=128):
+        """ Hashes are cached as meta_dir/hashes/<key>.npz; reports go to meta_dir/dedup. """
+        self.meta_dir = meta_dir
+        self.manifest = Manifest(meta_dir, categories)
+        self.method = method
+        self.radius = radius
+        self.processes = processes
+        self.chunk_size = chunk_size
+
+    def _list(self, directory):
+        """ Valid image paths under directory in manifest listing order. """
+        return [record["path"] for records in self.manifest.scan(directory).values() for record in records if record["valid"]]
+
+    def hashes(self, image_files):
+        """ uint64 hash per file, computed in parallel and cached by manifest digest and method. """
+        key = hashlib.sha1(f"{self.manifest.digest(image_files)}\0{self.method}".encode()).hexdigest()
+        cache_path = os.path.join(self.meta_dir, "hashes", f"{key}.npz")
+        paths = np.asarray([str(path) for path in image_files])
+        if os.path.isfile(cache_path):
+            with np.load(cache_path) as cached:
+                if np.array_equal(cached["paths"], paths):
+                    return cached["hashes"]
+
+        chunks = [image_files[i:i + self.chunk_size] for i in range(0, len(image_files), self.chunk_size)]
+        if self.processes == 1 or len(chunks) <= 1:
+            results = [hash_files(chunk, self.method) for chunk in chunks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                results = list(pool.map(hash_files, chunks, [self.method] * len(chunks)))
+        hashes = np.concatenate(results) if results else np.empty(0, dtype=np.uint64)
+
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp_path = cache_path + ".tmp.npz"
+        np.savez(tmp_path, hashes=hashes, paths=paths)
+        os.replace(tmp_path, cache_path)
+        return hashes
+
+    def find(self, train_files, test_files=()):
+        """ Near-duplicate clusters within Training, within Testing and pairs leaking across the two, plus the
+        Training files to exclude: every cluster member but the first, and anything within radius of a test image. """
+        train_files, test_files = [str(path) for path in train_files], [str(path) for path in test_files]
+        hashes = np.concatenate([self.hashes(train_files), self.hashes(test_files)]) if test_files else self.hashes(train_files)
+        files = train_files + test_files
+        pairs, distances = multi_index_pairs(hashes, self.radius)
+        is_test = np.arange(len(files)) >= len(train_files)
+        cross = is_test[pairs[:, 0]] != is_test[pairs[:, 1]]
+
+        within = pairs[~cross]
+        components = connected_components(len(files), within)
+        exclude = set()
+        for idx in np.flatnonzero(components != np.arange(len(files))):
+            if not is_test[idx]:
+                exclude.add(files[idx])
+        # Training files precede test files, so the smaller index of a crossing pair is the training image
+        leaked = {files[min(i, j)] for i, j in pairs[cross]}
+        exclude |= leaked
+
+        def listing(selected):
+            return [{"a": files[i], "b": files[j], "distance": int(d)} for (i, j), d in zip(pairs[selected], distances[selected])]
+
+        train_pairs = ~cross & ~is_test[pairs[:, 0]]
+        return {
+            "method": self.method,
+            "radius": self.radius,
+            "num_train": len(train_files),
+            "num_test": len(test_files),
+            "duplicate_clusters": len(np.unique(components[within.reshape(-1)])),
+            "train_duplicate_pairs": int(train_pairs.sum()),
+            "test_duplicate_pairs": int((~cross & is_test[pairs[:, 0]]).sum()),
+            "leakage_pairs": int(cross.sum()),
+            "leaked_train_images": len(leaked),
+            "excluded_train_images": len(exclude),
+            "leakage": listing(cross),
+            "train_duplicates": listing(train_pairs),
+            "exclude": sorted(exclude),
+        }
+
+    def run(self, train_dir, test_dir=None):
+        """ Scan both trees, write meta_dir/dedup/report.json and return the report. """
+        report = self.find(self._list(train_dir), self._list(test_dir) if test_dir else ())
+        report_dir = os.path.join(self.meta_dir, "dedup")
+        os.makedirs(report_dir, exist_ok=True)
+        path = os.path.join(report_dir, "report.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(path + ".tmp", path)
+        print(f"{report['duplicate_clusters']} near-duplicate clusters, {report['leakage_pairs']} train/test leakage pairs; "
+              f"{report['excluded_train_images']} of {report['num_train']} training images excluded ({path})", flush=True)
+        return report
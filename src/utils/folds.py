@@ -0,0 +1,55 @@
+""" utils/folds.py """
+
+import os
+import hashlib
+import numpy as np
+
+
+def stratified_folds(labels, k=5, seed=42):
+    """ Fold id in [0, k) for every sample, preserving each class's proportion in every fold.
+    Each class is shuffled with its own seeded stream and dealt round-robin, starting where the previous class
+    stopped so the remainders spread over different folds and fold sizes differ by at most one. """
+    labels = np.asarray(labels, dtype=np.int64)
+    if k < 2:
+        raise ValueError(f"Need at least 2 folds, got {k}")
+    folds = np.empty(len(labels), dtype=np.int8)
+    offset = 0
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        members = np.random.default_rng([seed, int(label)]).permutation(members)
+        folds[members] = (offset + np.arange(len(members))) % k
+        offset = (offset + len(members)) % k
+    return folds
+
+
+def fold_indices(folds, fold):
+    """ (train, valid) index arrays for one fold id. """
+    folds = np.asarray(folds)
+    return np.flatnonzero(folds != fold), np.flatnonzero(folds == fold)
+
+
+class FoldCache:
+    """ Stratified fold assignments computed once per dataset version and cached next to the manifest. """
+
+    def __init__(self, meta_dir):
+        """ Folds are cached as meta_dir/folds/<key>.npz. """
+        self.cache_dir = os.path.join(meta_dir, "folds")
+
+    def load(self, image_files, labels, key, k=5, seed=42):
+        """ Fold ids for image_files, reusing the cache entry for key (e.g. a manifest digest) and (k, seed). """
+        key = hashlib.sha1(f"{key}\0{k}\0{seed}".encode()).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"{key}.npz")
+        paths = np.asarray([str(path) for path in image_files])
+        if os.path.isfile(cache_path):
+            with np.load(cache_path) as cached:
+                # The digest ignores order; fold ids are positional, so the listing must match too
+                if np.array_equal(cached["paths"], paths):
+                    return cached["folds"]
+
+        folds = stratified_folds(labels, k, seed)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp.npz"
+        np.savez(tmp_path, folds=folds, paths=paths)
+        os.replace(tmp_path, cache_path)
+        print(f"{k} stratified folds over {len(folds)} images saved to {cache_path}", flush=True)
+        return folds
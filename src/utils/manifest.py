@@ -0,0 +1,111 @@
+""" utils/manifest.py """
+
+import os
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+
+def inspect_image(path):
+    """ Read the header of an image and verify its data, returning (width, height, mode, valid). """
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            mode = img.mode
+            img.verify()
+        return width, height, mode, True
+    except (IOError, SyntaxError):
+        return None, None, None, False
+
+
+class Manifest:
+    """ Persistent per-file index under DIR_META, keyed by path, size and mtime, updated incrementally. """
+
+    FILENAME = "manifest.json"
+    # Below this many changed files a process pool costs more to start than it saves
+    MIN_PARALLEL = 64
+
+    def __init__(self, meta_dir, categories, processes=None):
+        """ Load the manifest from meta_dir if present; labels are indices into categories. """
+        self.path = os.path.join(meta_dir, self.FILENAME)
+        self.categories = list(categories)
+        self.processes = processes
+        self.records = {}
+        if os.path.isfile(self.path):
+            with open(self.path, "r") as f:
+                self.records = json.load(f)
+
+    def save(self):
+        """ Atomically write the manifest to disk. """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Per-process temporary name, so concurrent savers never write into each other's file before the rename
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.records, f)
+        os.replace(tmp_path, self.path)
+
+    def scan(self, directory):
+        """ Return {category: [record, ...]} for directory in listing order, re-verifying only new or changed files. """
+        directory = os.path.abspath(directory)
+        listing = {}
+        stale = []
+
+        for category in self.categories:
+            class_dir = os.path.join(directory, category)
+            if not os.path.isdir(class_dir):
+                continue
+            listing[category] = []
+            with os.scandir(class_dir) as entries:
+                for entry in entries:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    record = self.records.get(entry.path)
+                    if record is None or record["size"] != stat.st_size or record["mtime_ns"] != stat.st_mtime_ns:
+                        record = {
+                            "size": stat.st_size,
+                            "mtime_ns": stat.st_mtime_ns,
+                            "category": category,
+                            "label": self.categories.index(category),
+                        }
+                        self.records[entry.path] = record
+                        stale.append(entry.path)
+                    listing[category].append(entry.path)
+
+        if stale:
+            self._verify(stale)
+            self.save()
+
+        # Drop records of files that disappeared from this directory
+        prefix = directory + os.sep
+        seen = {path for paths in listing.values() for path in paths}
+        removed = [path for path in self.records if path.startswith(prefix) and path not in seen]
+        for path in removed:
+            del self.records[path]
+        if removed and not stale:
+            self.save()
+
+        return {category: [dict(self.records[path], path=path) for path in paths] for category, paths in listing.items()}
+
+    def _verify(self, paths):
+        """ Inspect the given files, in a process pool when there are enough of them. """
+        if len(paths) >= self.MIN_PARALLEL and self.processes != 1:
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                results = list(pool.map(inspect_image, paths, chunksize=32))
+        else:
+            results = [inspect_image(path) for path in paths]
+
+        for path, (width, height, mode, valid) in zip(paths, results):
+            self.records[path].update(width=width, height=height, mode=mode, valid=valid)
+            if not valid:
+                print(f"File {path} is not a valid image and will be skipped.", flush=True)
+        print(f"Manifest: verified {len(paths)} new or changed files.", flush=True)
+
+    def digest(self, paths=None):
+        """ Stable hash of (path, size, mtime) for the given paths (all records by default), used to key derived caches. """
+        sha1 = hashlib.sha1()
+        for path in sorted(self.records if paths is None else map(str, paths)):
+            record = self.records[path]
+            sha1.update(f"{path}\0{record['size']}\0{record['mtime_ns']}\n".encode())
+        return sha1.hexdigest()
@@ -0,0 +1,31 @@
+""" utils/optimizer.py """
+
+import math
+from torch.optim.lr_scheduler import LambdaLR, OneCycleLR
+
+
+def warmup_cosine(optimizer, warmup_steps, total_steps, min_lr_ratio=0.0):
+    """ Linear warmup to the base learning rate, then cosine decay to min_lr_ratio * base over the remaining steps. """
+    def factor(step):
+        if step < warmup_steps:
+            return (step + 1) / max(warmup_steps, 1)
+        progress = min((step - warmup_steps) / max(total_steps - warmup_steps, 1), 1.0)
+        return min_lr_ratio + (1.0 - min_lr_ratio) * 0.5 * (1.0 + math.cos(math.pi * progress))
+
+    return LambdaLR(optimizer, factor)
+
+
+def one_cycle(optimizer, max_lr, total_steps, pct_start=0.3):
+    """ OneCycle schedule (cosine annealing, momentum cycling where the optimizer supports it). """
+    return OneCycleLR(optimizer, max_lr=max_lr, total_steps=total_steps, pct_start=pct_start)
+
+
+def build_scheduler(optimizer, name, total_steps, warmup_steps=0, max_lr=None):
+    """ "cosine" (warmup + cosine), "onecycle" or None for a constant learning rate. """
+    if name is None:
+        return None
+    if name == "cosine":
+        return warmup_cosine(optimizer, warmup_steps, total_steps)
+    if name == "onecycle":
+        return one_cycle(optimizer, max_lr or optimizer.param_groups[0]["lr"], total_steps)
+    raise ValueError(f"Unknown scheduler: {name}")
@@ -0,0 +1,168 @@
+""" utils/packstore.py """
+
+import os
+import copy
+import numpy as np
+from PIL import Image
+
+
+class PackStore:
+    """ Contiguous uint8 image store backed by a memory-mapped file and a label/offset index. """
+
+    DATA_SUFFIX = ".pack"
+    INDEX_SUFFIX = ".index.npz"
+
+    def __init__(self, path):
+        """ Open an existing pack; the data file is mapped lazily so the store can be pickled to workers. """
+        self.path = path
+        index = np.load(path + self.INDEX_SUFFIX)
+        self.offsets = index["offsets"]
+        self.shapes = index["shapes"]
+        self.labels = index["labels"]
+        self.paths = index["paths"]
+        self._data = None
+
+    def __len__(self):
+        """ Number of images in the pack. """
+        return len(self.labels)
+
+    def __getstate__(self):
+        """ Drop the memory map when pickling, np.memmap would otherwise be copied in full. """
+        state = self.__dict__.copy()
+        state["_data"] = None
+        return state
+
+    @property
+    def data(self):
+        """ Flat uint8 view of the pack, opened copy-on-write so pages come straight from the page cache. """
+        if self._data is None:
+            self._data = np.memmap(self.path + self.DATA_SUFFIX, dtype=np.uint8, mode="c")
+        return self._data
+
+    def view(self, idx):
+        """ Zero-copy CHW uint8 array for the image at idx. """
+        start = self.offsets[idx]
+        shape = self.shapes[idx]
+        return self.data[start:start + int(np.prod(shape))].reshape(shape)
+
+    @classmethod
+    def exists(cls, path):
+        """ Whether both the data and index files of a pack are present. """
+        return os.path.isfile(path + cls.DATA_SUFFIX) and os.path.isfile(path + cls.INDEX_SUFFIX)
+
+    @classmethod
+    def write(cls, path, image_files, labels, target_size=(256, 256), mode="RGB"):
+        """ Decode, resize and write images as one contiguous CHW uint8 array, then write the index. """
+        channels = len(mode)
+        width, height = target_size
+        sample_bytes = channels * height * width
+        shapes = np.tile(np.array([channels, height, width], dtype=np.int64), (len(image_files), 1))
+        offsets = np.arange(len(image_files), dtype=np.int64) * sample_bytes
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_data = path + cls.DATA_SUFFIX + ".tmp"
+        data = np.memmap(tmp_data, dtype=np.uint8, mode="w+", shape=(max(len(image_files), 1), channels, height, width))
+
+        for i, image_path in enumerate(image_files):
+            with Image.open(image_path) as img:
+                img = img.convert(mode)
+                if img.size != target_size:
+                    img = img.resize(target_size, Image.LANCZOS)
+                pixels = np.asarray(img, dtype=np.uint8).reshape(height, width, channels)
+            data[i] = pixels.transpose(2, 0, 1)
+
+        data.flush()
+        del data
+
+        # Write the index before moving the data in place so a reader never sees data without an index
+        tmp_index = path + ".tmp" + cls.INDEX_SUFFIX
+        np.savez(
+            tmp_index,
+            offsets=offsets,
+            shapes=shapes,
+            labels=np.asarray(labels, dtype=np.int64),
+            paths=np.asarray([str(p) for p in image_files]),
+        )
+        os.replace(tmp_index, path + cls.INDEX_SUFFIX)
+        os.replace(tmp_data, path + cls.DATA_SUFFIX)
+        print(f"Packed {len(image_files)} images of {target_size} into {path + cls.DATA_SUFFIX}", flush=True)
+        return cls(path)
+
+
+class PyramidStore(PackStore):
+    """ PackStore holding every image at several square resolutions in one file, laid out level after level so
+    reading one level touches only that level's bytes. level(size) returns a PackStore view of the nearest level. """
+
+    def __init__(self, path):
+        """ Open an existing pyramid; the view starts at the largest level. """
+        self.path = path
+        index = np.load(path + self.INDEX_SUFFIX)
+        self.sizes = index["sizes"]
+        self.level_offsets = index["level_offsets"]
+        self.channels = int(index["channels"])
+        self.labels = index["labels"]
+        self.paths = index["paths"]
+        self._data = None
+        self._select(int(self.sizes[-1]))
+
+    def _select(self, size):
+        level = int(np.flatnonzero(self.sizes == size)[0])
+        sample_bytes = self.channels * size * size
+        self.size = size
+        self.offsets = self.level_offsets[level] + np.arange(len(self.labels), dtype=np.int64) * sample_bytes
+        self.shapes = np.tile(np.array([self.channels, size, size], dtype=np.int64), (len(self.labels), 1))
+
+    def nearest(self, size):
+        """ Stored size closest to size, preferring the larger one on ties. """
+        return int(min(self.sizes, key=lambda stored: (abs(int(stored) - size), -int(stored))))
+
+    def level(self, size):
+        """ Store sharing this pyramid's file (and memory map) that serves the level nearest to size. """
+        view = copy.copy(self)
+        view._select(self.nearest(size))
+        return view
+
+    def level_nbytes(self, size):
+        """ Bytes of pixel data in the level nearest to size. """
+        size = self.nearest(size)
+        return len(self.labels) * self.channels * size * size
+
+    @classmethod
+    def write(cls, path, image_files, labels, sizes=(64, 128, 224, 256), mode="RGB"):
+        """ Decode every image once, resize it to each of sizes and write the levels into one contiguous file. """
+        sizes = np.array(sorted(set(sizes)), dtype=np.int64)
+        channels = len(mode)
+        level_bytes = len(image_files) * channels * sizes * sizes
+        level_offsets = np.concatenate([[0], np.cumsum(level_bytes)[:-1]]).astype(np.int64)
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_data = path + cls.DATA_SUFFIX + ".tmp"
+        data = np.memmap(tmp_data, dtype=np.uint8, mode="w+", shape=(max(int(level_bytes.sum()), 1),))
+        levels = [
+            data[offset:offset + nbytes].reshape(len(image_files), channels, size, size)
+            for offset, nbytes, size in zip(level_offsets, level_bytes, sizes)
+        ]
+
+        for i, image_path in enumerate(image_files):
+            with Image.open(image_path) as img:
+                img = img.convert(mode)
+                for level, size in zip(levels, sizes):
+                    resized = img if img.size == (size, size) else img.resize((int(size), int(size)), Image.LANCZOS)
+                    level[i] = np.asarray(resized, dtype=np.uint8).reshape(size, size, channels).transpose(2, 0, 1)
+
+        data.flush()
+        del data, levels
+
+        tmp_index = path + ".tmp" + cls.INDEX_SUFFIX
+        np.savez(
+            tmp_index,
+            sizes=sizes,
+            level_offsets=level_offsets,
+            channels=channels,
+            labels=np.asarray(labels, dtype=np.int64),
+            paths=np.asarray([str(p) for p in image_files]),
+        )
+        os.replace(tmp_index, path + cls.INDEX_SUFFIX)
+        os.replace(tmp_data, path + cls.DATA_SUFFIX)
+        print(f"Packed {len(image_files)} images at sizes {sizes.tolist()} into {path + cls.DATA_SUFFIX}", flush=True)
+        return cls(path)
@@ -0,0 +1,35 @@
+""" utils/patharray.py """
+
+import os
+import numpy as np
+
+
+class PathArray:
+    """ Read-only sequence of file paths packed into one uint8 buffer plus an int64 offsets array.
+    A list of N Path objects is N+1 refcounted, GC-tracked Python objects spread over the heap: every access in a
+    forked DataLoader worker (and every GC pass there) writes to their pages, so each worker gradually copies them
+    all. Here there are two NumPy arrays whatever N is, and reading a path only creates a new short-lived str. """
+
+    def __init__(self, paths):
+        encoded = [os.fsencode(str(path)) for path in paths]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(path) for path in encoded], out=self.offsets[1:])
+        self.buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx):
+        """ The path at idx as a str. """
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f"PathArray index {idx} out of range")
+        return os.fsdecode(self.buffer[self.offsets[idx]:self.offsets[idx + 1]].tobytes())
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+
+    @property
+    def nbytes(self):
+        return self.buffer.nbytes + self.offsets.nbytes
@@ -2,21 +2,29 @@
 
 import os
 import random
+from collections import Counter
 from PIL import Image
 from config.config import Config
 from funcs.transformer import Transformer
+from utils.packstore import PackStore, PyramidStore
+from utils.manifest import Manifest
+from utils.stats import DatasetStats
+from utils.folds import FoldCache
 
 
 class PrepData:
 
-    def __init__(self, config: Config, train_dir=None, test_dir=None, target_size=(256, 256), train_ratio=0.8):
-        """ Initialize with the training and/or testing directory, gather image information, and split training data if applicable. """
+    def __init__(self, config: Config, train_dir=None, test_dir=None, target_size=(256, 256), train_ratio=0.8, exclude=None):
+        """ Initialize with the training and/or testing directory, gather image information, and split training data if applicable.
+        exclude is a collection of image paths to leave out (e.g. the "exclude" list of a Deduplicator report). """
         self.config = config
+        self.exclude = set(map(str, exclude or ()))
         self.train_dir = train_dir
         self.test_dir = test_dir
         self.target_size = target_size
         self.train_ratio = train_ratio
         self.transformer = Transformer(resize=self.target_size)
+        self.manifest = Manifest(self.config.DIR_META, self.config.CATEGORIES)
 
         # Gather images from Training folder and split it into training and validation sets
         if self.train_dir:
@@ -49,23 +57,23 @@ class PrepData:
     def _gather_images(self, directory):
         """ Gather image paths and corresponding class indices from a given directory. """
         class_map = self._get_class_map(directory)
+        listing = self.manifest.scan(directory)
         image_files = []
         labels = []
 
         for i, (orig_name, _) in enumerate(class_map.items()):
-            class_dir = os.path.join(directory, orig_name)
-            class_images = [os.path.join(class_dir, x) for x in os.listdir(class_dir) if os.path.isfile(os.path.join(class_dir, x))]
+            class_images = [
+                record["path"] for record in listing.get(orig_name, [])
+                if record["valid"] and record["path"] not in self.exclude
+            ]
             image_files.extend(class_images)
             labels.extend([i] * len(class_images))
         return class_map, image_files, labels
 
     def _count_images_per_class(self, labels, class_map):
         """ Count images per class based on labels list. """
-        counts = {name: 0 for name in class_map.values()}
-        for label in labels:
-            class_name = list(class_map.values())[label]
-            counts[class_name] += 1
-        return counts
+        label_counts = Counter(labels)
+        return {name: label_counts.get(label, 0) for label, name in enumerate(class_map.values())}
 
     def _get_image_dimensions(self):
         """ Get dimensions of the first image to establish consistency. """
@@ -74,6 +82,9 @@ class PrepData:
             self.test_images[0] if hasattr(self, "test_images") else None
         )
         if sample_image_path:
+            record = self.manifest.records.get(sample_image_path)
+            if record and record["valid"]:
+                return record["width"], record["height"]
             with Image.open(sample_image_path) as img:
                 return img.size
         return None, None
@@ -81,7 +92,66 @@ class PrepData:
     def resize_images(self):
         """ Resize all images in the training and validation sets to the target size. """
         if hasattr(self, "train_images") and hasattr(self, "valid_images"): # only to train images
-            self.transformer.resize_image_files(self.train_images + self.valid_images, self.target_size)
+            marker_path = os.path.join(self.config.DIR_META, "resize_marker.json")
+            self.transformer.resize_image_files(self.train_images + self.valid_images, self.target_size, marker_path=marker_path)
+            # Refresh size/mtime of rewritten files so caches keyed by the manifest digest see the change
+            self.manifest.scan(self.train_dir)
+
+    def pack(self, pack_dir=None, overwrite=False, mode="RGB", splits=("train", "valid", "test"), levels=None):
+        """ Write every available split as a memory-mapped PackStore under pack_dir and return them by split name.
+        mode "L" packs single-channel grayscale, a third of the RGB size. The "full" split (the whole Training
+        directory before the train/valid split, in folds() order) is packed only when requested. levels (e.g.
+        (64, 128, 224, 256)) writes PyramidStores holding every image at each of those sizes instead. """
+        pack_dir = pack_dir or os.path.join(self.config.DIR_META, "packed")
+        available = {}
+        if hasattr(self, "train_images"):
+            available["train"] = (self.train_images, self.train_labels, self.train_class_map)
+            available["valid"] = (self.valid_images, self.valid_labels, self.train_class_map)
+            if "full" in splits:
+                _, full_images, full_labels = self._gather_images(self.train_dir)
+                available["full"] = (full_images, full_labels, self.train_class_map)
+        if hasattr(self, "test_images"):
+            available["test"] = (self.test_images, self.test_labels, self.test_class_map)
+
+        stores = {}
+        for split, (images, labels, class_map) in available.items():
+            if split not in splits:
+                continue
+            suffix = "" if mode == "RGB" else f"_{mode}"
+            if levels:
+                path = os.path.join(pack_dir, f"{split}_pyramid_{'-'.join(map(str, sorted(levels)))}{suffix}")
+            else:
+                path = os.path.join(pack_dir, f"{split}_{self.target_size[0]}x{self.target_size[1]}{suffix}")
+            store_cls = PyramidStore if levels else PackStore
+            if store_cls.exists(path) and not overwrite:
+                store = store_cls(path)
+                if store.paths.tolist() == [str(image) for image in images]:
+                    stores[split] = store
+                    continue
+            # Store labels as indices into config.CATEGORIES, class_map order follows os.listdir
+            categories = [self.config.CATEGORIES.index(name) for name in class_map]
+            labels = [categories[label] for label in labels]
+            if levels:
+                stores[split] = PyramidStore.write(path, images, labels, levels, mode)
+            else:
+                stores[split] = PackStore.write(path, images, labels, self.target_size, mode)
+        return stores
+
+    def dataset_stats(self, mode="RGB"):
+        """ Per-channel mean/std, histograms and class counts of the training split (validation excluded to avoid leakage), cached by manifest digest. """
+        images, labels, class_map = (
+            (self.train_images, self.train_labels, self.train_class_map) if hasattr(self, "train_images") else
+            (self.test_images, self.test_labels, self.test_class_map)
+        )
+        key = self.manifest.digest(images)
+        return DatasetStats(self.config.DIR_META).compute(images, labels, list(class_map.values()), key, mode=mode)
+
+    def folds(self, k=5, seed=42):
+        """ Stratified k-fold assignment over the whole Training directory, cached by manifest digest.
+        Returns (image_files, labels, fold_ids) aligned with the "full" pack. """
+        _, images, labels = self._gather_images(self.train_dir)
+        key = self.manifest.digest(images)
+        return images, labels, FoldCache(self.config.DIR_META).load(images, labels, key, k, seed)
 
     def split_train_val(self):
         """ Split the training data into training and validation sets based on the train_ratio. """
@@ -101,6 +171,25 @@ class PrepData:
 
         return list(train_images), list(train_labels), list(valid_images), list(valid_labels)
 
+    def split_state(self):
+        """ The train/valid image lists, saved with checkpoints so a resumed run trains on exactly the same split. """
+        return {"train": list(map(str, self.train_images)), "valid": list(map(str, self.valid_images))}
+
+    def restore_split(self, state):
+        """ Replace the train/valid split with one from split_state(); raises ValueError if an image is gone. """
+        _, images, labels = self._gather_images(self.train_dir)
+        label_of = dict(zip(map(str, images), labels))
+        missing = [path for path in state["train"] + state["valid"] if path not in label_of]
+        if missing:
+            raise ValueError(f"{len(missing)} images of the saved split are missing, e.g. {missing[0]}")
+
+        self.train_images, self.valid_images = list(state["train"]), list(state["valid"])
+        self.train_labels = [label_of[path] for path in self.train_images]
+        self.valid_labels = [label_of[path] for path in self.valid_images]
+        self.num_train, self.num_val = len(self.train_images), len(self.valid_images)
+        self.train_class_counts = self._count_images_per_class(self.train_labels, self.train_class_map)
+        self.valid_class_counts = self._count_images_per_class(self.valid_labels, self.train_class_map)
+
     def summary(self):
         """ Print a summary of the dataset information. """
         print(f"Image dimensions: {self.target_size[0]} x {self.target_size[1]}")
@@ -0,0 +1,265 @@
+""" utils/profiler.py """
+
+import os
+import glob
+import json
+import time
+import threading
+import contextlib
+import multiprocessing.util
+
+# Set by configure() and inherited by DataLoader/pool workers, so every process records into the same directory
+PROFILE_ENV = "TUMOR_PROFILE_DIR"
+_NULL = contextlib.nullcontext()
+
+
+class StageProfiler:
+    """ Per-process stage timers: count/total/min/max per stage name plus a bounded number of Chrome trace events.
+    Each process writes its stage totals to trace_dir/stages-<pid>.json and appends its events, one JSON line per
+    flush, to stages-<pid>.events; merge() aggregates them across processes. A flush writes only the events recorded
+    since the previous one. Periodic flushes run on a daemon thread every flush_interval seconds, so record() does no
+    I/O; the measured threads only share the GIL with it while it serializes, a perturbation of well under a
+    millisecond per interval that lands in whichever stage is running at the time. """
+
+    def __init__(self, trace_dir, max_events=200000, flush_interval=2.0):
+        self.trace_dir = trace_dir
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self.pid = os.getpid()
+        self.stats = {}
+        self.events = []
+        self.event_count = 0
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        os.makedirs(trace_dir, exist_ok=True)
+        # Started by the process that records: profilers are created lazily, after any fork, and threads do not fork
+        self._stopped = threading.Event()
+        threading.Thread(target=self._flush_periodically, name="stage-profiler-flush", daemon=True).start()
+        # multiprocessing runs these finalizers when a worker process exits normally (atexit does not)
+        multiprocessing.util.Finalize(self, self.close, exitpriority=10)
+
+    def record(self, name, start_ns, end_ns):
+        """ Account one [start_ns, end_ns) interval (time.perf_counter_ns, CLOCK_MONOTONIC on Linux) to stage name. """
+        elapsed = end_ns - start_ns
+        with self.lock:
+            entry = self.stats.get(name)
+            if entry is None:
+                self.stats[name] = [1, elapsed, elapsed, elapsed]
+            else:
+                entry[0] += 1
+                entry[1] += elapsed
+                entry[2] = min(entry[2], elapsed)
+                entry[3] = max(entry[3], elapsed)
+            if self.event_count < self.max_events:
+                self.events.append((name, start_ns, elapsed, threading.get_ident()))
+                self.event_count += 1
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter_ns())
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """ Stop the periodic flushes and write what is left. """
+        self._stopped.set()
+        self.flush()
+
+    def flush(self):
+        """ Append the events recorded since the last flush and rewrite the (small) stage totals file. """
+        with self.flush_lock:
+            with self.lock:
+                events, self.events = self.events, []
+                stats = {name: list(entry) for name, entry in self.stats.items()}
+            path = os.path.join(self.trace_dir, f"stages-{self.pid}")
+            if events:
+                with open(path + ".events", "a") as f:
+                    f.write(json.dumps(events) + "\n")
+            with open(path + ".json.tmp", "w") as f:
+                json.dump({"pid": self.pid, "stats": stats}, f)
+            os.replace(path + ".json.tmp", path + ".json")
+
+
+# Resolved once per process (and updated by configure()) so stage() never reads os.environ on the hot path
+_trace_dir = os.environ.get(PROFILE_ENV) or None
+_profiler = None
+
+
+def _reset_after_fork():
+    """ A forked worker records into its own StageProfiler, never into a copy of its parent's. """
+    global _profiler
+    _profiler = None
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def configure(trace_dir):
+    """ Enable stage profiling in this process and in every process started after this call. """
+    global _trace_dir
+    os.makedirs(trace_dir, exist_ok=True)
+    for path in glob.glob(os.path.join(trace_dir, "stages-*")):
+        os.remove(path)
+    os.environ[PROFILE_ENV] = trace_dir
+    _trace_dir = trace_dir
+
+
+def get_profiler():
+    """ This process's StageProfiler, or None when profiling is off; forked workers get their own instance. """
+    global _profiler
+    if _trace_dir is None:
+        return None
+    if _profiler is None:
+        _profiler = StageProfiler(_trace_dir)
+    return _profiler
+
+
+def stage(name):
+    """ Context manager timing a stage; a shared no-op when profiling is off. """
+    profiler = get_profiler()
+    return _NULL if profiler is None else profiler.stage(name)
+
+
+class Timed:
+    """ Picklable wrapper timing each call of fn (a transform or collate function) as stage name. """
+
+    def __init__(self, name, fn):
+        self.name = name
+        self.fn = fn
+
+    def __call__(self, *args, **kwargs):
+        with stage(self.name):
+            return self.fn(*args, **kwargs)
+
+    def __repr__(self):
+        return f"Timed({self.name!r}, {self.fn!r})"
+
+
+def timed(name, fn):
+    """ fn wrapped in Timed when profiling is enabled at build time, fn itself otherwise. """
+    return Timed(name, fn) if _trace_dir else fn
+
+
+def flush():
+    """ Write this process's records now (the main process calls this before merging). """
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.flush()
+
+
+def merge(trace_dir):
+    """ Aggregate the per-process files into {stage: count/total/mean/min/max (ms)/processes} and the raw events. """
+    totals, events = {}, []
+    for path in sorted(glob.glob(os.path.join(trace_dir, "stages-*.json"))):
+        with open(path) as f:
+            data = json.load(f)
+        events_path = path[:-len(".json")] + ".events"
+        if os.path.isfile(events_path):
+            with open(events_path) as f:
+                # A process killed mid-write leaves at most one partial last line
+                events.extend((data["pid"], *event) for line in f if line.endswith("\n") for event in json.loads(line))
+        for name, (count, total, low, high) in data["stats"].items():
+            entry = totals.setdefault(name, {"count": 0, "total_ns": 0, "min_ns": low, "max_ns": high, "processes": 0})
+            entry["count"] += count
+            entry["total_ns"] += total
+            entry["min_ns"] = min(entry["min_ns"], low)
+            entry["max_ns"] = max(entry["max_ns"], high)
+            entry["processes"] += 1
+
+    summary = {
+        name: {
+            "count": entry["count"],
+            "total_ms": entry["total_ns"] / 1e6,
+            "mean_ms": entry["total_ns"] / entry["count"] / 1e6,
+            "min_ms": entry["min_ns"] / 1e6,
+            "max_ms": entry["max_ns"] / 1e6,
+            "processes": entry["processes"],
+        }
+        for name, entry in sorted(totals.items(), key=lambda item: -item[1]["total_ns"])
+    }
+    return summary, events
+
+
+def summary_table(summary):
+    """ Fixed-width table of the merged stage summary, largest total first. """
+    lines = [f"{'stage':<22}{'count':>9}{'total ms':>12}{'mean ms':>10}{'min ms':>10}{'max ms':>10}{'procs':>7}"]
+    for name, entry in summary.items():
+        lines.append(f"{name:<22}{entry['count']:>9}{entry['total_ms']:>12.1f}{entry['mean_ms']:>10.3f}"
+                     f"{entry['min_ms']:>10.3f}{entry['max_ms']:>10.3f}{entry['processes']:>7}")
+    return "\n".join(lines)
+
+
+def export_chrome_trace(events, path):
+    """ Write complete ("X") events in the Chrome trace format (chrome://tracing, Perfetto), one track per pid/thread. """
+    trace = [
+        {"name": name, "ph": "X", "pid": pid, "tid": tid, "ts": start_ns / 1e3, "dur": elapsed_ns / 1e3, "cat": name.split(".")[0]}
+        for pid, name, start_ns, elapsed_ns, tid in events
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+    return path
+
+
+def report(trace_dir):
+    """ Merge all processes' records, print the summary table and write stages.json and a Chrome trace to trace_dir. """
+    flush()
+    summary, events = merge(trace_dir)
+    print(summary_table(summary), flush=True)
+    with open(os.path.join(trace_dir, "stages.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    path = export_chrome_trace(events, os.path.join(trace_dir, "stages_trace.json"))
+    print(f"Stage summary and Chrome trace written to {trace_dir} (open {path} in chrome://tracing or Perfetto)", flush=True)
+    return summary
+
+
+def torch_profile(trace_dir, active_steps=10, wait_steps=2):
+    """ torch.profiler capture of active_steps training steps (after wait_steps), exported as a Chrome trace.
+    Trainer advances it once per batch via step(); returns a no-op context when active_steps is 0. """
+    if not active_steps:
+        return _NULL
+    from torch.profiler import profile, schedule, ProfilerActivity
+
+    def export(prof):
+        path = os.path.join(trace_dir, "torch_trace.json")
+        prof.export_chrome_trace(path)
+        print(prof.key_averages().table(sort_by="self_cpu_time_total", row_limit=20), flush=True)
+        print(f"torch.profiler trace written to {path}", flush=True)
+
+    return _TorchProfile(profile(
+        activities=[ProfilerActivity.CPU],
+        schedule=schedule(wait=wait_steps, warmup=1, active=active_steps, repeat=1),
+        on_trace_ready=export,
+        record_shapes=True,
+    ))
+
+
+_torch_profiler = None
+
+
+class _TorchProfile:
+    """ Registers the running torch.profiler so step() can advance it from inside the training loop. """
+
+    def __init__(self, prof):
+        self.prof = prof
+
+    def __enter__(self):
+        global _torch_profiler
+        _torch_profiler = self.prof.__enter__()
+        return _torch_profiler
+
+    def __exit__(self, *exc):
+        global _torch_profiler
+        _torch_profiler = None
+        return self.prof.__exit__(*exc)
+
+
+def step():
+    """ Advance the active torch.profiler schedule by one training step (no-op otherwise). """
+    if _torch_profiler is not None:
+        _torch_profiler.step()
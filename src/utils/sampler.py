@@ -0,0 +1,60 @@
+""" utils/sampler.py """
+
+import numpy as np
+from torch.utils.data import Sampler
+
+
+class ShardedSampler(Sampler):
+    """ Deterministic per-rank shard of a dataset's indices for data-parallel training.
+    The permutation depends only on (seed, epoch), never on the number of replicas, so the global sample order
+    is identical whether a run uses 1 or N processes; each rank keeps every num_replicas-th index of it. """
+
+    def __init__(self, num_samples, num_replicas=1, rank=0, seed=42, shuffle=True, pad=True):
+        """ num_samples is the dataset length (a dataset is accepted too). pad repeats leading indices so every
+        rank gets the same number of samples, which keeps DDP's per-step collectives in lockstep; evaluation
+        shards should use pad=False so no sample is counted twice. """
+        self.num_samples = num_samples if isinstance(num_samples, int) else len(num_samples)
+        if not 0 <= rank < num_replicas:
+            raise ValueError(f"Invalid rank {rank} for {num_replicas} replicas")
+        self.num_replicas = num_replicas
+        self.rank = rank
+        self.seed = seed
+        self.shuffle = shuffle
+        self.pad = pad
+        self.epoch = 0
+        self.start = 0
+
+    def set_epoch(self, epoch):
+        """ Select the permutation for epoch; call before iterating so all ranks draw the same order. """
+        if epoch != self.epoch:
+            self.start = 0
+        self.epoch = epoch
+
+    def state_dict(self, consumed=0):
+        """ Epoch and position within it after consumed more samples of this rank's shard, for mid-epoch resume. """
+        return {"epoch": self.epoch, "seed": self.seed, "start": self.start + consumed}
+
+    def load_state_dict(self, state):
+        """ Continue state["epoch"] after its first state["start"] samples; the next epoch starts from 0 again. """
+        self.seed = state["seed"]
+        self.epoch = state["epoch"]
+        self.start = state["start"]
+
+    def indices(self):
+        """ This rank's indices for the current epoch as an int64 array. """
+        if self.shuffle:
+            order = np.random.default_rng([self.seed, self.epoch]).permutation(self.num_samples)
+        else:
+            order = np.arange(self.num_samples)
+        if self.pad and self.num_samples % self.num_replicas:
+            extra = self.num_replicas - self.num_samples % self.num_replicas
+            order = np.concatenate([order, np.resize(order, extra)])
+        return order[self.rank::self.num_replicas]
+
+    def __iter__(self):
+        return iter(self.indices()[self.start:].tolist())
+
+    def __len__(self):
+        if self.pad:
+            return max(-(-self.num_samples // self.num_replicas) - self.start, 0)
+        return max(len(range(self.rank, self.num_samples, self.num_replicas)) - self.start, 0)
@@ -0,0 +1,116 @@
+""" utils/stats.py """
+
+import os
+import json
+import hashlib
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+
+
+class RunningStats:
+    """ Per-channel count/mean/M2 accumulator updated image by image and merged across processes with Chan's formula. """
+
+    def __init__(self, channels):
+        self.count = 0
+        self.mean = np.zeros(channels, dtype=np.float64)
+        self.m2 = np.zeros(channels, dtype=np.float64)
+        self.hist = np.zeros((channels, 256), dtype=np.int64)
+
+    def update(self, pixels):
+        """ Fold an HxWxC uint8 image in. Its moments come exactly from its 256-bin histogram, so pixels are never
+        converted to float. """
+        flat = pixels.reshape(-1, pixels.shape[-1])
+        other = RunningStats(flat.shape[1])
+        for c in range(flat.shape[1]):
+            other.hist[c] = np.bincount(flat[:, c], minlength=256)
+        levels = np.arange(256, dtype=np.float64) / 255.0
+        other.count = flat.shape[0]
+        other.mean = other.hist @ levels / other.count
+        other.m2 = (other.hist * (levels[None, :] - other.mean[:, None]) ** 2).sum(axis=1)
+        self.merge(other)
+
+    def merge(self, other):
+        """ Merge another accumulator into this one. """
+        self.hist += other.hist
+        self._merge_moments(other)
+        return self
+
+    def _merge_moments(self, other):
+        """ Chan et al. parallel combination of (count, mean, M2). """
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / total
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / total
+        self.count = total
+
+    @property
+    def std(self):
+        """ Population standard deviation per channel. """
+        return np.sqrt(self.m2 / self.count) if self.count else np.zeros_like(self.m2)
+
+
+def partial_stats(image_files, mode="RGB"):
+    """ Stream a chunk of images into a RunningStats (one image in memory at a time). """
+    stats = RunningStats(len(mode))
+    for image_path in image_files:
+        with Image.open(image_path) as img:
+            stats.update(np.asarray(img.convert(mode), dtype=np.uint8).reshape(img.height, img.width, len(mode)))
+    return stats
+
+
+def store_stats(store, indices):
+    """ RunningStats over the images at indices of a PackStore, read straight from its memory map. """
+    stats = RunningStats(int(store.shapes[0][0]) if len(store) else 3)
+    for idx in indices:
+        stats.update(store.view(idx).transpose(1, 2, 0))
+    return stats
+
+
+class DatasetStats:
+    """ One parallel streaming pass for per-channel mean/std, intensity histograms and per-class counts, cached in DIR_META. """
+
+    def __init__(self, meta_dir, processes=None, chunk_size=64):
+        """ Results are cached as meta_dir/stats/<key>.json. """
+        self.cache_dir = os.path.join(meta_dir, "stats")
+        self.processes = processes
+        self.chunk_size = chunk_size
+
+    def compute(self, image_files, labels, class_names, key, mode="RGB"):
+        """ Return the statistics for image_files, reusing the cache entry for key (e.g. a manifest digest). """
+        key = hashlib.sha1(f"{key}\0{mode}".encode()).hexdigest()
+        cache_path = os.path.join(self.cache_dir, f"{key}.json")
+        if os.path.isfile(cache_path):
+            with open(cache_path, "r") as f:
+                return json.load(f)
+
+        chunks = [image_files[i:i + self.chunk_size] for i in range(0, len(image_files), self.chunk_size)]
+        total = RunningStats(len(mode))
+        if self.processes == 1 or len(chunks) <= 1:
+            for chunk in chunks:
+                total.merge(partial_stats(chunk, mode))
+        else:
+            with ProcessPoolExecutor(max_workers=self.processes) as pool:
+                for stats in pool.map(partial_stats, chunks, [mode] * len(chunks)):
+                    total.merge(stats)
+
+        counts = np.bincount(np.asarray(labels, dtype=np.int64), minlength=len(class_names))
+        result = {
+            "mode": mode,
+            "num_images": len(image_files),
+            "num_pixels": int(total.count),
+            "mean": total.mean.tolist(),
+            "std": total.std.tolist(),
+            "histogram": total.hist.tolist(),
+            "class_counts": {name: int(count) for name, count in zip(class_names, counts)},
+        }
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, cache_path)
+        print(f"Dataset statistics over {len(image_files)} images saved to {cache_path}", flush=True)
+        return result